@@ -0,0 +1,62 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import benchmark_util
+
+import depends_dag
+
+
+"""
+Plans the execution of the bottom node of wide diamond lattices, comparing
+DAG.executionPlan() against the recursive buildExecutionList() it replaced,
+which visits a node once for every path leading from it.  Run with
+"python benchmarks/bench_execution_plan.py [width ...]".
+"""
+
+
+# How many layers each lattice has
+LATTICE_DEPTHS = [2, 4, 6, 8]
+
+# The recursive list isn't built for lattices with more paths than this
+MAX_RECURSIVE_PATHS = 2 * 10 ** 6
+
+
+def recursiveExecutionList(dag, dagNode):
+    """
+    DAG.buildExecutionList() as it was before execution plans.
+    """
+    nodeList = []
+    for edge in dag.network.in_edges(dagNode):
+        foundNode = edge[0]
+        inNodes = recursiveExecutionList(dag, foundNode)
+        if inNodes:
+            nodeList.extend(inNodes)
+        nodeList.append(foundNode)
+    return nodeList
+
+
+def main():
+    for width in benchmark_util.sizesFromCommandline([4, 16, 64]):
+        for depth in LATTICE_DEPTHS:
+            (dag, bottom) = benchmark_util.latticeDag(width, depth)
+            print "Lattice %d wide and %d deep (%d nodes, %d edges)" % (width, depth, len(dag.network),
+                                                                      dag.network.number_of_edges())
+            benchmark_util.report("executionPlan", benchmark_util.bestTime(lambda: dag.executionPlan(bottom)))
+
+            plan = dag.executionPlan(bottom)
+            planSnapshot = plan.snapshot()
+            benchmark_util.report("ExecutionPlan.fromSnapshot",
+                                  benchmark_util.bestTime(lambda: depends_dag.ExecutionPlan.fromSnapshot(dag, planSnapshot)))
+
+            if width ** depth <= MAX_RECURSIVE_PATHS:
+                benchmark_util.report("recursive buildExecutionList (%d entries)" % len(recursiveExecutionList(dag, bottom)),
+                                      benchmark_util.bestTime(lambda: recursiveExecutionList(dag, bottom), repeat=1))
+            else:
+                print "  recursive buildExecutionList skipped (%d paths)" % width ** depth
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import re
+
+import benchmark_util
+
+import depends_util
+
+
+"""
+Expands framespecs into filenames, comparing frames(), iterframes(), and the
+batch formatter against the regex-per-frame expansion they replaced, along
+with the lookups a framespec can now answer without expanding at all.  Run
+with "python benchmarks/bench_framespec.py [frameCount ...]".
+"""
+
+
+FILENAMES = ['/mnt/renders/shot010/beauty.####.exr', '/mnt/renders/v#/shot010/beauty_v#.####.exr']
+
+
+def regexReplaceFrameSymbols(replaceString, frameNumber):
+    """
+    framespec.replaceFrameSymbols() as it was before frame templates.
+    """
+    matchObj = re.finditer(r'((?<!\\)\#+)', replaceString)
+    i = next(matchObj, None)
+    while i:
+        padString = "%s" % str(frameNumber).zfill(len(i.group(0)))
+        replaceString = replaceString[:i.start()] + padString + replaceString[i.end():]
+        matchObj = re.finditer(r'((?<!\\)\#+)', replaceString)
+        i = next(matchObj, None)
+    replaceString = replaceString.replace('\#', '#')
+    return replaceString
+
+
+def regexFrames(spec):
+    """
+    framespec.frames() as it was before frame templates.
+    """
+    return [regexReplaceFrameSymbols(spec.filename, i) for i in range(spec.startFrame, spec.endFrame + 1)]
+
+
+def main():
+    for frameCount in benchmark_util.sizesFromCommandline([1000, 100000]):
+        for filename in FILENAMES:
+            spec = depends_util.framespec(filename, (1001, 1000 + frameCount))
+            print "%d frames of %s" % (frameCount, filename)
+            benchmark_util.report("frames()", benchmark_util.bestTime(spec.frames), frameCount)
+            benchmark_util.report("iterframes()", benchmark_util.bestTime(lambda: list(spec.iterframes())), frameCount)
+            benchmark_util.report("formatFrames() of every other frame",
+                                  benchmark_util.bestTime(lambda: spec.formatFrames(xrange(1001, 1001 + frameCount, 2))),
+                                  frameCount // 2)
+            benchmark_util.report("frameFilename() per frame",
+                                  benchmark_util.bestTime(lambda: [spec.frameFilename(i) for i in xrange(1001, 1001 + frameCount)]),
+                                  frameCount)
+            benchmark_util.report("frames(), previous regex implementation",
+                                  benchmark_util.bestTime(lambda: regexFrames(spec), repeat=1), frameCount)
+            lastFilename = spec[-1]
+            benchmark_util.report("len(), last frame, and membership x1000",
+                                  benchmark_util.bestTime(lambda: [(len(spec), spec[-1], lastFilename in spec) for i in xrange(1000)]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import benchmark_util
+
+import depends_dag
+
+
+"""
+Loads synthetic graphs and looks up every node in them by name and by UUID,
+comparing the DAG's lookup tables against the linear scan DAG.node() used to
+do.  Run with "python benchmarks/bench_node_lookup.py [nodeCount ...]".
+"""
+
+
+# How many lookups the linear scan is timed over (it's too slow to do them all)
+LINEAR_SAMPLE_SIZE = 200
+
+
+def linearNode(dag, name=None, nUUID=None):
+    """
+    DAG.node() as it was before the lookup tables.
+    """
+    for dagNode in dag.network:
+        if name and dagNode.name == name:
+            return dagNode
+        if nUUID and dagNode.uuid == nUUID:
+            return dagNode
+    return None
+
+
+def main():
+    for nodeCount in benchmark_util.sizesFromCommandline([1000, 10000, 50000]):
+        print "%d nodes" % nodeCount
+        (dag, dagNodes) = benchmark_util.syntheticDag(nodeCount)
+        snapshot = benchmark_util.snapshotForFile(dag)
+        names = [x.name for x in dagNodes]
+        uuids = [x.uuid for x in dagNodes]
+        sample = range(0, nodeCount, max(1, nodeCount // LINEAR_SAMPLE_SIZE))
+
+        loadedDag = depends_dag.DAG()
+        benchmark_util.report("restoreSnapshot", benchmark_util.bestTime(lambda: loadedDag.restoreSnapshot(snapshot)))
+        benchmark_util.report("node(name=) indexed, every node",
+                              benchmark_util.bestTime(lambda: [loadedDag.node(name=x) for x in names]), nodeCount)
+        benchmark_util.report("node(nUUID=) indexed, every node",
+                              benchmark_util.bestTime(lambda: [loadedDag.node(nUUID=x) for x in uuids]), nodeCount)
+        benchmark_util.report("node(name=) linear scan, %d nodes" % len(sample),
+                              benchmark_util.bestTime(lambda: [linearNode(loadedDag, name=names[i]) for i in sample], repeat=1),
+                              len(sample))
+        benchmark_util.report("node(nUUID=) linear scan, %d nodes" % len(sample),
+                              benchmark_util.bestTime(lambda: [linearNode(loadedDag, nUUID=uuids[i]) for i in sample], repeat=1),
+                              len(sample))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import benchmark_util
+
+import depends_node
+
+
+"""
+Measures the memory each node takes and the cost of getting at its
+properties, on graphs with tens of thousands of nodes.  Nodes are compared
+against ones whose inputs, outputs, and attributes are plain classes without
+__slots__, and the cached property tuples against the scan over the property
+dict inputs(), outputs(), and attributes() used to do on every call.  Memory
+is the growth of the process's peak resident size (tracemalloc isn't
+available in Python 2).  Run with "python benchmarks/bench_node_memory.py
+[nodeCount ...]".
+"""
+
+
+###############################################################################
+## Nodes
+###############################################################################
+class PreviousInput(object):
+    def __init__(self, name, dataType='', required=True, docString=None):
+        self.name = name
+        self.value = ""
+        self.seqRange = None
+        self.docString = docString
+        self.dataType = dataType
+        self.required = required
+
+
+class PreviousOutput(object):
+    def __init__(self, name, dataType='', docString=None):
+        self.name = name
+        self.value = dict()
+        self.seqRange = None
+        self.docString = docString
+        self.dataType = dataType
+
+
+class PreviousAttribute(object):
+    def __init__(self, name, defaultValue, dataType='string', docString=None):
+        self.name = name
+        self.value = defaultValue
+        self.seqRange = None
+        self.docString = docString
+        self.dataType = dataType
+
+
+class DagNodeMemoryBenchmark(depends_node.DagNode):
+    """
+    A typical node, with three inputs and outputs and four attributes.
+    """
+
+    inputType = depends_node.DagNodeInput
+    outputType = depends_node.DagNodeOutput
+    attributeType = depends_node.DagNodeAttribute
+
+    def _defineInputs(self):
+        return [self.inputType('input%d' % i, 'file') for i in range(3)]
+
+    def _defineOutputs(self):
+        return [self.outputType('output%d' % i, 'file') for i in range(3)]
+
+    def _defineAttributes(self):
+        return [self.attributeType('attribute%d' % i, "value") for i in range(4)]
+
+
+class DagNodeMemoryBenchmarkUnslotted(DagNodeMemoryBenchmark):
+    inputType = PreviousInput
+    outputType = PreviousOutput
+    attributeType = PreviousAttribute
+
+
+def previousProperties(dagNode, propertyType):
+    """
+    DagNode.inputs(), outputs(), and attributes() as they were before the
+    property tuples were cached.
+    """
+    propertyList = list()
+    for x in dagNode._properties:
+        if type(dagNode._properties[x]) is propertyType:
+            propertyList.append(dagNode._properties[x])
+    return propertyList
+
+
+###############################################################################
+## Measurements
+###############################################################################
+def createNodes(nodeType, nodeCount):
+    dagNodes = [nodeType(name="node%d" % i) for i in xrange(nodeCount)]
+    # Build the property tuples the way a session using the nodes would
+    for dagNode in dagNodes:
+        dagNode.inputs()
+    return dagNodes
+
+
+def cachedAccess(dagNodes):
+    for dagNode in dagNodes:
+        dagNode.inputs()
+        dagNode.outputs()
+        dagNode.attributes()
+
+
+def previousAccess(dagNodes):
+    for dagNode in dagNodes:
+        previousProperties(dagNode, depends_node.DagNodeInput)
+        previousProperties(dagNode, depends_node.DagNodeOutput)
+        previousProperties(dagNode, depends_node.DagNodeAttribute)
+
+
+def main():
+    for nodeCount in benchmark_util.sizesFromCommandline([50000]):
+        print "%d nodes" % nodeCount
+        for (label, nodeType) in [("slotted properties", DagNodeMemoryBenchmark),
+                                  ("unslotted properties (previous)", DagNodeMemoryBenchmarkUnslotted)]:
+            benchmark_util.reportMemory("memory per node, %s" % label,
+                                        benchmark_util.peakMemory(lambda: createNodes(nodeType, nodeCount)) / float(nodeCount))
+            benchmark_util.report("creating nodes, %s" % label,
+                                  benchmark_util.bestTime(lambda: createNodes(nodeType, nodeCount), repeat=1), nodeCount)
+
+        dagNodes = createNodes(DagNodeMemoryBenchmark, nodeCount)
+        benchmark_util.report("inputs/outputs/attributes, cached", benchmark_util.bestTime(lambda: cachedAccess(dagNodes)), nodeCount)
+        benchmark_util.report("inputs/outputs/attributes, previous scan",
+                              benchmark_util.bestTime(lambda: previousAccess(dagNodes)), nodeCount)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import inspect
+
+import benchmark_util
+
+import depends_dag
+import depends_node
+
+
+"""
+Times how restoring a workflow finds each node's class, with a node
+namespace holding as many classes as a studio's plugins would add.  The type
+registry is compared against the inspect.getmembers() search of the whole
+depends_node module restoreSnapshot used to do for every node.  Run with
+"python benchmarks/bench_node_type_registry.py [nodeCount ...]".
+"""
+
+
+# How many plugin node classes are registered in the namespace
+REGISTERED_TYPE_COUNT = 200
+
+
+def previousNodeType(typeString):
+    """
+    The class lookup of depends_util.classTypeNamedFromModule(), which
+    restoreSnapshot used before the type registry.
+    """
+    moduleMembers = inspect.getmembers(depends_node)
+    classIndex = [i for i, t in enumerate(moduleMembers) if t[0] == typeString][0]
+    return moduleMembers[classIndex][1]
+
+
+def registerPluginTypes():
+    """
+    Register made up node classes, along with the class the benchmark's
+    nodes are made of, the way loading plugins does.
+    """
+    depends_node.registerNodeType(benchmark_util.DagNodeBenchmark)
+    for i in range(REGISTERED_TYPE_COUNT):
+        depends_node.registerNodeType(type('DagNodeRegistered%03d' % i, (benchmark_util.DagNodeBenchmark,), {}))
+
+
+def main():
+    registerPluginTypes()
+    for nodeCount in benchmark_util.sizesFromCommandline([1000, 10000]):
+        print "%d nodes, %d node types registered" % (nodeCount, REGISTERED_TYPE_COUNT)
+        (dag, dagNodes) = benchmark_util.syntheticDag(nodeCount)
+        snapshot = benchmark_util.snapshotForFile(dag)
+        typeNames = [n["TYPE"] for n in snapshot["NODES"]]
+
+        benchmark_util.report("restoreSnapshot", benchmark_util.bestTime(lambda: depends_dag.DAG().restoreSnapshot(snapshot)))
+        benchmark_util.report("class lookups, type registry",
+                              benchmark_util.bestTime(lambda: [depends_node.nodeTypeNamed(t) for t in typeNames]), nodeCount)
+        benchmark_util.report("class lookups, inspect.getmembers (previous)",
+                              benchmark_util.bestTime(lambda: [previousNodeType(t) for t in typeNames], repeat=1), nodeCount)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import shutil
+import tempfile
+
+import benchmark_util
+
+import depends_node
+import depends_util
+
+
+"""
+Times loading a directory of plugin modules at startup: without a manifest,
+with an up to date manifest, and the way plugins used to be loaded, by
+importing every module.  Each plugin module does some work when it is
+imported, standing in for plugins that import heavy site packages.  Each
+measurement runs in a fresh process.  Run with
+"python benchmarks/bench_plugin_startup.py [moduleCount ...]".
+"""
+
+
+# How many times each measurement is repeated
+REPEAT = 3
+
+PLUGIN_SOURCE = """
+import depends_node
+
+# Stands in for importing a heavy site package
+_table = [i * i for i in range(%(importCost)d)]
+
+class DagNodePlugin%(index)03d(depends_node.DagNode):
+    category = 'Plugin%(category)d'
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('value', "%(index)d")]
+
+    def executePython(self):
+        self.outVal = len(_table)
+"""
+
+# How many list items each plugin module computes when it is imported
+IMPORT_COST = 20000
+
+
+def writePlugins(pluginDir, moduleCount):
+    for i in range(moduleCount):
+        with open(os.path.join(pluginDir, 'plugin%03d.py' % i), 'w') as fp:
+            fp.write(PLUGIN_SOURCE % {'index': i, 'category': i % 10, 'importCost': IMPORT_COST})
+
+
+def bestTimeInChild(function):
+    return min(benchmark_util.timeInChild(function) for i in range(REPEAT))
+
+
+def main():
+    tempDir = tempfile.mkdtemp()
+    try:
+        for moduleCount in benchmark_util.sizesFromCommandline([200]):
+            print "%d plugin modules" % moduleCount
+            pluginDir = os.path.join(tempDir, 'nodes%d' % moduleCount)
+            os.mkdir(pluginDir)
+            writePlugins(pluginDir, moduleCount)
+            manifestFilename = os.path.join(tempDir, 'manifest%d.json' % moduleCount)
+            os.environ['DEPENDS_PLUGIN_MANIFEST'] = manifestFilename
+
+            def loadWithoutManifest():
+                if os.path.exists(manifestFilename):
+                    os.remove(manifestFilename)
+                depends_node.loadChildNodesFromPaths([pluginDir])
+
+            def createFirstNode():
+                depends_node.loadChildNodesFromPaths([pluginDir])
+                depends_node.nodeTypeNamed('DagNodePlugin000')()
+
+            benchmark_util.report("loading, no manifest", bestTimeInChild(loadWithoutManifest))
+            benchmark_util.report("loading, up to date manifest",
+                                  bestTimeInChild(lambda: depends_node.loadChildNodesFromPaths([pluginDir])))
+            benchmark_util.report("loading and creating one node", bestTimeInChild(createFirstNode))
+            benchmark_util.report("importing every module (previous)",
+                                  bestTimeInChild(lambda: depends_util.allClassesOfInheritedTypeFromDir(pluginDir, depends_node.DagNode)))
+    finally:
+        shutil.rmtree(tempDir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import random
+
+import benchmark_util
+
+import depends_dag
+import depends_node
+
+try:
+    from PySide import QtCore, QtGui
+    import depends_property_widget
+except ImportError:
+    depends_property_widget = None
+
+
+"""
+Measures the latency of changing the selection, from the newly selected node
+to the property widget showing its values, while clicking through nodes of a
+handful of types.  The pooled panels, which only rebind their edits to the
+new node, are compared against the previous property widget, which destroyed
+every edit and built new ones on every selection change.  Needs PySide, and
+with Qt 4 a display (xvfb-run will do).  Run with
+"python benchmarks/bench_property_selection.py [selectionCount ...]".
+"""
+
+
+NODE_TYPE_COUNT = 5
+NODES_PER_TYPE = 20
+
+# Every node type has this many attributes of each kind
+ATTRIBUTES_PER_KIND = 3
+
+
+###############################################################################
+## Nodes and widgets
+###############################################################################
+def makeNodeType(index):
+    def _defineAttributes(self):
+        attributes = list()
+        for i in range(ATTRIBUTES_PER_KIND):
+            attributes.append(depends_node.DagNodeAttribute('name%d' % i, "value%d" % i))
+            attributes.append(depends_node.DagNodeAttribute('scale%d' % i, "1.0", dataType='float'))
+            attributes.append(depends_node.DagNodeAttribute('enabled%d' % i, True, dataType='bool'))
+        return attributes
+    return type('DagNodeSelection%d' % index, (depends_node.DagNode,), {'_defineAttributes': _defineAttributes})
+
+
+if depends_property_widget:
+    class PreviousPropWidget(depends_property_widget.PropWidget):
+        """
+        PropWidget.rebuild() as it was before the pooled panels.
+        """
+
+        def rebuild(self, dag, dagNodes):
+            for child in self.foo.children():
+                if type(child) is not type(QtGui.QVBoxLayout()):
+                    self.scrollAreaLayout.removeWidget(child)
+                    child.setParent(None)
+                    child.deleteLater()
+
+            if not dagNodes or len(dagNodes) > 1:
+                return
+
+            self.dagNode = dagNodes[0]
+            attrChangedLambda = lambda propName, newValue, type, func=self.attrChanged.emit: func(self.dagNode, propName,
+                                                                                                  newValue, type)
+
+            nameWidget = depends_property_widget.GeneralEdit("Name", parent=self)
+            nameWidget.setValue(self.dagNode.name)
+            nameWidget.valueChanged.connect(attrChangedLambda)
+            self.scrollAreaLayout.addWidget(nameWidget)
+
+            attributeGroup = QtGui.QTabWidget()
+            attributeGroup.setSizePolicy(QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+            tabWidget = QtGui.QWidget()
+            attributeGroup.addTab(tabWidget, self.dagNode.typeStr())
+            attributeLayout = QtGui.QVBoxLayout(tabWidget)
+            attributeLayout.setContentsMargins(2, 2, 2, 2)
+            attributeLayout.setSpacing(2)
+
+            for attribute in self.dagNode.attributes():
+                if attribute.dataType in ['float', 'int']:
+                    newThing = depends_property_widget.FloatAttrEdit(attribute=attribute, dagNode=self.dagNode, dag=dag,
+                                                                     parent=attributeGroup)
+                elif attribute.dataType in ['bool']:
+                    newThing = depends_property_widget.BoolAttrEdit(attribute=attribute, dagNode=self.dagNode, dag=dag,
+                                                                    parent=attributeGroup)
+                else:
+                    newThing = depends_property_widget.StringAttrEdit(attribute=attribute, dagNode=self.dagNode, dag=dag,
+                                                                      parent=attributeGroup)
+                newThing.setValue(self.dagNode.attributeValue(attribute.name, variableSubstitution=False))
+                attributeLayout.addWidget(newThing)
+                newThing.valueChanged.connect(attrChangedLambda)
+            self.scrollAreaLayout.addWidget(attributeGroup)
+
+            resultField = depends_property_widget.GeneralEdit("Result", enabled=False,
+                                                              toolTip='Result of this nodes last run', parent=self)
+            resultField.setValue(self.dagNode.outVal)
+            self.scrollAreaLayout.addWidget(resultField)
+
+
+###############################################################################
+## Measurements
+###############################################################################
+def selectionSession(propWidget, dag, selections):
+    """
+    Show each node in turn, letting the widgets deleted by each change go the
+    way the event loop would.
+    """
+    for dagNode in selections:
+        propWidget.rebuild(dag, [dagNode])
+        QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+
+
+def main():
+    app = benchmark_util.offscreenApplication()
+    if depends_property_widget is None or app is None:
+        print "Skipped: needs PySide, and with Qt 4 a display"
+        return
+
+    dag = depends_dag.DAG()
+    dagNodes = list()
+    for typeIndex in range(NODE_TYPE_COUNT):
+        nodeType = makeNodeType(typeIndex)
+        for i in range(NODES_PER_TYPE):
+            dagNode = nodeType(name="type%d_%d" % (typeIndex, i))
+            dagNode.setAttributeValue('name0', dagNode.name)
+            dag.addNode(dagNode)
+            dagNodes.append(dagNode)
+
+    rng = random.Random(1)
+    for selectionCount in benchmark_util.sizesFromCommandline([200, 1000]):
+        selections = [rng.choice(dagNodes) for i in range(selectionCount)]
+        print "%d selection changes between %d nodes of %d types" % (selectionCount, len(dagNodes), NODE_TYPE_COUNT)
+        for (label, widgetType) in [("pooled panels", depends_property_widget.PropWidget),
+                                    ("rebuilt every time (previous)", PreviousPropWidget)]:
+            propWidget = widgetType()
+            benchmark_util.report("selection changes, %s" % label,
+                                  benchmark_util.bestTime(lambda: benchmark_util.quietly(
+                                      lambda: selectionSession(propWidget, dag, selections))), selectionCount)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import threading
+
+import benchmark_util
+
+import depends_remote
+
+
+"""
+Times the remote calls of a run of Maya nodes against a local rpyc classic
+server standing in for Maya.  Opening a new connection for every node, as
+the Maya nodes used to, is compared against pooled connections, against one
+batch per node, and against the whole run's calls sent together.  Needs rpyc.
+Run with "python benchmarks/bench_remote_pool.py [nodeCount ...]".
+"""
+
+
+# How many remote calls each node makes
+CALLS_PER_NODE = 5
+
+
+def startServer():
+    """
+    Start an rpyc classic server on a free local port in a background thread.
+    """
+    from rpyc.core.service import SlaveService
+    from rpyc.utils.server import ThreadedServer
+    server = ThreadedServer(SlaveService, hostname='127.0.0.1', port=0, auto_register=False)
+    serverThread = threading.Thread(target=server.start)
+    serverThread.daemon = True
+    serverThread.start()
+    return server
+
+
+def nodeCalls(nodeIndex):
+    return [depends_remote.remoteCall('os.path', 'join', '/scenes', 'node%d' % nodeIndex, 'call%d' % i)
+            for i in range(CALLS_PER_NODE)]
+
+
+def proxiedCalls(conn, calls):
+    """
+    Make each call through the connection's module proxies, a round trip
+    (or several) per call.
+    """
+    results = list()
+    for (moduleName, functionName, args, kwargs) in calls:
+        module = conn.modules[moduleName]
+        results.append(getattr(module, functionName)(*args, **dict(kwargs)))
+    return results
+
+
+def connectionPerNode(port, nodeCount):
+    import rpyc
+    for i in range(nodeCount):
+        conn = rpyc.classic.connect('127.0.0.1', port=port)
+        proxiedCalls(conn, nodeCalls(i))
+        conn.close()
+
+
+def pooledConnections(pool, nodeCount):
+    for i in range(nodeCount):
+        with pool.connection() as conn:
+            proxiedCalls(conn, nodeCalls(i))
+
+
+def batchPerNode(pool, nodeCount):
+    for i in range(nodeCount):
+        pool.runBatch(nodeCalls(i), mainThread=False)
+
+
+def batchPerRun(pool, nodeCount):
+    pool.runGroupOutcomes([nodeCalls(i) for i in range(nodeCount)], mainThread=False)
+
+
+def main():
+    server = startServer()
+    try:
+        pool = depends_remote.RemoteConnectionPool('127.0.0.1', server.port)
+        for nodeCount in benchmark_util.sizesFromCommandline([10, 100]):
+            print "%d nodes making %d calls each" % (nodeCount, CALLS_PER_NODE)
+            callCount = nodeCount * CALLS_PER_NODE
+            benchmark_util.report("a connection per node (previous)",
+                                  benchmark_util.bestTime(lambda: connectionPerNode(server.port, nodeCount)), callCount)
+            benchmark_util.report("pooled connections",
+                                  benchmark_util.bestTime(lambda: pooledConnections(pool, nodeCount)), callCount)
+            benchmark_util.report("pooled, a batch per node",
+                                  benchmark_util.bestTime(lambda: batchPerNode(pool, nodeCount)), callCount)
+            benchmark_util.report("pooled, one batch for the run",
+                                  benchmark_util.bestTime(lambda: batchPerRun(pool, nodeCount)), callCount)
+            print "  %d connections opened by the pool" % pool.connectCount
+        pool.closeAll()
+    finally:
+        server.close()
+        # Let the server and its client threads finish before the interpreter shuts down
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread():
+                thread.join()
+
+
+if __name__ == "__main__":
+    main()
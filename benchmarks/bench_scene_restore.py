@@ -0,0 +1,160 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import benchmark_util
+
+try:
+    from PySide import QtCore
+    import depends_graphics_widgets
+except ImportError:
+    depends_graphics_widgets = None
+
+
+"""
+Times restoring the draw nodes and draw edges of large workflows into the
+scene, as opening a workflow does (into an empty scene) and as undo and redo
+do (into a scene that already shows it).  The scene's registries of draw
+items by UUID are compared against the previous restore, which cleared the
+scene and looked every draw node and edge up by scanning the scene's items.
+The previous restore is quadratic, so it is only timed on small workflows.
+Needs PySide, and with Qt 4 a display (xvfb-run will do).  Run with
+"python benchmarks/bench_scene_restore.py [nodeCount ...]".
+"""
+
+
+# The largest workflow the previous restore is timed on
+MAX_PREVIOUS_NODES = 2000
+
+
+###############################################################################
+## Scenes
+###############################################################################
+if depends_graphics_widgets:
+    class PreviousSceneWidget(depends_graphics_widgets.SceneWidget):
+        """
+        The scene's lookups and restoreSnapshot() as they were before the
+        draw item registries.
+        """
+
+        def drawNodes(self):
+            nodes = list()
+            for item in self.items():
+                if type(item).__name__ == 'DrawNode':
+                    nodes.append(item)
+            return nodes
+
+
+        def drawNode(self, dagNode):
+            for item in self.items():
+                if type(item).__name__ != 'DrawNode':
+                    continue
+                if item.dagNode == dagNode:
+                    return item
+            return None
+
+
+        def drawEdges(self):
+            edges = list()
+            for item in self.items():
+                if type(item).__name__ == 'DrawEdge':
+                    edges.append(item)
+            return edges
+
+
+        def drawEdge(self, fromDrawNode, toDrawNode):
+            for item in self.items():
+                if type(item).__name__ != 'DrawEdge':
+                    continue
+                if item.source == fromDrawNode and item.dest == toDrawNode:
+                    return item
+            return None
+
+
+        def restoreSnapshot(self, snapshotDict):
+            selectedItems = self.selectedItems()
+            self.blockSignals(True)
+            for dn in self.drawNodes():
+                self.removeItem(dn)
+            for de in self.drawEdges():
+                self.removeItem(de)
+            for dagNode in self.dag.nodes():
+                newNode = self.addExistingDagNode(dagNode, QtCore.QPointF(0, 0))
+                if selectedItems and dagNode in [x.dagNode for x in selectedItems]:
+                    newNode.setSelected(True)
+            for connection in self.dag.connections():
+                self.addExistingConnection(connection[0], connection[1])
+            self.blockSignals(False)
+
+            expectedNodeMeta = snapshotDict["NODE_META"]
+            if expectedNodeMeta:
+                for dagNode in self.dag.nodes():
+                    drawNode = self.drawNode(dagNode)
+                    nodeMeta = expectedNodeMeta[str(dagNode.uuid)]
+                    drawNode.setPos(QtCore.QPointF(float(nodeMeta['locationX']), float(nodeMeta['locationY'])))
+
+            expectedConnectionMeta = snapshotDict["CONNECTION_META"]
+            if expectedConnectionMeta:
+                for connection in self.dag.connections():
+                    connectionIdString = "%s|%s" % (str(connection[0].uuid), str(connection[1].uuid))
+                    connectionMeta = expectedConnectionMeta[connectionIdString]
+                    drawEdge = self.drawEdge(self.drawNode(self.dag.node(nUUID=connection[0].uuid)),
+                                             self.drawNode(self.dag.node(nUUID=connection[1].uuid)))
+                    if drawEdge:
+                        drawEdge.sourcePort = connectionMeta['sourcePort']
+                        drawEdge.destPort = connectionMeta['destPort']
+                        drawEdge.adjust()
+
+
+###############################################################################
+## Measurements
+###############################################################################
+def sceneSnapshot(dag, dagNodes):
+    """
+    Return a snapshot of the DAG with the scene positions and edge ports the
+    MainWindow would save along with it.
+    """
+    nodeMetaDict = dict((str(n.uuid), {"locationX": str(float(i % 100) * 150.0), "locationY": str(float(i // 100) * 80.0)})
+                        for i, n in enumerate(dagNodes))
+    connectionMetaDict = dict(("%s|%s" % (str(c[0].uuid), str(c[1].uuid)), {"sourcePort": 0, "destPort": 0})
+                              for c in dag.connections())
+    return dag.snapshot(nodeMetaDict=nodeMetaDict, connectionMetaDict=connectionMetaDict, variableMetaList=[])
+
+
+def restoreIntoEmptyScene(sceneType, dag, snapshot):
+    scene = sceneType()
+    scene.setDag(dag)
+    benchmark_util.quietly(lambda: scene.restoreSnapshot(snapshot))
+    return scene
+
+
+def main():
+    app = benchmark_util.offscreenApplication()
+    if depends_graphics_widgets is None or app is None:
+        print "Skipped: needs PySide, and with Qt 4 a display"
+        return
+
+    for nodeCount in benchmark_util.sizesFromCommandline([1000, 10000]):
+        (dag, dagNodes) = benchmark_util.syntheticDag(nodeCount)
+        snapshot = sceneSnapshot(dag, dagNodes)
+        print "%d nodes, %d edges" % (nodeCount, dag.network.number_of_edges())
+
+        sceneType = depends_graphics_widgets.SceneWidget
+        benchmark_util.report("restore into an empty scene",
+                              benchmark_util.bestTime(lambda: restoreIntoEmptyScene(sceneType, dag, snapshot)), nodeCount)
+        scene = restoreIntoEmptyScene(sceneType, dag, snapshot)
+        benchmark_util.report("restore into a scene showing it",
+                              benchmark_util.bestTime(lambda: benchmark_util.quietly(lambda: scene.restoreSnapshot(snapshot))), nodeCount)
+
+        if nodeCount <= MAX_PREVIOUS_NODES:
+            benchmark_util.report("restore into an empty scene (previous)",
+                                  benchmark_util.bestTime(lambda: restoreIntoEmptyScene(PreviousSceneWidget, dag, snapshot),
+                                                          repeat=1), nodeCount)
+        else:
+            print "  previous restore skipped (more than %d nodes)" % MAX_PREVIOUS_NODES
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import benchmark_util
+
+sys.path.insert(0, os.path.join(benchmark_util.dependsDirectory, 'nodes'))
+import scope_nodes
+
+
+"""
+Times finding the latest lit scene of every shot in a synthetic project laid
+out on disk as <sequence>/<shot>/setups/maya/scenes/lit.  Every stat and
+directory listing is slowed down to stand in for network storage.  The
+threaded shot walker is compared, with an empty and with a warm directory
+cache, against the previous walk, which checked one shot at a time.  Needs
+the studio pipeline modules the scope nodes import (scopeApi and fsmpipe).
+Run with "python benchmarks/bench_scope_walk.py [shotCount ...]".
+"""
+
+
+# Seconds each filesystem query waits, standing in for a round trip to network storage
+STORAGE_LATENCY = 0.002
+
+SHOTS_PER_SEQUENCE = 50
+
+# Every this many shots has no lit scenes
+MISSING_LIT_EVERY = 7
+
+VERSIONS_PER_SHOT = 3
+
+
+###############################################################################
+## Synthetic project
+###############################################################################
+class SyntheticShot(object):
+    def __init__(self, path):
+        self.path = path
+
+    def getAttr(self, name):
+        return self.path
+
+
+class SyntheticSequence(object):
+    def __init__(self, path):
+        self.path = path
+
+    def getShots(self):
+        return [SyntheticShot(os.path.join(self.path, s)) for s in sorted(os.listdir(self.path))]
+
+
+def writeProject(rootDir, shotCount):
+    """
+    Write a project with shotCount shots, and return its sequences.
+    """
+    for i in range(shotCount):
+        seq = 'sq%03d' % (i // SHOTS_PER_SEQUENCE)
+        shot = 'sh%04d' % i
+        litDir = os.path.join(rootDir, seq, shot, 'setups', 'maya', 'scenes', 'lit')
+        if i % MISSING_LIT_EVERY == 0:
+            os.makedirs(os.path.dirname(litDir))
+            continue
+        os.makedirs(litDir)
+        for version in range(1, VERSIONS_PER_SHOT + 1):
+            open(os.path.join(litDir, '%s%s_lit_v%03d_wip.ma' % (seq, shot, version)), 'w').close()
+    return [SyntheticSequence(os.path.join(rootDir, s)) for s in sorted(os.listdir(rootDir))]
+
+
+def slowedDown(function):
+    def slowFunction(*args):
+        time.sleep(STORAGE_LATENCY)
+        return function(*args)
+    return slowFunction
+
+
+###############################################################################
+## Measurements
+###############################################################################
+def previousWalk(sequences):
+    """
+    DagNodeScopeGetLatestFile.executePython() as it was before the threaded
+    walker, without its printing.
+    """
+    fileUtils = scope_nodes.fileUtils
+    ret = []
+    for seq in sequences:
+        for shot in seq.getShots():
+            shotPath = shot.getAttr('path')
+            mayaDir = fileUtils.unixSlashes(os.path.join(shotPath, 'setups', 'maya', 'scenes', 'lit'))
+            if os.path.isdir(mayaDir):
+                context = scope_nodes.pathManager.getContextFromPath(shotPath)
+                foo = scope_nodes.pathTokens.pathToken()
+                foo.values = context
+                baseName = foo.buildFromTokens('[seq][shot]_lit_v001xx_wip.ma')
+
+                pathToBaseFile = fileUtils.unixSlashes(os.path.join(mayaDir, baseName))
+                lastestFile = fileUtils.findLatestFile(pathToBaseFile)
+                if lastestFile:
+                    ret.append(fileUtils.unixSlashes(os.path.join(mayaDir, lastestFile)))
+    return ret
+
+
+def coldWalk(sequences):
+    scope_nodes.directoryCache.invalidate()
+    return list(scope_nodes.walkLatestLitFiles(sequences))
+
+
+def firstPath(sequences):
+    scope_nodes.directoryCache.invalidate()
+    walker = scope_nodes.walkLatestLitFiles(sequences)
+    next(walker)
+    walker.close()
+
+
+def main():
+    tempDir = tempfile.mkdtemp()
+    (realStat, realListdir) = (os.stat, os.listdir)
+    try:
+        for shotCount in benchmark_util.sizesFromCommandline([500, 2000]):
+            print "%d shots, %.0fms per filesystem query" % (shotCount, STORAGE_LATENCY * 1000)
+            sequences = writeProject(os.path.join(tempDir, 'project%d' % shotCount), shotCount)
+            (os.stat, os.listdir) = (slowedDown(realStat), slowedDown(realListdir))
+            try:
+                if coldWalk(sequences) != previousWalk(sequences):
+                    raise RuntimeError("The threaded walker found different scenes than the previous walk")
+                benchmark_util.report("previous walk", benchmark_util.bestTime(lambda: previousWalk(sequences), repeat=1), shotCount)
+                benchmark_util.report("threaded walk, empty cache", benchmark_util.bestTime(lambda: coldWalk(sequences)), shotCount)
+                benchmark_util.report("threaded walk, warm cache",
+                                      benchmark_util.bestTime(lambda: list(scope_nodes.walkLatestLitFiles(sequences))), shotCount)
+                benchmark_util.report("threaded walk, first scene found", benchmark_util.bestTime(lambda: firstPath(sequences)))
+            finally:
+                (os.stat, os.listdir) = (realStat, realListdir)
+    finally:
+        shutil.rmtree(tempDir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+import benchmark_util
+
+import depends_dag
+import depends_node
+import depends_workflow_file
+
+
+"""
+Times a whole commandline session, from starting Python to executing a node,
+the way a render farm job runs one.  The -nogui session is compared against
+the path it used to take, which built a QApplication and the full MainWindow
+before executing.  That path needs PySide and a display, and is skipped when
+either is missing.  Run with "python benchmarks/bench_startup.py [nodeCount ...]".
+"""
+
+
+# How many times each session is started
+SESSION_REPEAT = 5
+
+PLUGIN_SOURCE = """
+import depends_node
+
+class DagNodeStartupBenchmark(depends_node.DagNode):
+    def _defineInputs(self):
+        return [depends_node.DagNodeInput('input', 'file', True)]
+
+    def _defineOutputs(self):
+        return [depends_node.DagNodeOutput('output', 'file')]
+
+    def executePython(self):
+        self.outVal = len(self.getPortValues(0))
+"""
+
+# What -nogui did before the engine existed
+GUI_SESSION_SOURCE = """
+import sys
+from PySide import QtGui
+import depends_main_window
+app = QtGui.QApplication(sys.argv)
+mainWindow = depends_main_window.MainWindow(startFile=sys.argv[1])
+mainWindow.dagExecuteNode(mainWindow.dag.node(name=sys.argv[2]))
+"""
+
+
+def runSession(argList, environment):
+    """
+    Run a Python process with the given arguments in the Depends directory,
+    raising a RuntimeError if it fails.
+    """
+    with open(os.devnull, 'w') as devnull:
+        returnCode = subprocess.call([sys.executable] + argList, cwd=benchmark_util.dependsDirectory,
+                                     env=environment, stdout=devnull, stderr=devnull)
+    if returnCode != 0:
+        raise RuntimeError("Session %s exited with %d" % (" ".join(argList), returnCode))
+
+
+def guiAvailable(environment):
+    """
+    Return True if PySide can be imported and a display is available.
+    """
+    if not environment.get('DISPLAY'):
+        return False
+    try:
+        runSession(['-c', 'import PySide.QtGui'], environment)
+    except RuntimeError:
+        return False
+    return True
+
+
+def main():
+    tempDir = tempfile.mkdtemp()
+    try:
+        pluginDir = os.path.join(tempDir, 'nodes')
+        os.mkdir(pluginDir)
+        with open(os.path.join(pluginDir, 'startup_benchmark_nodes.py'), 'w') as fp:
+            fp.write(PLUGIN_SOURCE)
+        environment = dict(os.environ)
+        environment['DEPENDS_NODE_PATH'] = ":".join([os.path.join(benchmark_util.dependsDirectory, 'nodes'), pluginDir])
+        environment['DEPENDS_PLUGIN_MANIFEST'] = os.path.join(tempDir, 'manifest.json')
+        environment.pop('DEPENDS_CACHE_DIR', None)
+        os.environ['DEPENDS_PLUGIN_MANIFEST'] = environment['DEPENDS_PLUGIN_MANIFEST']
+        depends_node.loadChildNodesFromPaths([pluginDir])
+        withGui = guiAvailable(environment)
+
+        for nodeCount in benchmark_util.sizesFromCommandline([10, 1000]):
+            print "Workflow of %d nodes in a chain" % nodeCount
+            dag = depends_dag.DAG()
+            dagNodes = benchmark_util.addNodes(dag, nodeCount, nodeType=depends_node.nodeTypeNamed('DagNodeStartupBenchmark'))
+            dag.connectNodeList([(a, b, 0, 0) for (a, b) in zip(dagNodes, dagNodes[1:])])
+            workflowFilename = os.path.join(tempDir, 'startup%d.json' % nodeCount)
+            depends_workflow_file.writeWorkflow(workflowFilename, dag, {}, {}, [], {})
+            lastName = dagNodes[-1].name
+
+            benchmark_util.report("import depends_engine",
+                                  benchmark_util.bestTime(lambda: runSession(['-c', 'import depends_engine'], environment),
+                                                          repeat=SESSION_REPEAT))
+            benchmark_util.report("depends -nogui",
+                                  benchmark_util.bestTime(lambda: runSession(['depends', '-nogui', '-workflow', workflowFilename,
+                                                                              '-node', lastName], environment),
+                                                          repeat=SESSION_REPEAT))
+            if withGui:
+                benchmark_util.report("MainWindow session (previous -nogui)",
+                                      benchmark_util.bestTime(lambda: runSession(['-c', GUI_SESSION_SOURCE, workflowFilename,
+                                                                                  lastName], environment),
+                                                              repeat=SESSION_REPEAT))
+            else:
+                print "  MainWindow session (previous -nogui) skipped: needs PySide and a display"
+    finally:
+        shutil.rmtree(tempDir)
+
+
+if __name__ == "__main__":
+    main()
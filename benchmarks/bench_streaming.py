@@ -0,0 +1,123 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import sys
+
+import benchmark_util
+
+import depends_dag
+import depends_node
+import depends_stream
+import depends_execution
+
+sys.path.insert(0, os.path.join(benchmark_util.dependsDirectory, 'nodes'))
+import base_nodes
+
+
+"""
+Measures the peak memory and time of a long chain of execute nodes passing
+on a list of file paths, the way the output of a scope node would flow
+through a workflow.  The chain is run with every node passing on finished
+lists, and again with every node streaming its items on to the next as they
+are produced.  Each run happens in a fresh process.  Run with
+"python benchmarks/bench_streaming.py [itemCount ...]".
+"""
+
+
+# How many execute nodes the paths pass through
+CHAIN_LENGTH = 10
+
+
+###############################################################################
+## Nodes
+###############################################################################
+class DagNodeProducePaths(depends_node.DagNode):
+    """
+    Produces itemCount made up scene paths, as a list or one at a time.
+    """
+
+    streaming = False
+    itemCount = 0
+
+    def isCacheable(self):
+        return False
+
+    def isStreaming(self):
+        return self.streaming
+
+    def executePython(self):
+        paths = ('/project/sq%03d/sh%05d/setups/maya/scenes/lit/sq%03dsh%05d_lit_v%03d_wip.ma' % (i // 50, i, i // 50, i, i % 13)
+                 for i in xrange(self.itemCount))
+        self.outVal = paths if self.streaming else list(paths)
+
+
+class DagNodeCountPaths(depends_node.DagNode):
+    """
+    Counts the paths it is given, reading streams as they arrive.  Execute
+    nodes passing on lists wrap them in another list at every hop.
+    """
+
+    def _defineInputs(self):
+        return [depends_node.DagNodeInput('input1', 'any', None)]
+
+    def readsStreams(self):
+        return True
+
+    def executePython(self):
+        self.outVal = self.count(self.getPortValues(0))
+
+    def count(self, value):
+        if depends_stream.isStream(value) or isinstance(value, (list, tuple)):
+            return sum(self.count(item) for item in value)
+        return 1
+
+
+###############################################################################
+## Measurements
+###############################################################################
+def runChain(itemCount, streaming):
+    """
+    Build and run the chain, returning how many paths reached its end.
+    """
+    dag = depends_dag.DAG()
+    producer = DagNodeProducePaths(name="produce")
+    producer.streaming = streaming
+    producer.itemCount = itemCount
+    dag.addNode(producer)
+    previousNode = producer
+    for i in range(CHAIN_LENGTH):
+        executeNode = base_nodes.DagNodeExecute(name="execute%d" % i)
+        executeNode.setAttributeValue('stream', streaming)
+        dag.addNode(executeNode)
+        dag.connectNodes(previousNode, executeNode)
+        previousNode = executeNode
+    counter = DagNodeCountPaths(name="count")
+    dag.addNode(counter)
+    dag.connectNodes(previousNode, counter)
+
+    # The execute nodes print the lists they pass on
+    (stdout, sys.stdout) = (sys.stdout, open(os.devnull, 'w'))
+    try:
+        report = depends_execution.DagExecutor(dag).execute(counter)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    if not report.succeeded() or counter.outVal != itemCount:
+        raise RuntimeError("The chain counted %r of %d paths" % (counter.outVal, itemCount))
+    return counter.outVal
+
+
+def main():
+    for itemCount in benchmark_util.sizesFromCommandline([100000, 300000]):
+        print "%d paths through %d execute nodes" % (itemCount, CHAIN_LENGTH)
+        for (label, streaming) in [("lists", False), ("streams", True)]:
+            benchmark_util.reportMemory("%s, peak memory" % label, benchmark_util.peakMemory(lambda: runChain(itemCount, streaming)))
+            benchmark_util.report("%s, time" % label, benchmark_util.timeInChild(lambda: runChain(itemCount, streaming)), itemCount)
+
+
+if __name__ == "__main__":
+    main()
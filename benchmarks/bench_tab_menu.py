@@ -0,0 +1,127 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import time
+import random
+
+import benchmark_util
+
+import tabMenu
+
+
+"""
+Measures the latency of each keystroke typed into the tab menu's search
+field, from the new filter text to the list of nodes to show, with thousands
+of node types to search.  The indexed search is compared against the
+previous full scan, which rebuilt every node's display name and matched it
+on every keystroke.  The menu's model is a QAbstractListModel, so this needs
+PySide (but no display).  Run with "python benchmarks/bench_tab_menu.py
+[nodeTypeCount ...]".
+"""
+
+
+WORDS = ['read', 'write', 'merge', 'blur', 'grade', 'transform', 'camera', 'light', 'shader', 'mesh',
+         'scope', 'latest', 'file', 'directory', 'list', 'sequence', 'cache', 'render', 'matchmove', 'denoise']
+
+CATEGORIES = ['3D', '3D/Shader', 'Filter', 'Color', 'Image', 'Scope', 'Maya', 'File', 'Math', 'Utility']
+
+# Filters typed a character at a time, the way a user would
+TYPED_FILTERS = ['mergeblur', 'rd', 'shader  3d', ' cam', 'zzz']
+
+
+def nodeList(nodeTypeCount, seed=1):
+    """
+    Return the tab menu's description of nodeTypeCount made up node types.
+    """
+    rng = random.Random(seed)
+    nodes = list()
+    for i in range(nodeTypeCount):
+        name = "".join(w.capitalize() for w in rng.sample(WORDS, rng.randint(1, 3))) + str(i)
+        menupath = "%s/%s" % (rng.choice(CATEGORIES), name)
+        nodes.append({'menupath': menupath, 'menuobj': None, 'object': name})
+    return nodes
+
+
+def previousNonconsecFind(needle, haystack, anchored=False):
+    """
+    tabMenu.nonconsec_find() as it was before the search index.
+    """
+    if "[" not in needle:
+        haystack = haystack.rpartition(" [")[0]
+    if len(haystack) == 0 and len(needle) > 0:
+        return False
+    elif len(needle) == 0:
+        return True
+    haystack = [hay for hay in str(haystack)]
+    if needle.startswith(" "):
+        if anchored:
+            if "".join(haystack).startswith(needle.lstrip(" ")):
+                return True
+        else:
+            if needle.lstrip(" ") in "".join(haystack):
+                return True
+    if anchored:
+        if needle[0] != haystack[0]:
+            return False
+        else:
+            needle = needle[1:]
+            del haystack[0]
+    for needle_atom in needle:
+        try:
+            needle_pos = haystack.index(needle_atom)
+        except ValueError:
+            return False
+        else:
+            del haystack[:needle_pos + 1]
+    return True
+
+
+def previousUpdate(nodes, filtertext):
+    """
+    NodeModel.update() as it was before the search index, without the
+    model reset.
+    """
+    filtertext = filtertext.lower().replace("  ", "[")
+    scored = []
+    for n in nodes:
+        menupath = n['menupath'].replace("&", "")
+        uiname = "%s [%s]" % (menupath.rpartition("/")[2], menupath.rpartition("/")[0])
+        if previousNonconsecFind(filtertext, uiname.lower(), anchored=True):
+            scored.append({'text': uiname, 'menupath': n['menupath'], 'menuobj': n['menuobj'],
+                           'object': n['object'], 'score': 1})
+    return sorted(scored, key=lambda k: (-k['score'], k['text']))
+
+
+def typingLatencies(updateFunction, filtertext):
+    """
+    Return the seconds each keystroke of typing the filter took, followed by
+    the seconds each keystroke of deleting it again took.
+    """
+    prefixes = [filtertext[:i] for i in range(1, len(filtertext) + 1)]
+    latencies = list()
+    for prefix in prefixes + prefixes[-2::-1]:
+        start = time.time()
+        updateFunction(prefix)
+        latencies.append(time.time() - start)
+    return latencies
+
+
+def main():
+    for nodeTypeCount in benchmark_util.sizesFromCommandline([500, 5000]):
+        nodes = nodeList(nodeTypeCount)
+        print "%d node types" % nodeTypeCount
+        benchmark_util.report("building the index", benchmark_util.bestTime(lambda: tabMenu.SearchIndex(nodes)))
+        model = tabMenu.NodeModel(nodes)
+        for filtertext in TYPED_FILTERS:
+            for (label, updateFunction) in [("indexed", model.set_filter),
+                                            ("previous scan", lambda text: previousUpdate(nodes, text))]:
+                latencies = typingLatencies(updateFunction, filtertext)
+                benchmark_util.report("'%s' %s, mean keystroke" % (filtertext, label), sum(latencies) / len(latencies))
+                benchmark_util.report("'%s' %s, slowest keystroke" % (filtertext, label), max(latencies))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import benchmark_util
+
+try:
+    import depends_undo_commands
+except ImportError:
+    depends_undo_commands = None
+
+
+"""
+Measures the memory and time each undo step of an editing session costs,
+with every step changing one attribute of one node.  The delta commands are
+compared against the two full DAG snapshots each step used to store.  The
+undo commands are QUndoCommands, so that half needs PySide (but no display).
+Run with "python benchmarks/bench_undo_memory.py [nodeCount ...]".
+"""
+
+
+# How many edits each session makes.  Delta steps are small enough that it
+# takes thousands of them to register in the process's memory.
+SNAPSHOT_STEP_COUNT = 20
+DELTA_STEP_COUNT = 5000
+
+
+def editAttribute(dagNode, step):
+    dagNode.setAttributeValue('weight', str(step))
+
+
+def snapshotSession(dag, dagNodes, stepCount):
+    """
+    Each step keeps the before and after snapshots of the DAG.
+    """
+    undoStack = list()
+    for step in range(stepCount):
+        before = dag.snapshot()
+        editAttribute(dagNodes[step % len(dagNodes)], step)
+        undoStack.append((before, dag.snapshot()))
+    return undoStack
+
+
+def deltaSession(dag, dagNodes, stepCount):
+    """
+    Each step keeps a PropertiesUndoCommand for the node it edited.
+    """
+    undoStack = list()
+    for step in range(stepCount):
+        dagNode = dagNodes[step % len(dagNodes)]
+        oldStates = depends_undo_commands.nodePropertyStates([dagNode])
+        editAttribute(dagNode, step)
+        undoStack.append(depends_undo_commands.PropertiesUndoCommand(oldStates, dag, None))
+    return undoStack
+
+
+def main():
+    for nodeCount in benchmark_util.sizesFromCommandline([100, 1000, 5000]):
+        (dag, dagNodes) = benchmark_util.syntheticDag(nodeCount)
+        print "Attribute edits to a DAG of %d nodes" % nodeCount
+        sessions = [("two DAG snapshots (previous)", snapshotSession, SNAPSHOT_STEP_COUNT)]
+        if depends_undo_commands:
+            sessions.insert(0, ("PropertiesUndoCommand", deltaSession, DELTA_STEP_COUNT))
+        else:
+            print "  PropertiesUndoCommand skipped: needs PySide"
+        for (label, session, stepCount) in sessions:
+            benchmark_util.reportMemory("%s, memory per step" % label,
+                                        benchmark_util.peakMemory(lambda: session(dag, dagNodes, stepCount)) / float(stepCount))
+            benchmark_util.report("%s, time per step" % label,
+                                  benchmark_util.bestTime(lambda: session(dag, dagNodes, stepCount), repeat=1) / stepCount)
+
+
+if __name__ == "__main__":
+    main()
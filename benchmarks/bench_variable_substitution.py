@@ -0,0 +1,103 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import re
+
+import benchmark_util
+
+import depends_variables
+
+
+"""
+Measures the throughput of depends_variables.substitute() on typical file
+path templates: the same templates over and over, a fresh template every
+call, and the same templates while the variable table keeps changing.  The
+regex-per-call implementation it replaced is timed on the repeated templates
+for comparison.  Run with "python benchmarks/bench_variable_substitution.py
+[substitutionCount ...]".
+"""
+
+
+# How many distinct templates the repeated runs cycle through
+TEMPLATE_COUNT = 1000
+
+# How many substitutions are done between variable changes
+SUBSTITUTIONS_PER_CHANGE = 1000
+
+VARIABLES = {'PROJECT_ROOT': '/mnt/projects/benchmark', 'SEQUENCE': 'sq010', 'VERSION': 'v003'}
+
+
+def regexSubstitute(incomingString):
+    """
+    depends_variables.substitute() as it was before it was tokenized.
+    """
+    newString = incomingString
+    singleDollars = re.compile(r"((?<!\\)(?<!\$)\${1}(?!\$)[A-Z0-9_]*)")
+    for match in singleDollars.finditer(newString):
+        variableName = match.group()[1:]
+        if variableName in depends_variables.variableSubstitutions:
+            substitution = depends_variables.variableSubstitutions[variableName][0]
+            newString = newString[:match.start()] + substitution + newString[match.end():]
+    doubleDollars = re.compile(r"((?<!\\)(?<!\$)\${2}(?!\$)[A-Z0-9_]*)")
+    for match in doubleDollars.finditer(newString):
+        variableName = match.group()[2:]
+        if variableName in os.environ:
+            substitution = os.environ[variableName]
+            newString = newString[:match.start()] + substitution + newString[match.end():]
+    newString = newString.replace('\$', '$')
+    return newString
+
+
+def template(i):
+    return "$PROJECT_ROOT/$SEQUENCE/shot%05d/$VERSION/$$HOME/render.####.exr" % i
+
+
+def clearCaches():
+    depends_variables._tokenCache.clear()
+    depends_variables._substitutionCache.clear()
+
+
+def substituteAll(templates, count, substituteFunction=depends_variables.substitute):
+    templateCount = len(templates)
+    for i in xrange(count):
+        substituteFunction(templates[i % templateCount])
+
+
+def substituteWhileChanging(templates, count):
+    templateCount = len(templates)
+    for i in xrange(count):
+        if i % SUBSTITUTIONS_PER_CHANGE == 0:
+            depends_variables.setx('VERSION', 'v%03d' % (i // SUBSTITUTIONS_PER_CHANGE))
+        depends_variables.substitute(templates[i % templateCount])
+
+
+def main():
+    for (name, value) in VARIABLES.items():
+        if name not in depends_variables.names():
+            depends_variables.add(name)
+        depends_variables.setx(name, value)
+
+    for count in benchmark_util.sizesFromCommandline([1000000]):
+        print "%d substitutions" % count
+        templates = [template(i) for i in range(TEMPLATE_COUNT)]
+        freshTemplates = [template(i) for i in xrange(count)]
+
+        clearCaches()
+        benchmark_util.report("%d templates, repeated" % TEMPLATE_COUNT,
+                              benchmark_util.bestTime(lambda: substituteAll(templates, count), repeat=1), count)
+        clearCaches()
+        benchmark_util.report("a new template every call",
+                              benchmark_util.bestTime(lambda: substituteAll(freshTemplates, count), repeat=1), count)
+        clearCaches()
+        benchmark_util.report("repeated, a variable changing every %d" % SUBSTITUTIONS_PER_CHANGE,
+                              benchmark_util.bestTime(lambda: substituteWhileChanging(templates, count), repeat=1), count)
+        benchmark_util.report("repeated, previous regex implementation",
+                              benchmark_util.bestTime(lambda: substituteAll(templates, count, regexSubstitute), repeat=1), count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import shutil
+import tempfile
+
+import benchmark_util
+
+import depends_dag
+import depends_workflow_file
+
+
+"""
+Saves and loads synthetic workflows in each workflow file format, comparing
+the time, the peak memory, and the size on disk of the streaming formats
+against the single JSON document.  Run with
+"python benchmarks/bench_workflow_file.py [nodeCount ...]".
+"""
+
+
+FORMATS = [(depends_workflow_file.FORMAT_JSON, '.json'),
+           (depends_workflow_file.FORMAT_STREAM, '.jsonl'),
+           (depends_workflow_file.FORMAT_STREAM_GZIP, '.jsonl.gz')]
+
+
+def nodeMeta(dagNodes):
+    """
+    The scene positions the MainWindow would save along with the nodes.
+    """
+    return dict((str(n.uuid), {"locationX": float(i % 100) * 150.0, "locationY": float(i // 100) * 80.0})
+                for i, n in enumerate(dagNodes))
+
+
+def load(filename):
+    depends_workflow_file.readWorkflow(filename, depends_dag.DAG())
+
+
+def main():
+    tempDir = tempfile.mkdtemp()
+    try:
+        for nodeCount in benchmark_util.sizesFromCommandline([1000, 10000, 50000]):
+            (dag, dagNodes) = benchmark_util.syntheticDag(nodeCount)
+            metaDict = nodeMeta(dagNodes)
+            print "%d nodes" % nodeCount
+            for (fileFormat, extension) in FORMATS:
+                filename = os.path.join(tempDir, 'workflow%d%s' % (nodeCount, extension))
+                save = lambda: depends_workflow_file.writeWorkflow(filename, dag, metaDict, {}, [], {}, fileFormat=fileFormat)
+                benchmark_util.report("%s save" % fileFormat, benchmark_util.bestTime(save))
+                benchmark_util.report("%s load" % fileFormat, benchmark_util.bestTime(lambda: load(filename)))
+                benchmark_util.reportMemory("%s load, peak memory" % fileFormat, benchmark_util.peakMemory(lambda: load(filename)))
+                benchmark_util.reportMemory("%s file size" % fileFormat, os.path.getsize(filename))
+    finally:
+        shutil.rmtree(tempDir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import gc
+import sys
+import time
+import random
+import resource
+import traceback
+
+# The Depends modules live one directory up from the benchmarks
+dependsDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if dependsDirectory not in sys.path:
+    sys.path.insert(0, dependsDirectory)
+
+import depends_dag
+import depends_node
+
+
+"""
+Timing, memory, and synthetic graph helpers shared by the benchmark scripts.
+Each script is run on its own, eg. "python benchmarks/bench_node_lookup.py",
+and most take the problem sizes to try as commandline arguments.  Memory is
+measured from /proc, so the memory figures are only available on Linux.
+"""
+
+
+###############################################################################
+## Measuring
+###############################################################################
+def bestTime(function, repeat=3):
+    """
+    Return the fastest of several runs of the given function, in seconds.
+    """
+    times = list()
+    for i in range(repeat):
+        gc.collect()
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def residentBytes():
+    """
+    Return the current resident memory of this process, in bytes.
+    """
+    with open('/proc/self/statm') as fp:
+        return int(fp.read().split()[1]) * resource.getpagesize()
+
+
+def _measureInChild(measurement):
+    """
+    Run a function returning a number in a forked child, and return the
+    number.  Raises a RuntimeError if the function fails.
+    """
+    (readFd, writeFd) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(readFd)
+        result = None
+        try:
+            result = measurement()
+        except:
+            traceback.print_exc()
+        finally:
+            os.write(writeFd, repr(result))
+            os._exit(0)
+    os.close(writeFd)
+    result = ""
+    while True:
+        data = os.read(readFd, 64)
+        if not data:
+            break
+        result += data
+    os.close(readFd)
+    os.waitpid(pid, 0)
+    if result in ("", "None"):
+        raise RuntimeError("Measurement failed in the child process.")
+    return float(result)
+
+
+def peakMemory(function):
+    """
+    Return how many bytes the peak resident memory grows by while the given
+    function runs.  The function runs in a forked child, so memory left over
+    from one measurement can't hide the next.  Whatever it returns is lost.
+    Memory the interpreter already holds is reused first, so small amounts
+    only register when they're allocated many times over.
+    """
+    def measurement():
+        gc.collect()
+        before = residentBytes()
+        function()
+        return max(0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - before)
+    return _measureInChild(measurement)
+
+
+def timeInChild(function):
+    """
+    Return how many seconds the given function takes to run in a forked
+    child.  For measuring things that can only happen once per process, like
+    importing modules.
+    """
+    def measurement():
+        gc.collect()
+        start = time.time()
+        function()
+        return time.time() - start
+    return _measureInChild(measurement)
+
+
+def quietly(function):
+    """
+    Call the given function with its printing thrown away, and return what
+    it returns.  For code that prints as it goes, like the draw nodes.
+    """
+    (stdout, sys.stdout) = (sys.stdout, open(os.devnull, 'w'))
+    try:
+        return function()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def offscreenApplication():
+    """
+    Return a QApplication for benchmarks of Qt widgets, or None if PySide
+    isn't available.  Qt 5 and later are asked to draw offscreen.  Qt 4 has
+    no offscreen platform, so it needs a display (a virtual one, like
+    xvfb-run provides, is fine), and None is returned without one.
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PySide import QtCore, QtGui
+    except ImportError:
+        return None
+    if QtCore.qVersion().startswith('4.') and not os.environ.get('DISPLAY'):
+        return None
+    return QtGui.QApplication.instance() or QtGui.QApplication(sys.argv)
+
+
+def sizesFromCommandline(defaultSizes):
+    """
+    Return the problem sizes given as commandline arguments, or the defaults.
+    """
+    return [int(x) for x in sys.argv[1:]] or defaultSizes
+
+
+def report(label, seconds, count=None):
+    """
+    Print a timing, along with the rate per second if a count is given.
+    """
+    if count:
+        print "  %-48s %10.4fs %14.0f/s" % (label, seconds, count / seconds if seconds else float('inf'))
+    else:
+        print "  %-48s %10.4fs" % (label, seconds)
+
+
+def reportMemory(label, byteCount):
+    """
+    Print a memory measurement in megabytes, or kilobytes if it's smaller.
+    """
+    if byteCount < 1024 * 1024:
+        print "  %-48s %10.2f KB" % (label, byteCount / 1024.0)
+    else:
+        print "  %-48s %10.2f MB" % (label, byteCount / (1024.0 * 1024.0))
+
+
+###############################################################################
+## Synthetic graphs
+###############################################################################
+class DagNodeBenchmark(depends_node.DagNode):
+    """
+    A node with an input, an output, and an attribute, that passes on the
+    number of values fed into it.
+    """
+
+    def _defineInputs(self):
+        return [depends_node.DagNodeInput('input', 'file', True)]
+
+    def _defineOutputs(self):
+        return [depends_node.DagNodeOutput('output', 'file')]
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('weight', "1")]
+
+    def executePython(self):
+        self.outVal = 1 + sum(len(value) if isinstance(value, list) else value for value in self.getPortValues(0))
+
+
+def addNodes(dag, nodeCount, nodeType=DagNodeBenchmark, prefix="node"):
+    """
+    Add nodeCount new nodes to the DAG, returning them in a list.
+    """
+    dagNodes = list()
+    for i in range(nodeCount):
+        dagNode = nodeType(name="%s%d" % (prefix, i))
+        dagNode.setInputValue('input', '/tmp/%s%d.in' % (prefix, i))
+        dagNode.setOutputValue('output', 'file', '/tmp/%s%d.####.out' % (prefix, i))
+        dag.addNode(dagNode)
+        dagNodes.append(dagNode)
+    return dagNodes
+
+
+def syntheticDag(nodeCount, maxInputs=2, seed=1):
+    """
+    Return a DAG of nodeCount nodes, each fed by up to maxInputs randomly
+    chosen earlier nodes, and the list of its nodes in the order created.
+    """
+    rng = random.Random(seed)
+    dag = depends_dag.DAG()
+    dagNodes = addNodes(dag, nodeCount)
+    connectionList = list()
+    for i in range(1, nodeCount):
+        for upstreamIndex in set(rng.randrange(i) for j in range(rng.randint(1, maxInputs))):
+            connectionList.append((dagNodes[upstreamIndex], dagNodes[i], 0, 0))
+    dag.connectNodeList(connectionList)
+    return (dag, dagNodes)
+
+
+def latticeDag(width, depth):
+    """
+    Return a DAG of depth layers of width nodes, with every node connected to
+    every node in the layer below it, and the single node at its bottom.
+    Every node above the bottom is reached by width ** n paths.
+    """
+    dag = depends_dag.DAG()
+    layers = [addNodes(dag, 1, prefix="top")]
+    for layerIndex in range(depth):
+        layers.append(addNodes(dag, width, prefix="layer%d_" % layerIndex))
+    layers.append(addNodes(dag, 1, prefix="bottom"))
+    connectionList = list()
+    for (upper, lower) in zip(layers, layers[1:]):
+        for upperNode in upper:
+            for lowerNode in lower:
+                connectionList.append((upperNode, lowerNode, 0, 0))
+    dag.connectNodeList(connectionList)
+    return (dag, layers[-1][0])
+
+
+def snapshotForFile(dag):
+    """
+    Return a snapshot of the DAG with empty meta information, ready to be
+    restored or written to a workflow file.
+    """
+    return dag.snapshot(nodeMetaDict={}, connectionMetaDict={}, variableMetaList=[])
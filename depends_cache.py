@@ -0,0 +1,255 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import time
+import shelve
+import cPickle
+import hashlib
+from collections import OrderedDict
+
+import depends_variables
+
+
+"""
+A cache of node results (DagNode.outVal) that lets the execution engine skip
+nodes whose result can't have changed since they last ran.  Each result is
+filed under a key built from the node's type, its property values and
+sequence ranges (with workflow variables substituted), and the keys of every
+node feeding its input ports, so a change anywhere upstream produces a new
+key.  Results are held in a least-recently-used in-memory tier and
+optionally in an on-disk shelf.  Both tiers are limited to a number of
+results, and optionally to a number of bytes.
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+def _substitutedValue(value):
+    """
+    Return a property value with workflow variables substituted, in a form
+    suitable for hashing.
+    """
+    if isinstance(value, basestring):
+        return depends_variables.substitute(value)
+    return repr(value)
+
+
+def _substitutedRange(seqRange):
+    """
+    Return a property's sequence range with workflow variables substituted,
+    in a form suitable for hashing.
+    """
+    if not seqRange:
+        return None
+    return tuple(_substitutedValue(v) for v in seqRange)
+
+
+def nodeCacheKey(dagNode, portKeyDict):
+    """
+    Compute the cache key for a node, given a dict containing the cache keys
+    of the nodes connected to each of its input ports ({port: [keys]}).
+    Returns None if the node or anything upstream of it can't be cached.
+    Streaming nodes are never cached, since their results are used up as
+    they are read.
+    """
+    if not dagNode.isCacheable() or dagNode.isStreaming():
+        return None
+    keyParts = [type(dagNode).__name__]
+    for input in dagNode.inputs():
+        keyParts.append(("INPUT", input.name, _substitutedValue(input.value), _substitutedRange(input.seqRange)))
+    for output in dagNode.outputs():
+        keyParts.append(("OUTPUT", output.name, sorted((k, _substitutedValue(v)) for k, v in output.value.items()),
+                         _substitutedRange(output.seqRange)))
+    for attribute in dagNode.attributes():
+        keyParts.append(("ATTRIBUTE", attribute.name, _substitutedValue(attribute.value),
+                         _substitutedRange(attribute.seqRange)))
+    for port in sorted(portKeyDict):
+        if None in portKeyDict[port]:
+            return None
+        keyParts.append(("PORT", port, portKeyDict[port]))
+    return hashlib.sha1(repr(keyParts)).hexdigest()
+
+
+###############################################################################
+###############################################################################
+class ResultCache(object):
+    """
+    Stores node results by cache key.  The in-memory tier holds up to
+    maxEntries results and discards the least recently used ones first.  If
+    a cacheDir is given, results are also written to a shelf in that
+    directory (holding up to maxDiskEntries results) so they survive between
+    sessions.  These limits count results, however large each one is.  If
+    maxBytes or maxDiskBytes is given, the tier is also limited to that many
+    bytes of pickled results, which costs a pickling of each result stored
+    in memory.  Results older than maxAge seconds are discarded from both
+    tiers when found.  Results held in memory aren't copied, so the value
+    get() returns is the object given to put(), and must not be modified.
+    """
+
+    def __init__(self, maxEntries=1024, maxAge=None, cacheDir=None, maxDiskEntries=8192, maxBytes=None,
+                 maxDiskBytes=None):
+        """
+        """
+        self.maxEntries = maxEntries
+        self.maxAge = maxAge
+        self.maxDiskEntries = maxDiskEntries
+        self.maxBytes = maxBytes
+        self.maxDiskBytes = maxDiskBytes
+
+        # cacheKey -> (timestamp, value, size), ordered from least to most recently used
+        self._memoryDict = OrderedDict()
+        self._memoryBytes = 0
+
+        # The shelf holds pickled results, and the index shelf their (timestamp, size),
+        # so the oldest results can be found without loading every one of them
+        self._shelf = None
+        self._index = None
+        self._diskBytes = 0
+        if cacheDir:
+            if not os.path.isdir(cacheDir):
+                os.makedirs(cacheDir)
+            self._shelf = shelve.open(os.path.join(cacheDir, 'depends_results'), protocol=2)
+            self._index = shelve.open(os.path.join(cacheDir, 'depends_results_index'), protocol=2)
+            self._diskBytes = sum(size for (timestamp, size) in self._index.values())
+
+
+    def __len__(self):
+        return len(self._memoryDict)
+
+
+    def _expired(self, timestamp):
+        """
+        Returns whether an entry created at the given time is too old to use.
+        """
+        return self.maxAge is not None and time.time() - timestamp > self.maxAge
+
+
+    def get(self, cacheKey):
+        """
+        Look up a result.  Returns a tuple containing a boolean stating if the
+        result was found, and the result itself.
+        """
+        if cacheKey is None:
+            return (False, None)
+
+        if cacheKey in self._memoryDict:
+            (timestamp, value, size) = self._memoryDict.pop(cacheKey)
+            self._memoryBytes -= size
+            if not self._expired(timestamp):
+                self._storeInMemory(cacheKey, timestamp, value, size)
+                return (True, value)
+
+        if self._index is not None and cacheKey in self._index:
+            (timestamp, size) = self._index[cacheKey]
+            if not self._expired(timestamp):
+                data = self._shelf[cacheKey]
+                value = cPickle.loads(data)
+                self._storeInMemory(cacheKey, timestamp, value, len(data))
+                return (True, value)
+            self._removeFromShelf(cacheKey)
+
+        return (False, None)
+
+
+    def put(self, cacheKey, value):
+        """
+        Store a result under the given key.
+        """
+        if cacheKey is None:
+            return
+        timestamp = time.time()
+
+        # Results are only pickled when something needs their size or the disk tier needs them
+        data = None
+        if self._shelf is not None or self.maxBytes is not None:
+            try:
+                data = cPickle.dumps(value, 2)
+            except Exception, err:
+                print "Result for cache key %s could not be pickled: %s" % (cacheKey, err)
+        if data is not None or self.maxBytes is None:
+            self._storeInMemory(cacheKey, timestamp, value, len(data) if data is not None else 0)
+
+        if self._shelf is not None and data is not None:
+            self._removeFromShelf(cacheKey)
+            try:
+                self._shelf[cacheKey] = data
+                self._index[cacheKey] = (timestamp, len(data))
+            except Exception, err:
+                print "Result for cache key %s could not be written to disk: %s" % (cacheKey, err)
+                return
+            self._diskBytes += len(data)
+            if len(self._index) > self.maxDiskEntries or (self.maxDiskBytes is not None and
+                                                          self._diskBytes > self.maxDiskBytes):
+                self._evictFromShelf()
+
+
+    def _storeInMemory(self, cacheKey, timestamp, value, size):
+        """
+        Insert an entry as the most recently used, evicting as necessary.
+        """
+        if cacheKey in self._memoryDict:
+            self._memoryBytes -= self._memoryDict.pop(cacheKey)[2]
+        self._memoryDict[cacheKey] = (timestamp, value, size)
+        self._memoryBytes += size
+        while self._memoryDict and (len(self._memoryDict) > self.maxEntries or
+                                    (self.maxBytes is not None and self._memoryBytes > self.maxBytes)):
+            self._memoryBytes -= self._memoryDict.popitem(last=False)[1][2]
+
+
+    def _removeFromShelf(self, cacheKey):
+        """
+        Remove an entry from the shelf and its index, if it is there.
+        """
+        if cacheKey in self._index:
+            self._diskBytes -= self._index[cacheKey][1]
+            del self._index[cacheKey]
+        if cacheKey in self._shelf:
+            del self._shelf[cacheKey]
+
+
+    def _evictFromShelf(self):
+        """
+        Remove expired entries and then the oldest entries from the shelf
+        until a tenth of its capacity (in entries and in bytes) is free again.
+        Only the index is read to find them.
+        """
+        entries = sorted((timestamp, cacheKey) for (cacheKey, (timestamp, size)) in self._index.items())
+        targetSize = int(self.maxDiskEntries * 0.9)
+        targetBytes = int(self.maxDiskBytes * 0.9) if self.maxDiskBytes is not None else None
+        for (timestamp, cacheKey) in entries:
+            if (len(self._index) <= targetSize and (targetBytes is None or self._diskBytes <= targetBytes) and
+                not self._expired(timestamp)):
+                break
+            self._removeFromShelf(cacheKey)
+        self._shelf.sync()
+        self._index.sync()
+
+
+    def clear(self):
+        """
+        Discard every stored result from both tiers.
+        """
+        self._memoryDict.clear()
+        self._memoryBytes = 0
+        if self._shelf is not None:
+            self._shelf.clear()
+            self._shelf.sync()
+            self._index.clear()
+            self._index.sync()
+            self._diskBytes = 0
+
+
+    def close(self):
+        """
+        Flush and close the on-disk tier.
+        """
+        if self._shelf is not None:
+            self._shelf.close()
+            self._shelf = None
+            self._index.close()
+            self._index = None
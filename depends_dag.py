@@ -11,7 +11,6 @@ import copy
 import networkx
 
 import depends_node
-import depends_util
 import depends_data_packet
 
 
@@ -31,29 +30,40 @@ class DAG:
     """
     The primary dependency graph containing a networkx DiGraph of DagNode 
     objects connected to eachother.  Also keeps track of which nodes are
-    considered stale, and which nodes are members of various node groups.
+    considered stale (their outVal is missing or out of date), and which 
+    nodes are members of various node groups.
     """
 
-    def __init__(self):
+    def __init__(self, trackTopologicalOrder=False):
         # The dependency graph
         self.network = networkx.DiGraph()
 
+        # An optional dict of node -> position in a topological order of the
+        # network.  When present, it is kept up to date as edges are added so
+        # most cycle checks in connectNodes can be answered without a search.
+        self.topologicalOrderDict = dict() if trackTopologicalOrder else None
+        self._nextTopologicalIndex = 0
+
         # A dict of which nodes are currently in a stale state
         self.staleNodeDict = dict()
 
         # A list of node group sets
         self.nodeGroupDict = dict()
 
+        # Lookup tables for finding nodes by name and by UUID.  These are kept
+        # in sync by addNode, removeNode, restoreSnapshot and DagNode.setName.
+        self._nodeNameDict = dict()
+        self._nodeUUIDDict = dict()
+
 
     def node(self, name=None, nUUID=None):
         """
         Return a node with the given name or UUID.
         """
-        for dagNode in self.network:
-            if name and dagNode.name == name:
-                return dagNode
-            if nUUID and dagNode.uuid == nUUID:
-                return dagNode
+        if name and name in self._nodeNameDict:
+            return self._nodeNameDict[name]
+        if nUUID and nUUID in self._nodeUUIDDict:
+            return self._nodeUUIDDict[nUUID]
         return None
 
 
@@ -103,21 +113,37 @@ class DAG:
                 connDict[destPort] = [edge[0]]
         return connDict
 
-    def buildExecutionList(self, dagNode):
-        nodeList = []
 
+    def connectionPorts(self, startNode, endNode):
+        """
+        Return a tuple containing the source and destination ports of the
+        connection between two nodes.
+        """
+        edgeData = self.network.edge[startNode][endNode]
+        return (edgeData.get('sourcePort', 0), edgeData.get('destPort', 0))
 
-        for edge in self.network.in_edges(dagNode):
-            foundNode = edge[0]
 
-            # recurse into the input
-            inNodes = self.buildExecutionList(foundNode)
-            if inNodes:
-                nodeList.extend(inNodes)
-            # append the current node
-            nodeList.append(foundNode)
+    def buildExecutionList(self, dagNode):
+        """
+        Return a topologically ordered list of every node upstream of the given
+        node.  Each node appears once, no matter how many paths lead from it
+        to the given node.  The given node itself is not included.
+        """
+        return self.executionPlan(dagNode).orderedNodes[:-1]
 
-        return nodeList
+
+    def executionPlan(self, dagNode):
+        """
+        Build an ExecutionPlan for the given node, covering the node and all
+        of its ancestors.
+        """
+        ancestors = networkx.ancestors(self.network, dagNode)
+        subgraph = self.network.subgraph(list(ancestors) + [dagNode])
+        orderedNodes = list(networkx.topological_sort(subgraph))
+        portDict = dict()
+        for planNode in orderedNodes:
+            portDict[planNode] = self.nodeConnectionsByPort(planNode)
+        return ExecutionPlan(dagNode, orderedNodes, portDict)
 
 
     def inputNodes(self, dagNode):
@@ -141,14 +167,23 @@ class DAG:
         return [edge[0] for edge in self.network.in_edges(dagNode)]
 
 
-    def addNode(self, dagNode, stale=False):
+    def addNode(self, dagNode, stale=True):
         """
-        Adds a node to the DAG.  An optional stale setting is available.
+        Adds a node to the DAG.  An optional stale setting is available; new
+        nodes haven't been executed yet, so they're stale by default.
         """
         if self.node(dagNode.name):
             raise RuntimeError('Cannot add node named %s, as it already exists.' % dagNode.name)
         self.network.add_node(dagNode)
         self.staleNodeDict[dagNode] = stale
+        self._nodeNameDict[dagNode.name] = dagNode
+        self._nodeUUIDDict[dagNode.uuid] = dagNode
+        dagNode.dag = self
+
+        # A node without connections can safely go at the end of the order
+        if self.topologicalOrderDict is not None:
+            self.topologicalOrderDict[dagNode] = self._nextTopologicalIndex
+            self._nextTopologicalIndex += 1
 
 
     def removeNode(self, dagNode=None, name=None):
@@ -157,8 +192,30 @@ class DAG:
         """
         if not dagNode:
             dagNode = self.node(name=name)
+        for dependentNode in self.network.successors(dagNode):
+            self.setNodeAndDependentsStale(dependentNode)
         self.network.remove_node(dagNode)
         self.staleNodeDict.pop(dagNode, None)
+        if self._nodeNameDict.get(dagNode.name) is dagNode:
+            del self._nodeNameDict[dagNode.name]
+        if self._nodeUUIDDict.get(dagNode.uuid) is dagNode:
+            del self._nodeUUIDDict[dagNode.uuid]
+        if self.topologicalOrderDict is not None:
+            self.topologicalOrderDict.pop(dagNode, None)
+        dagNode.dag = None
+
+
+    def nodeRenamed(self, dagNode, oldName):
+        """
+        Update the name lookup table after a node in this DAG has changed its
+        name.  Called by DagNode.setName, which doesn't allow names already in
+        use by another node.
+        """
+        if self._nodeUUIDDict.get(dagNode.uuid) is not dagNode:
+            return
+        if self._nodeNameDict.get(oldName) is dagNode:
+            del self._nodeNameDict[oldName]
+        self._nodeNameDict[dagNode.name] = dagNode
 
 
     def connectNodes(self, startNode, endNode, sourcePort=0, destPort=0):
@@ -172,11 +229,51 @@ class DAG:
             raise RuntimeError('Node %s does not exist in DAG.' % endNode.name)
         if startNode in self.nodeConnectionsIn(endNode):
             raise RuntimeError("Attempting to duplicate outgoing connection.")
+
+        # The new edge creates a cycle only if the start node can already be
+        # reached from the end node, so check before touching the network.
+        if self.topologicalOrderDict is not None:
+            if not self._updateTopologicalOrder(startNode, endNode):
+                raise RuntimeError('The directed graph is nolonger acyclic!')
+        elif startNode is endNode or networkx.has_path(self.network, endNode, startNode):
+            raise RuntimeError('The directed graph is nolonger acyclic!')
         self.network.add_edge(startNode, endNode, sourcePort=sourcePort, destPort=destPort)
+        self.setNodeAndDependentsStale(endNode)
+
+
+    def connectNodeList(self, connectionList):
+        """
+        Connects many nodes at once, given a list of (startNode, endNode, 
+        sourcePort, destPort) tuples.  An edge that already exists (or 
+        appears twice in the list) raises an exception before anything is 
+        connected, so existing edges never have their ports replaced.  The
+        graph is only checked for cycles once all the edges are in place,
+        and if one is found every new edge is removed again before raising
+        an exception.
+        """
+        newEdges = set()
+        for (startNode, endNode, sourcePort, destPort) in connectionList:
+            if startNode not in self.network:
+                raise RuntimeError('Node %s does not exist in DAG.' % startNode.name)
+            if endNode not in self.network:
+                raise RuntimeError('Node %s does not exist in DAG.' % endNode.name)
+            if self.network.has_edge(startNode, endNode) or (startNode, endNode) in newEdges:
+                raise RuntimeError("Attempting to duplicate outgoing connection.")
+            newEdges.add((startNode, endNode))
+
+        for (startNode, endNode, sourcePort, destPort) in connectionList:
+            self.network.add_edge(startNode, endNode, sourcePort=sourcePort, destPort=destPort)
 
         if not networkx.is_directed_acyclic_graph(self.network):
+            self.network.remove_edges_from(newEdges)
             raise RuntimeError('The directed graph is nolonger acyclic!')
 
+        for (startNode, endNode) in newEdges:
+            self.setNodeAndDependentsStale(endNode)
+
+        if self.topologicalOrderDict is not None:
+            self._rebuildTopologicalOrder()
+
 
     def disconnectNodes(self, startNode, endNode):
         """
@@ -188,6 +285,67 @@ class DAG:
         if endNode not in self.network:
             raise RuntimeError('Node %s does not exist in DAG.' % endNode.name)
         self.network.remove_edge(startNode, endNode)
+        self.setNodeAndDependentsStale(endNode)
+
+
+    def _rebuildTopologicalOrder(self):
+        """
+        Recompute the tracked topological order from scratch.
+        """
+        self.topologicalOrderDict.clear()
+        for i, dagNode in enumerate(networkx.topological_sort(self.network)):
+            self.topologicalOrderDict[dagNode] = i
+        self._nextTopologicalIndex = len(self.topologicalOrderDict)
+
+
+    def _updateTopologicalOrder(self, startNode, endNode):
+        """
+        Adjust the tracked topological order to account for a new edge from 
+        startNode to endNode, using the Pearce-Kelly dynamic topological sort.
+        Only nodes lying between the two endpoints in the current order are
+        visited.  Returns False (leaving the order untouched) if the edge 
+        would create a cycle.
+        """
+        order = self.topologicalOrderDict
+        lowerBound = order[endNode]
+        upperBound = order[startNode]
+        if upperBound < lowerBound:
+            return True
+
+        # Everything reachable from the end node that currently sorts before the start node
+        forwardNodes = list()
+        visited = set([endNode])
+        work = [endNode]
+        while work:
+            dagNode = work.pop()
+            if dagNode is startNode:
+                return False
+            forwardNodes.append(dagNode)
+            for nextNode in self.network.successors(dagNode):
+                if nextNode not in visited and order[nextNode] <= upperBound:
+                    visited.add(nextNode)
+                    work.append(nextNode)
+
+        # Everything that reaches the start node and currently sorts after the end node
+        backwardNodes = list()
+        visited = set([startNode])
+        work = [startNode]
+        while work:
+            dagNode = work.pop()
+            backwardNodes.append(dagNode)
+            for prevNode in self.network.predecessors(dagNode):
+                if prevNode not in visited and order[prevNode] >= lowerBound:
+                    visited.add(prevNode)
+                    work.append(prevNode)
+
+        # Hand the affected slots back out, backward nodes first
+        backwardNodes.sort(key=lambda n: order[n])
+        forwardNodes.sort(key=lambda n: order[n])
+        reorderedNodes = backwardNodes + forwardNodes
+        slots = sorted(order[n] for n in reorderedNodes)
+        for dagNode, slot in zip(reorderedNodes, slots):
+            order[dagNode] = slot
+        return True
 
 
     def setNodeStale(self, dagNode, newState):
@@ -204,6 +362,26 @@ class DAG:
         return self.staleNodeDict[dagNode]
 
 
+    def setNodeAndDependentsStale(self, dagNode):
+        """
+        Mark a node and everything downstream of it as stale.  To be called
+        whenever something affecting the node's result changes.  Returns a 
+        list of the nodes that were newly marked.
+        Since everything downstream of a stale node is always stale as well,
+        the search stops at nodes that are already stale.
+        """
+        staleNodes = list()
+        work = [dagNode]
+        while work:
+            currentNode = work.pop()
+            if self.staleNodeDict.get(currentNode):
+                continue
+            self.staleNodeDict[currentNode] = True
+            staleNodes.append(currentNode)
+            work.extend(self.network.successors(currentNode))
+        return staleNodes
+
+
     def orderedNodeDependenciesAt(self, dagNode, includeGivenNode=True, onlyUnfulfilled=True, recursion=True):
         """
         Builds the evaluation order tree at the given node.
@@ -461,16 +639,7 @@ class DAG:
         """
         nodes = list()
         for dagNode in self.nodes():
-            nodes.append({"NAME": copy.deepcopy(dagNode.name),
-                          "TYPE": type(dagNode).__name__,
-                          "UUID": str(dagNode.uuid),
-                          "STALE": str(self.staleNodeDict[dagNode]),
-                          "INPUTS": [{"NAME": copy.deepcopy(x.name), "VALUE": copy.deepcopy(x.value),
-                                      "RANGE": copy.deepcopy(x.seqRange)} for x in dagNode.inputs()],
-                          "OUTPUTS": [{"NAME": copy.deepcopy(x.name), "VALUE": copy.deepcopy(x.value),
-                                       "RANGE": copy.deepcopy(x.seqRange)} for x in dagNode.outputs()],
-                          "ATTRIBUTES": [{"NAME": copy.deepcopy(x.name), "VALUE": copy.deepcopy(x.value),
-                                          "RANGE": copy.deepcopy(x.seqRange)} for x in dagNode.attributes()]})
+            nodes.append(self.nodeSnapshot(dagNode))
 
         edges = list()
         for connection in sorted(self.network.edges()):
@@ -493,36 +662,74 @@ class DAG:
         return snapshotDict
 
 
-    def restoreSnapshot(self, snapshotDict):
+    def nodeSnapshot(self, dagNode):
         """
-        Transfers the given JSON snapshot into the current dict.
+        Creates the 'snapshot' dictionary of a single node in the DAG.
         """
-        # Clear out the existing DAG
+        return {"NAME": copy.deepcopy(dagNode.name),
+                "TYPE": type(dagNode).__name__,
+                "UUID": str(dagNode.uuid),
+                "STALE": str(self.staleNodeDict[dagNode]),
+                "INPUTS": [{"NAME": copy.deepcopy(x.name), "VALUE": copy.deepcopy(x.value),
+                            "RANGE": copy.deepcopy(x.seqRange)} for x in dagNode.inputs()],
+                "OUTPUTS": [{"NAME": copy.deepcopy(x.name), "VALUE": copy.deepcopy(x.value),
+                             "RANGE": copy.deepcopy(x.seqRange)} for x in dagNode.outputs()],
+                "ATTRIBUTES": [{"NAME": copy.deepcopy(x.name), "VALUE": copy.deepcopy(x.value),
+                                "RANGE": copy.deepcopy(x.seqRange)} for x in dagNode.attributes()]}
+
+
+    def nodeFromSnapshot(self, nodeSnapshotDict):
+        """
+        Creates a new node from a dictionary made by nodeSnapshot().  The node
+        is not added to the DAG.
+        """
+        n = nodeSnapshotDict
+        newNode = depends_node.nodeTypeNamed(n["TYPE"])()
+        newNode.name = n["NAME"]
+        newNode.uuid = uuid.UUID(n['UUID'])
+        for i in n["INPUTS"]:
+            newNode.setInputValue(i["NAME"], i["VALUE"])
+            newNode.setInputRange(i["NAME"], i["RANGE"])
+        for o in n["OUTPUTS"]:
+            for s in o["VALUE"]:
+                newNode.setOutputValue(o["NAME"], s, o["VALUE"][s])
+                if o["RANGE"]:
+                    newNode.setOutputRange(o["NAME"], (o["RANGE"][0], o["RANGE"][1]))
+        for a in n["ATTRIBUTES"]:
+            newNode.setAttributeValue(a["NAME"], a["VALUE"])
+            newNode.setAttributeRange(a["NAME"], a["RANGE"])
+        return newNode
+
+
+    def clear(self):
+        """
+        Remove every node, connection, and group from the DAG.
+        """
+        for dagNode in self.network:
+            dagNode.dag = None
         self.network.clear()
         self.staleNodeDict.clear()
         self.nodeGroupDict.clear()
+        self._nodeNameDict.clear()
+        self._nodeUUIDDict.clear()
+        if self.topologicalOrderDict is not None:
+            self.topologicalOrderDict.clear()
+            self._nextTopologicalIndex = 0
+
+
+    def restoreSnapshot(self, snapshotDict):
+        """
+        Transfers the given JSON snapshot into the current dict.
+        """
+        self.clear()
 
         # Loads of nodes
         for n in snapshotDict["NODES"]:
-            nodeType = n["TYPE"]
-            newNode = depends_util.classTypeNamedFromModule(nodeType, 'depends_node')
-            newNode.name = n["NAME"]
-            newNode.uuid = uuid.UUID(n['UUID'])
-            stale = (n["STALE"] == "True")
-            for i in n["INPUTS"]:
-                newNode.setInputValue(i["NAME"], i["VALUE"])
-                newNode.setInputRange(i["NAME"], i["RANGE"])
-            for o in n["OUTPUTS"]:
-                for s in o["VALUE"]:
-                    newNode.setOutputValue(o["NAME"], s, o["VALUE"][s])
-                    if o["RANGE"]:
-                        newNode.setOutputRange(o["NAME"], (o["RANGE"][0], o["RANGE"][1]))
-            for a in n["ATTRIBUTES"]:
-                newNode.setAttributeValue(a["NAME"], a["VALUE"])
-                newNode.setAttributeRange(a["NAME"], a["RANGE"])
-            self.addNode(newNode, stale)
-
-        # Edge loads
+            # Results aren't part of a snapshot, so restored nodes always start out stale
+            self.addNode(self.nodeFromSnapshot(n), stale=True)
+
+        # Edge loads (checked for cycles once they're all in)
+        connectionList = list()
         for e in snapshotDict["EDGES"]:
             fromNode = self.node(nUUID=uuid.UUID(e["FROM"]))
             toNode = self.node(nUUID=uuid.UUID(e["TO"]))
@@ -535,8 +742,87 @@ class DAG:
                 sourcePort = c['sourcePort']
                 destPort = c['destPort']
 
-            self.connectNodes(fromNode, toNode, sourcePort=sourcePort, destPort=destPort)
+            connectionList.append((fromNode, toNode, sourcePort, destPort))
+        self.connectNodeList(connectionList)
 
         # Group loads
         for g in snapshotDict["GROUPS"]:
             self.nodeGroupDict[g["NAME"]] = set([self.node(nUUID=uuid.UUID(ns)) for ns in g["NODES"]])
+
+
+
+###############################################################################
+## Execution planning
+###############################################################################
+class ExecutionPlan(object):
+    """
+    A topologically ordered, deduplicated list of the nodes that must execute
+    (in order) to evaluate a target node, along with the upstream nodes
+    feeding each of their input ports.  Plans are built by
+    DAG.executionPlan(), can be executed as many times as desired while the
+    DAG's connections remain unchanged, and can be converted to and from a
+    JSON-friendly dictionary.
+    """
+
+    def __init__(self, targetNode, orderedNodes, portDict):
+        """
+        """
+        self.targetNode = targetNode
+        self.orderedNodes = orderedNodes
+
+        # A dict of dagNode -> {destPort: [upstream dagNodes]}
+        self.portDict = portDict
+
+
+    def __repr__(self):
+        return "<ExecutionPlan - target:%s  nodes:%d>" % (self.targetNode.name, len(self.orderedNodes))
+
+
+    def __len__(self):
+        return len(self.orderedNodes)
+
+
+    def __iter__(self):
+        return iter(self.orderedNodes)
+
+
+    def __contains__(self, dagNode):
+        return dagNode in self.portDict
+
+
+    def nodeInputs(self, dagNode):
+        """
+        Return a dict of the upstream nodes feeding each input port of the
+        given node, suitable for DagNode.setPortValues().
+        """
+        return self.portDict[dagNode]
+
+
+    def snapshot(self):
+        """
+        Return a dictionary describing this plan using node UUID strings.
+        """
+        inputs = dict()
+        for dagNode in self.orderedNodes:
+            inputs[str(dagNode.uuid)] = dict((str(port), [str(x.uuid) for x in nodeList])
+                                             for port, nodeList in self.portDict[dagNode].items())
+        return {"TARGET": str(self.targetNode.uuid),
+                "NODES": [str(x.uuid) for x in self.orderedNodes],
+                "INPUTS": inputs}
+
+
+    @staticmethod
+    def fromSnapshot(dag, snapshotDict):
+        """
+        Rebuild a plan from a dictionary created by ExecutionPlan.snapshot(),
+        resolving node UUIDs against the given DAG.
+        """
+        nodeFromString = lambda uuidString: dag.node(nUUID=uuid.UUID(uuidString))
+        orderedNodes = [nodeFromString(x) for x in snapshotDict["NODES"]]
+        if None in orderedNodes:
+            raise RuntimeError("Execution plan refers to nodes that do not exist in DAG.")
+        portDict = dict()
+        for uuidString, inputs in snapshotDict["INPUTS"].items():
+            portDict[nodeFromString(uuidString)] = dict((int(port), [nodeFromString(x) for x in nodeList])
+                                                        for port, nodeList in inputs.items())
+        return ExecutionPlan(nodeFromString(snapshotDict["TARGET"]), orderedNodes, portDict)
@@ -0,0 +1,133 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import stat
+import time
+import threading
+
+
+"""
+A cache of filesystem queries for nodes that walk large directory trees,
+often on network storage where every query is a round trip.  What is known
+about a directory (whether it exists, what it contains, and anything worked
+out from its contents) is trusted for a short time without touching the disk.
+After that the directory is stat'ed again, and everything known about it is
+only thrown away if its modification time changed, which happens whenever a
+file is added to, removed from, or renamed within it.  Changes to the
+contents of the files themselves aren't noticed.
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+# Seconds a directory's entry is trusted before its modification time is checked
+DEFAULT_TTL = 30.0
+
+
+###############################################################################
+###############################################################################
+class DirectoryEntry(object):
+    """
+    What is known about a single directory.  The modification time is None
+    if the directory doesn't exist.
+    """
+
+    def __init__(self, mtime, checkedTime):
+        """
+        """
+        self.mtime = mtime
+        self.checkedTime = checkedTime
+        self.listing = None
+        self.resultDict = dict()
+
+
+###############################################################################
+###############################################################################
+class DirectoryCache(object):
+    """
+    Cached answers about directories, keyed by path.  Safe to share between
+    threads; two threads asking about the same directory at once may both
+    go to the disk, but will get the same answer.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        """
+        """
+        self.ttl = ttl
+        self._entryDict = dict()
+        self._lock = threading.Lock()
+
+
+    def _entry(self, path):
+        """
+        Return the up to date entry for a directory, checking its modification
+        time if the entry is older than the time-to-live.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entryDict.get(path)
+        if entry and now - entry.checkedTime < self.ttl:
+            return entry
+
+        try:
+            pathStat = os.stat(path)
+            mtime = pathStat.st_mtime if stat.S_ISDIR(pathStat.st_mode) else None
+        except OSError:
+            mtime = None
+        if entry and entry.mtime == mtime:
+            entry.checkedTime = now
+            return entry
+
+        entry = DirectoryEntry(mtime, now)
+        with self._lock:
+            self._entryDict[path] = entry
+        return entry
+
+
+    def isdir(self, path):
+        """
+        Returns whether the given path is an existing directory.
+        """
+        return self._entry(path).mtime is not None
+
+
+    def listdir(self, path):
+        """
+        Return a list of the names in a directory, or an empty list if the
+        directory doesn't exist.
+        """
+        entry = self._entry(path)
+        if entry.mtime is None:
+            return list()
+        if entry.listing is None:
+            entry.listing = os.listdir(path)
+        return list(entry.listing)
+
+
+    def cachedResult(self, path, key, function, *args):
+        """
+        Return the result of calling function(*args), which must depend only
+        on the names in the given directory.  The result is stored under the
+        given key and reused until the directory changes.
+        """
+        entry = self._entry(path)
+        if key not in entry.resultDict:
+            entry.resultDict[key] = function(*args)
+        return entry.resultDict[key]
+
+
+    def invalidate(self, path=None):
+        """
+        Forget what is known about a directory, or about every directory if
+        no path is given.
+        """
+        with self._lock:
+            if path is None:
+                self._entryDict.clear()
+            else:
+                self._entryDict.pop(path, None)
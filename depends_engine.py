@@ -0,0 +1,158 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+
+import depends_dag
+import depends_node
+import depends_cache
+import depends_variables
+import depends_journal
+import depends_execution
+import depends_workflow_file
+
+
+"""
+The parts of a Depends session that don't need a user interface: setting up
+the session's built-in variables, loading node plugins, loading workflows off
+disk (or recovering them from their change journals), applying commandline
+variable substitutions, and executing nodes.  The commandline (-nogui) mode
+runs entirely on these functions so it never needs to import QT, and the
+MainWindow uses them as well.
+"""
+
+###############################################################################
+## Session setup
+###############################################################################
+def setupStartupVariables():
+    """
+    Each program starts with a set of workflow variables that are defined
+    by where the program is executed from and potentially a set of
+    environment variables.
+    """
+    # The current session gets a "binary directory" variable
+    if 'DEPENDS_DIR' not in depends_variables.names():
+        depends_variables.add('DEPENDS_DIR')
+    depends_variables.setx('DEPENDS_DIR', os.path.dirname(os.path.realpath(__file__)), readOnly=True)
+
+    # ...And a path that points to where the nodes are loaded from
+    if 'NODE_PATH' not in depends_variables.names():
+        depends_variables.add('NODE_PATH')
+    if not os.environ.get('DEPENDS_NODE_PATH'):
+        depends_variables.setx('NODE_PATH', os.path.join(depends_variables.value('DEPENDS_DIR'), 'nodes'), readOnly=True)
+    else:
+        depends_variables.setx('NODE_PATH', os.environ.get('DEPENDS_NODE_PATH'), readOnly=True)
+
+
+def loadNodePlugins():
+    """
+    Load all the node plugins found in the session's NODE_PATH.
+    """
+    depends_node.loadChildNodesFromPaths(depends_variables.value('NODE_PATH').split(':'))
+
+
+###############################################################################
+## Workflows
+###############################################################################
+def loadWorkflow(filename, dag):
+    """
+    Loads a workflow file (in any of the formats depends_workflow_file 
+    understands) off disk and applies it to the given dependency graph and
+    the workflow variables.  Returns the full file dictionary, or None if 
+    the file doesn't exist.
+    """
+    if not filename or not os.path.exists(filename):
+        return None
+
+    # Load the snapshot off disk, applying the data to the in-flight Dag as it's read
+    snapshot = depends_workflow_file.readWorkflow(filename, dag)
+    applyWorkflowVariables(snapshot, filename)
+    return snapshot
+
+
+def recoverWorkflow(filename, dag):
+    """
+    Rebuilds a workflow from its change journal (see depends_journal) and 
+    applies it to the given dependency graph and the workflow variables.
+    The most recent journal left behind by a session that is no longer 
+    running is claimed as this session's own.  The filename may be empty 
+    for a workflow that was never saved.  Returns the full file dictionary,
+    or None if there is nothing to recover.
+    """
+    for journal in depends_journal.recoverableJournals(filename):
+        if journal.claim(depends_journal.sessionDirectory(filename)):
+            break
+    else:
+        return None
+
+    snapshot = journal.recover(dag)
+    applyWorkflowVariables(snapshot, filename)
+    return snapshot
+
+
+def applyWorkflowVariables(snapshot, filename):
+    """
+    Set the workflow variables stored in a loaded file dictionary, along
+    with the session's WORKFLOW_DIR variable.
+    """
+    # Variable substitutions
+    for v in snapshot["DAG"]["VARIABLE_SUBSTITIONS"] or list():
+        depends_variables.variableSubstitutions[v["NAME"]] = (v["VALUE"], False)
+
+    # The current session gets a variable representing the location of the current workflow
+    if 'WORKFLOW_DIR' not in depends_variables.names():
+        depends_variables.add('WORKFLOW_DIR')
+    depends_variables.setx('WORKFLOW_DIR', os.path.dirname(filename), readOnly=True)
+
+
+def applyVariableSubstitutions(varSubList):
+    """
+    Given a list of "VAR=VALUE" strings (as passed with the -vsub argument),
+    set each existing workflow variable to its new value.
+    """
+    if not varSubList:
+        return
+    for varSub in varSubList:
+        (variable, newValue) = varSub.split('=', 1)
+        if variable in depends_variables.names():
+            depends_variables.setx(variable, newValue)
+        else:
+            print "Warning: Variable %s specified in 'vsub' argument does not exist in this workflow." % variable
+
+
+###############################################################################
+## Execution
+###############################################################################
+def newResultCache():
+    """
+    Create the session's node result cache.  Results are also kept on disk
+    if the DEPENDS_CACHE_DIR environment variable names a directory.
+    """
+    return depends_cache.ResultCache(cacheDir=os.environ.get('DEPENDS_CACHE_DIR'))
+
+
+def executeNode(dag, dagNode, maxWorkers=None, useProcesses=False, resultCache=None, frameChunkSize=None):
+    """
+    Execute the given node and everything upstream of it.  Returns the
+    resulting depends_execution.ExecutionReport.  If frameChunkSize is given,
+    embarrassingly parallel nodes are split into chunks of that many frames.
+    """
+    executor = depends_execution.DagExecutor(dag, maxWorkers=maxWorkers, useProcesses=useProcesses,
+                                             resultCache=resultCache, frameChunkSize=frameChunkSize)
+    try:
+        return executor.execute(dagNode)
+    finally:
+        executor.close()
+
+
+def newSession():
+    """
+    Prepare a fresh commandline session: built-in variables are set, node
+    plugins are loaded, and an empty DAG is returned.
+    """
+    setupStartupVariables()
+    loadNodePlugins()
+    return depends_dag.DAG(trackTopologicalOrder=True)
@@ -0,0 +1,656 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import time
+import Queue
+import traceback
+import multiprocessing
+import multiprocessing.pool
+from collections import OrderedDict
+
+import depends_cache
+import depends_remote
+import depends_stream
+
+
+"""
+An execution engine that runs the nodes of a dependency graph in parallel.
+Nodes are dispatched to a pool of workers as soon as every node feeding them
+has finished, results are handed downstream through DagNode.setPortValues,
+and a report of what ran (and how long it took) is returned.  Nodes the DAG
+doesn't consider stale keep their current result, and if a result cache is 
+provided, nodes whose cached result is still valid are not executed either.
+Remote calls nodes queue in the run's depends_remote.CommandBuffer are sent
+whenever nothing else can proceed, and the nodes that queued them only count
+as finished once their results are back.  The results of streaming nodes are
+handed to the nodes they feed as depends_stream.Streams, which are read while
+the streaming node is still producing them.  Embarrassingly parallel nodes,
+and groups of them (see DAG.nodeGroupDict), can have their frame range split
+into chunks that run side by side in a process pool, with the results of the
+chunks gathered back in frame order.
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+def _executeNode(dagNode):
+    """
+    Run a single node's executePython function.  Returns a tuple containing
+    the node's resulting outVal, the time taken in seconds, and a traceback
+    string (or None if the node succeeded).  Lives at module level so it can
+    be sent to a process pool.
+    """
+    startTime = time.time()
+    try:
+        dagNode.executePython()
+    except Exception:
+        return (None, time.time() - startTime, traceback.format_exc())
+    return (dagNode.outVal, time.time() - startTime, None)
+
+
+class _PortValue(object):
+    """
+    Stands in for an upstream node when setting a node's port values in
+    another process, so only the upstream node's result makes the trip.
+    """
+
+    def __init__(self, outVal):
+        """
+        """
+        self.outVal = outVal
+
+
+def _executeFrameChunk(dagNodes, inputSources, startFrame, endFrame):
+    """
+    Run executePython on a node, or on a group of nodes one after the other,
+    with their outputs narrowed to the given frames.  Each node's entry in 
+    inputSources is None to keep its port values as they are, or a dict of 
+    the upstream sources feeding each of its ports, where an int is the 
+    index of an earlier node in the list.  Returns a tuple containing a list
+    of the nodes' outVals, the time taken in seconds, and a traceback string
+    (or None if every node succeeded).  If a node fails, the list holds the
+    outVals of the nodes before it.  Lives at module level so it can be sent
+    to a process pool.
+    """
+    startTime = time.time()
+    outVals = list()
+    try:
+        for (dagNode, inputDict) in zip(dagNodes, inputSources):
+            dagNode.setFrameRange(startFrame, endFrame)
+            if inputDict is not None:
+                dagNode.setPortValues(dict((port, [dagNodes[x] if isinstance(x, int) else x for x in sources])
+                                           for port, sources in inputDict.items()))
+            dagNode.executePython()
+            outVals.append(dagNode.outVal)
+    except Exception:
+        return (outVals, time.time() - startTime, traceback.format_exc())
+    return (outVals, time.time() - startTime, None)
+
+
+def _frameChunks(frameRange, chunkSize):
+    """
+    Split an inclusive (startFrame, endFrame) range into a list of ranges of
+    at most chunkSize frames each, in frame order.
+    """
+    (startFrame, endFrame) = frameRange
+    return [(f, min(f + chunkSize - 1, endFrame)) for f in xrange(startFrame, endFrame + 1, chunkSize)]
+
+
+def _gatherFrameResults(chunkOutVals):
+    """
+    Combine the outVals of a node's chunks, given in frame order.  Lists of
+    per-frame results are joined into a single list, and anything else is
+    returned as a list with an entry per chunk.
+    """
+    if all(isinstance(x, (list, tuple)) for x in chunkOutVals):
+        outVal = list()
+        for chunkOutVal in chunkOutVals:
+            outVal.extend(chunkOutVal)
+        return outVal
+    return list(chunkOutVals)
+
+
+###############################################################################
+###############################################################################
+class FrameSplitGroup(object):
+    """
+    A group of embarrassingly parallel nodes from DAG.nodeGroupDict that
+    share a frame range.  The group's nodes are executed together a chunk of
+    frames at a time, so each chunk passes through every node in the group
+    without waiting for the other chunks.  The port values a node gets from
+    the nodes before it in the group only cover the frames of its chunk.
+    """
+
+    def __init__(self, name, dagNodes, frameRange):
+        """
+        """
+        self.name = name
+        self.dagNodes = dagNodes
+        self.frameRange = frameRange
+        self._nodeIndexDict = dict((n, i) for i, n in enumerate(dagNodes))
+
+
+    def __repr__(self):
+        return "<FrameSplitGroup - name:%s  nodes:%d>" % (self.name, len(self.dagNodes))
+
+
+    def __contains__(self, dagNode):
+        return dagNode in self._nodeIndexDict
+
+
+    def inputSources(self, executionPlan):
+        """
+        Return the inputSources for _executeFrameChunk, given that every node
+        upstream of the group has finished.
+        """
+        sourceList = list()
+        for dagNode in self.dagNodes:
+            sourceList.append(dict((port, [self._nodeIndexDict[n] if n in self else _PortValue(n.outVal)
+                                           for n in nodeList])
+                                   for port, nodeList in executionPlan.nodeInputs(dagNode).items()))
+        return sourceList
+
+
+###############################################################################
+###############################################################################
+class ExecutionReport(object):
+    """
+    The outcome of a DagExecutor run.  Holds the nodes that executed in the
+    order they finished, how long each took, which nodes were already up to
+    date, which nodes were served from or missed the result cache, and the
+    node that failed (and its error) if the run was aborted.
+    """
+
+    def __init__(self, executionPlan):
+        """
+        """
+        self.executionPlan = executionPlan
+        self.nodeTimings = OrderedDict()
+        self.upToDateNodes = list()
+        self.cacheHits = list()
+        self.cacheMisses = list()
+        self.failedNode = None
+        self.error = None
+        self.totalTime = 0.0
+
+
+    def succeeded(self):
+        """
+        Returns whether every node in the plan executed without error.
+        """
+        return self.failedNode is None and len(self.nodeTimings) == len(self.executionPlan)
+
+
+    def executedNodes(self):
+        """
+        Return a list of the nodes that actually executed, in the order they
+        finished, leaving out those that were up to date or cached.
+        """
+        skippedSet = set(self.upToDateNodes) | set(self.cacheHits)
+        return [n for n in self.nodeTimings if n not in skippedSet]
+
+
+    def summary(self):
+        """
+        Return a human readable, multi-line description of the run.
+        """
+        lines = list()
+        cacheHitSet = set(self.cacheHits)
+        upToDateSet = set(self.upToDateNodes)
+        for dagNode, seconds in self.nodeTimings.items():
+            if dagNode in upToDateSet:
+                lines.append("%-40s %11s   %s" % (dagNode.name, "(up to date)", dagNode.outVal))
+            elif dagNode in cacheHitSet:
+                lines.append("%-40s %11s   %s" % (dagNode.name, "(cached)", dagNode.outVal))
+            else:
+                lines.append("%-40s %10.4fs   %s" % (dagNode.name, seconds, dagNode.outVal))
+        if self.failedNode:
+            lines.append("Node '%s' failed with the error:\n%s" % (self.failedNode.name, self.error))
+        skipped = [n.name for n in self.executionPlan if n not in self.nodeTimings and n is not self.failedNode]
+        if skipped:
+            lines.append("Skipped: %s" % ", ".join(skipped))
+        lines.append("Up to date: %d, cache: %d hits, %d misses" % (len(self.upToDateNodes), len(self.cacheHits),
+                                                                     len(self.cacheMisses)))
+        lines.append("Executed %d of %d nodes in %.4fs" % (len(self.executedNodes()), len(self.executionPlan),
+                                                           self.totalTime))
+        return "\n".join(lines)
+
+
+###############################################################################
+###############################################################################
+class DagExecutor(object):
+    """
+    Executes the ancestor subgraph of a node using a pool of worker threads.
+    If useProcesses is set, nodes that report themselves as embarrassingly
+    parallel are shipped to a process pool instead, which sidesteps the
+    interpreter lock for heavy pure-Python work.  Nodes that aren't
+    embarrassingly parallel always stay in this process, since they may rely
+    on state that doesn't survive a trip to another process.  Nodes that
+    aren't stale are skipped unless skipUpToDate is turned off, and nodes that
+    execute successfully are marked as no longer stale.  If a 
+    depends_cache.ResultCache is given, results are looked up before each
+    node is dispatched and stored after it succeeds.  Nodes downstream of a
+    node with queued remote calls wait for the calls to be flushed, unless
+    they are batchable themselves.  Streaming nodes are always executed,
+    since their last result was used up by whatever read it, and neither
+    they nor the nodes reading their streams are sent to the process pool.
+    If frameChunkSize is given, embarrassingly parallel nodes with a longer
+    frameRange are split into chunks of that many frames which run in the
+    process pool, as are groups of them that share a frame range.  A group
+    is only split if none of its nodes is up to date, and if no node outside
+    it sits between two of its nodes.  Split groups run as soon as the nodes
+    feeding them have finished, and bypass result cache lookups.
+
+    The worker threads are kept for the executor's lifetime, and shut down
+    by close().  The process pool is started afresh for every run, as its
+    workers are forked with only the plugin modules imported so far (see
+    depends_node.NodeTypeStub), and couldn't unpickle nodes of types first
+    used after that.  An executor runs one plan at a time.
+    """
+
+    def __init__(self, dag, maxWorkers=None, useProcesses=False, resultCache=None, skipUpToDate=True,
+                 streamBufferSize=depends_stream.DEFAULT_BUFFER_SIZE, frameChunkSize=None):
+        """
+        """
+        self.dag = dag
+        self.maxWorkers = maxWorkers if maxWorkers else multiprocessing.cpu_count()
+        self.useProcesses = useProcesses
+        self.resultCache = resultCache
+        self.skipUpToDate = skipUpToDate
+        self.streamBufferSize = streamBufferSize
+        self.frameChunkSize = frameChunkSize
+
+        self._threadPool = None
+        self._processPool = None
+
+
+    def close(self):
+        """
+        Shut down the worker threads once they are idle.  The executor starts
+        new ones if it is used again.
+        """
+        if self._threadPool:
+            self._threadPool.close()
+            self._threadPool.join()
+            self._threadPool = None
+
+
+    def execute(self, dagNode):
+        """
+        Execute the given node and everything upstream of it, returning an
+        ExecutionReport.  Dispatching stops at the first failure, and any
+        nodes already in flight are allowed to finish.
+        """
+        executionPlan = self.dag.executionPlan(dagNode)
+        return self.executePlan(executionPlan)
+
+
+    def executePlan(self, executionPlan):
+        """
+        Execute a previously built ExecutionPlan, returning an ExecutionReport.
+        """
+        report = ExecutionReport(executionPlan)
+        startTime = time.time()
+
+        # How many unfinished nodes each node is waiting on, and who waits on whom
+        waitingCountDict = dict()
+        dependentDict = dict((n, list()) for n in executionPlan)
+        for planNode in executionPlan:
+            upstreamNodes = set()
+            for nodeList in executionPlan.nodeInputs(planNode).values():
+                upstreamNodes.update(nodeList)
+            waitingCountDict[planNode] = len(upstreamNodes)
+            for upstreamNode in upstreamNodes:
+                dependentDict[upstreamNode].append(planNode)
+        readyNodes = [n for n in executionPlan if waitingCountDict[n] == 0]
+
+        # Cache keys of every node that has been dispatched so far
+        cacheKeyDict = dict()
+
+        # The remote calls queued by this run's nodes, and the nodes' execution times
+        commandBuffer = depends_remote.CommandBuffer()
+        queuedTimeDict = dict()
+
+        # Every stream handed out, so the producers can be stopped when the run ends
+        streamList = list()
+
+        # Groups executed chunk by chunk, and how many of their nodes are ready
+        splitGroupDict = self._splitGroups(executionPlan, dependentDict)
+        groupReadyCountDict = dict()
+
+        # Results of this run only, should an earlier run have left a worker behind
+        resultQueue = Queue.Queue()
+
+        if not self._threadPool:
+            self._threadPool = multiprocessing.pool.ThreadPool(self.maxWorkers)
+        threadPool = self._threadPool
+        if self.useProcesses or self.frameChunkSize:
+            self._processPool = multiprocessing.Pool(self.maxWorkers)
+        try:
+            inFlight = 0
+            while readyNodes or inFlight or queuedTimeDict:
+                # Dispatch everything that can run right now
+                while readyNodes and not report.failedNode:
+                    readyNode = readyNodes.pop(0)
+                    if self.resultCache is not None:
+                        portKeyDict = dict((port, [cacheKeyDict[n] for n in nodeList])
+                                           for port, nodeList in executionPlan.nodeInputs(readyNode).items())
+                        cacheKeyDict[readyNode] = depends_cache.nodeCacheKey(readyNode, portKeyDict)
+
+                    # Nodes in a split group let the rest of the group proceed, and the last one runs them all
+                    splitGroup = splitGroupDict.get(readyNode)
+                    if splitGroup:
+                        groupReadyCountDict[splitGroup] = groupReadyCountDict.get(splitGroup, 0) + 1
+                        readyNodes.extend(self._releaseDependents(readyNode, dependentDict, waitingCountDict,
+                                                                  releasable=splitGroup.__contains__))
+                        if groupReadyCountDict[splitGroup] == len(splitGroup.dagNodes):
+                            threadPool.apply_async(self._dispatchGroup, (splitGroup, splitGroup.inputSources(executionPlan),
+                                                                         resultQueue))
+                            inFlight += 1
+                        continue
+
+                    # Nodes that aren't stale keep the result of their last execution
+                    if self.skipUpToDate and not self.dag.nodeStaleState(readyNode) and not readyNode.isStreaming():
+                        self._dropStreamReaders(readyNode, executionPlan)
+                        report.upToDateNodes.append(readyNode)
+                        report.nodeTimings[readyNode] = 0.0
+                        readyNodes.extend(self._releaseDependents(readyNode, dependentDict, waitingCountDict))
+                        continue
+
+                    # Reuse a previous result if nothing feeding into it has changed
+                    if self.resultCache is not None:
+                        (found, outVal) = self.resultCache.get(cacheKeyDict[readyNode])
+                        if found:
+                            self._dropStreamReaders(readyNode, executionPlan)
+                            readyNode.outVal = outVal
+                            self.dag.setNodeStale(readyNode, False)
+                            report.cacheHits.append(readyNode)
+                            report.nodeTimings[readyNode] = 0.0
+                            readyNodes.extend(self._releaseDependents(readyNode, dependentDict, waitingCountDict))
+                            continue
+                        if cacheKeyDict[readyNode] is not None:
+                            report.cacheMisses.append(readyNode)
+
+                    portValueDict = readyNode.setPortValues(executionPlan.nodeInputs(readyNode))
+                    streamReaderCount = len(dependentDict[readyNode]) if readyNode.isStreaming() else 0
+                    threadPool.apply_async(self._dispatch, (readyNode, portValueDict, streamReaderCount, commandBuffer,
+                                                            resultQueue))
+                    inFlight += 1
+                if not inFlight:
+                    # Calls queued before a failure are never sent
+                    if report.failedNode:
+                        self._restaleNodes(set(commandBuffer.discard()) | set(queuedTimeDict))
+                        queuedTimeDict.clear()
+                        break
+                    if not queuedTimeDict:
+                        break
+                    readyNodes.extend(self._flushCommands(commandBuffer, queuedTimeDict, cacheKeyDict, report,
+                                                          dependentDict, waitingCountDict))
+                    continue
+
+                # Wait for something to finish
+                (finishedNode, (outVal, seconds, error)) = resultQueue.get()
+                inFlight -= 1
+                if error:
+                    if not report.failedNode:
+                        report.failedNode = finishedNode
+                        report.error = error
+                    continue
+                if isinstance(finishedNode, FrameSplitGroup):
+                    readyNodes.extend(self._finishSplitGroup(finishedNode, outVal, seconds, cacheKeyDict, report,
+                                                             dependentDict, waitingCountDict))
+                    continue
+                finishedNode.outVal = outVal
+                if depends_stream.isStream(outVal):
+                    streamList.append(outVal)
+
+                # A node with queued calls finishes when they are flushed, but batchable nodes can follow it
+                if commandBuffer.isPending(finishedNode):
+                    queuedTimeDict[finishedNode] = seconds
+                    readyNodes.extend(self._releaseDependents(finishedNode, dependentDict, waitingCountDict,
+                                                              releasable=lambda n: n.isBatchable()))
+                    continue
+                self.dag.setNodeStale(finishedNode, False)
+                report.nodeTimings[finishedNode] = seconds
+                if self.resultCache is not None:
+                    self.resultCache.put(cacheKeyDict[finishedNode], outVal)
+                readyNodes.extend(self._releaseDependents(finishedNode, dependentDict, waitingCountDict))
+        finally:
+            for stream in streamList:
+                stream.close()
+            if self._processPool:
+                self._processPool.close()
+                self._processPool.join()
+                self._processPool = None
+
+        report.totalTime = time.time() - startTime
+        return report
+
+
+    def _releaseDependents(self, finishedNode, dependentDict, waitingCountDict, releasable=None):
+        """
+        Note that a node has finished and return a list of the nodes that are
+        no longer waiting on anything.  If a releasable function is given, 
+        only the dependents it returns True for are released, and the others
+        are left for a later call without it.
+        """
+        releasedNodes = list()
+        remainingDependents = list()
+        for dependentNode in dependentDict[finishedNode]:
+            if releasable and not releasable(dependentNode):
+                remainingDependents.append(dependentNode)
+                continue
+            waitingCountDict[dependentNode] -= 1
+            if waitingCountDict[dependentNode] == 0:
+                releasedNodes.append(dependentNode)
+        dependentDict[finishedNode] = remainingDependents
+        return releasedNodes
+
+
+    def _flushCommands(self, commandBuffer, queuedTimeDict, cacheKeyDict, report, dependentDict, waitingCountDict):
+        """
+        Send every queued remote call and finish the nodes that queued them.
+        The time taken is split evenly between those nodes.  Returns a list 
+        of the nodes that are no longer waiting on anything.
+        """
+        startTime = time.time()
+        nodeErrors = commandBuffer.flush()
+        flushShare = (time.time() - startTime) / max(1, len(nodeErrors))
+
+        releasedNodes = list()
+        for (flushedNode, error) in nodeErrors:
+            if error:
+                if not report.failedNode:
+                    report.failedNode = flushedNode
+                    report.error = error
+                continue
+            self.dag.setNodeStale(flushedNode, False)
+            report.nodeTimings[flushedNode] = queuedTimeDict[flushedNode] + flushShare
+            if self.resultCache is not None:
+                self.resultCache.put(cacheKeyDict[flushedNode], flushedNode.outVal)
+            releasedNodes.extend(self._releaseDependents(flushedNode, dependentDict, waitingCountDict))
+
+        # Nodes whose calls failed or were never run didn't happen remotely
+        self._restaleNodes([n for n in queuedTimeDict if n not in report.nodeTimings])
+        queuedTimeDict.clear()
+        return releasedNodes
+
+
+    def _restaleNodes(self, dagNodes):
+        """
+        Mark nodes whose queued remote calls failed or were never sent as
+        stale again, along with everything downstream of them.  Batchable
+        nodes following them may have been marked up to date in the meantime,
+        so the search starts at their dependents rather than stopping at the
+        nodes themselves, which are still stale.
+        """
+        for dagNode in dagNodes:
+            self.dag.setNodeStale(dagNode, True)
+            for dependentNode in self.dag.network.successors(dagNode):
+                self.dag.setNodeAndDependentsStale(dependentNode)
+
+
+    def _splitGroups(self, executionPlan, dependentDict):
+        """
+        Return a dict of every node in the plan that belongs to a group that
+        will be executed a chunk of frames at a time, and its FrameSplitGroup.
+        """
+        splitGroupDict = dict()
+        if not self.frameChunkSize:
+            return splitGroupDict
+        for (name, groupNodes) in sorted(self.dag.nodeGroupDict.items()):
+            if len(groupNodes) < 2 or [n for n in groupNodes if n not in executionPlan or n in splitGroupDict]:
+                continue
+            if [n for n in groupNodes if not n.isEmbarrassinglyParallel() or n.isStreaming() or n.isBatchable()]:
+                continue
+            if self.skipUpToDate and [n for n in groupNodes if not self.dag.nodeStaleState(n)]:
+                continue
+            frameRanges = set(n.frameRange() for n in groupNodes)
+            if len(frameRanges) != 1 or None in frameRanges:
+                continue
+            upstreamNodes = [u for n in groupNodes for nodeList in executionPlan.nodeInputs(n).values() for u in nodeList]
+            if [u for u in upstreamNodes if u.isStreaming() and u not in groupNodes]:
+                continue
+
+            # Everything downstream of the group must stay downstream of it
+            outsideNodes = set()
+            pendingNodes = [d for n in groupNodes for d in dependentDict[n] if d not in groupNodes]
+            convex = True
+            while pendingNodes and convex:
+                pendingNode = pendingNodes.pop()
+                if pendingNode in outsideNodes:
+                    continue
+                outsideNodes.add(pendingNode)
+                for dependentNode in dependentDict[pendingNode]:
+                    if dependentNode in groupNodes:
+                        convex = False
+                    pendingNodes.append(dependentNode)
+            if not convex:
+                continue
+
+            splitGroup = FrameSplitGroup(name, [n for n in executionPlan if n in groupNodes], frameRanges.pop())
+            for groupNode in groupNodes:
+                splitGroupDict[groupNode] = splitGroup
+        return splitGroupDict
+
+
+    def _finishSplitGroup(self, splitGroup, outVals, seconds, cacheKeyDict, report, dependentDict, waitingCountDict):
+        """
+        Store the results of a split group's nodes.  The time taken is split
+        evenly between them.  Returns a list of the nodes that are no longer
+        waiting on anything.
+        """
+        releasedNodes = list()
+        for (groupNode, outVal) in zip(splitGroup.dagNodes, outVals):
+            groupNode.outVal = outVal
+            self.dag.setNodeStale(groupNode, False)
+            report.nodeTimings[groupNode] = seconds / len(splitGroup.dagNodes)
+            if self.resultCache is not None:
+                self.resultCache.put(cacheKeyDict[groupNode], outVal)
+            releasedNodes.extend(self._releaseDependents(groupNode, dependentDict, waitingCountDict))
+        return releasedNodes
+
+
+    def _executeChunks(self, dagNodes, inputSources, frameRange):
+        """
+        Runs on a worker thread.  Executes the given nodes (see
+        _executeFrameChunk) over their frame range in chunks, all at once in
+        the process pool.  Returns a tuple containing a list of the nodes'
+        gathered outVals, the time taken in seconds, a traceback string (or
+        None if every chunk succeeded), and the node that failed.
+        """
+        startTime = time.time()
+        asyncResults = [self._processPool.apply_async(_executeFrameChunk, (dagNodes, inputSources, s, e))
+                        for (s, e) in _frameChunks(frameRange, self.frameChunkSize)]
+        chunkResults = [x.get() for x in asyncResults]
+        seconds = time.time() - startTime
+        for (outVals, chunkSeconds, error) in chunkResults:
+            if error:
+                return (None, seconds, error, dagNodes[len(outVals)])
+        outVals = [_gatherFrameResults([x[0][i] for x in chunkResults]) for i in range(len(dagNodes))]
+        return (outVals, seconds, None, None)
+
+
+    def _dispatchGroup(self, splitGroup, inputSources, resultQueue):
+        """
+        Runs on a worker thread.  Executes a split group and puts the list of
+        its nodes' outVals in the result queue for the scheduling loop, or 
+        the node that failed.
+        """
+        try:
+            (outVals, seconds, error, failedNode) = self._executeChunks(splitGroup.dagNodes, inputSources,
+                                                                        splitGroup.frameRange)
+        except Exception:
+            (outVals, seconds, error, failedNode) = (None, 0.0, traceback.format_exc(), splitGroup.dagNodes[0])
+        if error:
+            resultQueue.put((failedNode, (None, seconds, error)))
+        else:
+            resultQueue.put((splitGroup, (outVals, seconds, None)))
+
+
+    def _dropStreamReaders(self, dagNode, executionPlan):
+        """
+        Give up the readers a node that isn't going to execute has on the
+        streams feeding it.
+        """
+        for nodeList in executionPlan.nodeInputs(dagNode).values():
+            for upstreamNode in nodeList:
+                if depends_stream.isStream(upstreamNode.outVal):
+                    upstreamNode.outVal.dropReader()
+
+
+    def _dispatch(self, dagNode, portValueDict, streamReaderCount, commandBuffer, resultQueue):
+        """
+        Runs on a worker thread.  Executes the node here or in the process
+        pool, in chunks of frames if it can be split, and puts the result in
+        the result queue for the scheduling loop.  Streams in the node's port
+        values are read into lists first, unless the node reads streams.  A
+        streaming node's result becomes a stream with a reader for each of
+        the given number of consumers, or a list if nothing in the run 
+        consumes it.  Remote calls a node executed here makes through
+        depends_remote.runForNode() are queued in the run's commandBuffer.
+        """
+        try:
+            startTime = time.time()
+            readsStream = False
+            for values in portValueDict.values():
+                for (index, value) in enumerate(values):
+                    if not depends_stream.isStream(value):
+                        continue
+                    if dagNode.readsStreams():
+                        readsStream = True
+                    else:
+                        values[index] = list(value)
+            readSeconds = time.time() - startTime
+
+            parallel = dagNode.isEmbarrassinglyParallel() and not dagNode.isStreaming() and not readsStream
+            frameRange = dagNode.frameRange() if parallel and self.frameChunkSize else None
+            if frameRange and frameRange[1] - frameRange[0] + 1 > self.frameChunkSize:
+                (outVals, seconds, error, failedNode) = self._executeChunks([dagNode], [None], frameRange)
+                result = (outVals[0] if outVals else None, seconds, error)
+            elif parallel and self.useProcesses:
+                result = self._processPool.apply(_executeNode, (dagNode,))
+            else:
+                previousCommandBuffer = depends_remote.setCommandBuffer(commandBuffer)
+                try:
+                    result = _executeNode(dagNode)
+                finally:
+                    depends_remote.setCommandBuffer(previousCommandBuffer)
+            (outVal, seconds, error) = result
+            seconds += readSeconds
+            if dagNode.isStreaming() and not error:
+                if streamReaderCount:
+                    outVal = depends_stream.Stream(outVal, readerCount=streamReaderCount, bufferSize=self.streamBufferSize,
+                                                   name="node '%s'" % dagNode.name)
+                else:
+                    startTime = time.time()
+                    outVal = list(outVal)
+                    seconds += time.time() - startTime
+                result = (outVal, seconds, None)
+        except Exception:
+            result = (None, 0.0, traceback.format_exc())
+        resultQueue.put((dagNode, result))
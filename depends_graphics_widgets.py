@@ -203,8 +203,8 @@ class DrawNode(QtGui.QGraphicsItem):
         # For handling movement undo/redos of groups of objects
         # This is a little strange to be handled by the node itself 
         # and maybe can move elsewhere?
-        self.clickSnap = None
-        self.clickPosition = None
+        # A list of (drawNode, position) tuples for the nodes being dragged
+        self.clickPositions = list()
 
         # if type(self.dagNode) == depends_node.DagNodeDot:
         #     self.width = 15
@@ -372,19 +372,18 @@ class DrawNode(QtGui.QGraphicsItem):
 
     def mousePressEvent(self, event):
         """
-        Help manage mouse movement undo/redos.
+        Help manage mouse movement undo/redos.  Only the starting positions
+        of the selected draw nodes (the ones a drag moves) are recorded.
         """
+        # Let the QT parent class handle the selection process before querying what's selected
+        QtGui.QGraphicsItem.mousePressEvent(self, event)
         if event.button() == QtCore.Qt.LeftButton:
-            # Let the QT parent class handle the selection process before querying what's selected
-            self.clickSnap = self.scene().dag.snapshot(nodeMetaDict=self.scene().nodeMetaDict(),
-                                                       connectionMetaDict=self.scene().connectionMetaDict())
-            self.clickPosition = self.pos()
+            self.clickPositions = [(dn, dn.pos()) for dn in self.scene().selectedItems() if isinstance(dn, DrawNode)]
         elif event.button() == QtCore.Qt.MiddleButton:
             print 'middle other button'
 
         else:
             print 'some other button'
-        QtGui.QGraphicsItem.mousePressEvent(self, event)
 
 
     def mouseReleaseEvent(self, event):
@@ -392,11 +391,14 @@ class DrawNode(QtGui.QGraphicsItem):
         Help manage mouse movement undo/redos.
         """
         # Don't register undos for selections without moves
-        if self.pos() != self.clickPosition:
-            currentSnap = self.scene().dag.snapshot(nodeMetaDict=self.scene().nodeMetaDict(),
-                                                    connectionMetaDict=self.scene().connectionMetaDict())
+        movedNodes = [(dn, dn.pos() - clickPosition) for (dn, clickPosition) in self.clickPositions
+                      if dn.pos() != clickPosition]
+        if movedNodes:
             self.scene().undoStack().push(
-                depends_undo_commands.SceneOnlyUndoCommand(self.clickSnap, currentSnap, self.scene()))
+                depends_undo_commands.MoveNodesUndoCommand([dn.dagNode for (dn, delta) in movedNodes],
+                                                           [delta for (dn, delta) in movedNodes],
+                                                           self.scene().dag, self.scene()))
+        self.clickPositions = list()
         QtGui.QGraphicsItem.mouseReleaseEvent(self, event)
 
 
@@ -475,7 +477,10 @@ class DrawEdge(QtGui.QGraphicsItem):
         """
         Set the edge's source draw node and adjust the edge's representation.
         """
+        oldKey = self.registryKey()
         self.source = drawNode
+        if self.scene():
+            self.scene().drawEdgeReconnected(self, oldKey)
         self.adjust()
 
 
@@ -490,10 +495,23 @@ class DrawEdge(QtGui.QGraphicsItem):
         """
         Set the edge's destination draw node and adjust the edge's representation.
         """
+        oldKey = self.registryKey()
         self.dest = drawNode
+        if self.scene():
+            self.scene().drawEdgeReconnected(self, oldKey)
         self.adjust()
 
 
+    def registryKey(self):
+        """
+        The key the scene files this edge under: a tuple of the source and
+        destination dag node UUIDs, or None if either end is unattached.
+        """
+        if not self.source or not self.dest:
+            return None
+        return (self.source.dagNode.uuid, self.dest.dagNode.uuid)
+
+
     def adjust(self):
         """
         Recompute where the line is pointing.
@@ -597,18 +615,10 @@ class DrawEdge(QtGui.QGraphicsItem):
             self.mouseMoved = True
             self.floatingDestinationPoint = event.scenePos()
             if self.destDrawNode():
-                # Disconnect an edge from a node
-                preSnap = self.scene().dag.snapshot(nodeMetaDict=self.scene().nodeMetaDict(),
-                                                    connectionMetaDict=self.scene().connectionMetaDict())
-
+                # Disconnect an edge from a node (the receiver registers the undo)
                 self.destDrawNode().removeDrawEdge(self)
                 self.scene().nodesDisconnected.emit(self.sourceDrawNode().dagNode, self.destDrawNode().dagNode)
                 self.setDestDrawNode(None)
-
-                currentSnap = self.scene().dag.snapshot(nodeMetaDict=self.scene().nodeMetaDict(),
-                                                        connectionMetaDict=self.scene().connectionMetaDict())
-                self.scene().undoStack().push(
-                    depends_undo_commands.DagAndSceneUndoCommand(preSnap, currentSnap, self.scene().dag, self.scene()))
             # nodes = [n for n in self.scene().items(self.floatingDestinationPoint) if type(n) in [DrawNodeInputNub, DrawNodeOutputNub]]
             # if nodes:
             # print nodes
@@ -640,10 +650,7 @@ class DrawEdge(QtGui.QGraphicsItem):
                 duplicatingConnection = self.sourceDrawNode().dagNode in self.scene().dag.nodeConnectionsIn(
                     topHitNode.parentItem().dagNode)
                 if topHitNode is not self.sourceDrawNode() and not duplicatingConnection:
-                    # Connect an edge to a node
-                    preSnap = self.scene().dag.snapshot(nodeMetaDict=self.scene().nodeMetaDict(),
-                                                        connectionMetaDict=self.scene().connectionMetaDict())
-
+                    # Connect an edge to a node (the receiver registers the undo)
                     self.setDestDrawNode(topHitNode.parentItem())
 
                     print 'connecting:', self.sourceDrawNode().dagNode, 'port:', self.sourcePort
@@ -668,12 +675,6 @@ class DrawEdge(QtGui.QGraphicsItem):
                     self.scene().nodesConnected.emit(self.sourceDrawNode().dagNode, self.destDrawNode().dagNode,
                                                      self.sourcePort, self.destPort)
                     self.adjust()
-
-                    currentSnap = self.scene().dag.snapshot(nodeMetaDict=self.scene().nodeMetaDict(),
-                                                            connectionMetaDict=self.scene().connectionMetaDict())
-                    self.scene().undoStack().push(
-                        depends_undo_commands.DagAndSceneUndoCommand(preSnap, currentSnap, self.scene().dag,
-                                                                     self.scene()))
                     return QtGui.QGraphicsItem.mouseReleaseEvent(self, event)
 
             # No hits?  Delete yourself (You have no chance to win!)
@@ -751,6 +752,14 @@ class SceneWidget(QtGui.QGraphicsScene):
         self.highlightNodes = list()
         self.highlightIntensities = list()
 
+        # Registries of the draw items in the scene, kept up to date by
+        # addItem(), removeItem(), clear(), and drawEdgeReconnected().
+        # DrawNodes are keyed by dag node UUID, and DrawEdges connected at
+        # both ends by a (source UUID, destination UUID) tuple.
+        self._drawNodeDict = dict()
+        self._drawEdgeDict = dict()
+        self._drawEdgeSet = set()
+
 
     def undoStack(self):
         """
@@ -760,15 +769,59 @@ class SceneWidget(QtGui.QGraphicsScene):
         return self.parent().parent().undoStack
 
 
+    def addItem(self, item):
+        """
+        Add an item to the scene, registering draw nodes and edges.
+        """
+        QtGui.QGraphicsScene.addItem(self, item)
+        if isinstance(item, DrawNode):
+            self._drawNodeDict[item.dagNode.uuid] = item
+        elif isinstance(item, DrawEdge):
+            self._drawEdgeSet.add(item)
+            if item.registryKey():
+                self._drawEdgeDict[item.registryKey()] = item
+
+
+    def removeItem(self, item):
+        """
+        Remove an item from the scene, unregistering draw nodes and edges.
+        """
+        if isinstance(item, DrawNode):
+            if self._drawNodeDict.get(item.dagNode.uuid) is item:
+                del self._drawNodeDict[item.dagNode.uuid]
+        elif isinstance(item, DrawEdge):
+            self._drawEdgeSet.discard(item)
+            if self._drawEdgeDict.get(item.registryKey()) is item:
+                del self._drawEdgeDict[item.registryKey()]
+        QtGui.QGraphicsScene.removeItem(self, item)
+
+
+    def clear(self):
+        """
+        Remove every item from the scene.
+        """
+        self._drawNodeDict.clear()
+        self._drawEdgeDict.clear()
+        self._drawEdgeSet.clear()
+        QtGui.QGraphicsScene.clear(self)
+
+
+    def drawEdgeReconnected(self, drawEdge, oldKey):
+        """
+        Re-file a draw edge whose source or destination draw node changed.
+        Called by the DrawEdge itself.
+        """
+        if oldKey and self._drawEdgeDict.get(oldKey) is drawEdge:
+            del self._drawEdgeDict[oldKey]
+        if drawEdge in self._drawEdgeSet and drawEdge.registryKey():
+            self._drawEdgeDict[drawEdge.registryKey()] = drawEdge
+
+
     def drawNodes(self):
         """
         Returns a list of all drawNodes present in the scene.
         """
-        nodes = list()
-        for item in self.items():
-            if type(item).__name__ == 'DrawNode':
-                nodes.append(item)
-        return nodes
+        return self._drawNodeDict.values()
 
 
     def drawNode(self, dagNode):
@@ -776,23 +829,16 @@ class SceneWidget(QtGui.QGraphicsScene):
         Returns the given dag node's draw node (or None if it doesn't exist in
         the scene).
         """
-        for item in self.items():
-            if type(item).__name__ != 'DrawNode':
-                continue
-            if item.dagNode == dagNode:
-                return item
-        return None
+        if dagNode is None:
+            return None
+        return self._drawNodeDict.get(dagNode.uuid)
 
 
     def drawEdges(self):
         """
         Return a list of all draw edges in the scene.
         """
-        edges = list()
-        for item in self.items():
-            if type(item).__name__ == 'DrawEdge':
-                edges.append(item)
-        return edges
+        return list(self._drawEdgeSet)
 
 
     def drawEdge(self, fromDrawNode, toDrawNode):
@@ -800,12 +846,9 @@ class SceneWidget(QtGui.QGraphicsScene):
         Returns a drawEdge that links a given draw node to another given draw
         node.
         """
-        for item in self.items():
-            if type(item).__name__ != 'DrawEdge':
-                continue
-            if item.source == fromDrawNode and item.dest == toDrawNode:
-                return item
-        return None
+        if not fromDrawNode or not toDrawNode:
+            return None
+        return self._drawEdgeDict.get((fromDrawNode.dagNode.uuid, toDrawNode.dagNode.uuid))
 
 
     def setDag(self, dag):
@@ -843,6 +886,37 @@ class SceneWidget(QtGui.QGraphicsScene):
         return newDrawEdge
 
 
+    def removeExistingDagNode(self, dagNode):
+        """
+        Removes the draw node for a given dag node, along with its draw edges.
+        """
+        drawNode = self.drawNode(dagNode)
+        for edge in drawNode.drawEdges():
+            self.removeDrawEdge(edge)
+        self.removeItem(drawNode)
+
+
+    def removeExistingConnection(self, fromDagNode, toDagNode):
+        """
+        Removes the draw edge between given from and to dag nodes, if present.
+        """
+        drawEdge = self.drawEdge(self.drawNode(fromDagNode), self.drawNode(toDagNode))
+        if not drawEdge:
+            return
+        self.removeDrawEdge(drawEdge)
+
+
+    def removeDrawEdge(self, drawEdge):
+        """
+        Detach a draw edge from the draw nodes at either end and remove it.
+        """
+        if drawEdge.sourceDrawNode():
+            drawEdge.sourceDrawNode().removeDrawEdge(drawEdge)
+        if drawEdge.destDrawNode():
+            drawEdge.destDrawNode().removeDrawEdge(drawEdge)
+        self.removeItem(drawEdge)
+
+
     def addExistingGroupBox(self, name, groupDagNodeList):
         """
         Add a group box from a given list of dag nodes & names it with a string.
@@ -897,22 +971,27 @@ class SceneWidget(QtGui.QGraphicsScene):
         nodes in the scene.
         """
         nodeMetaDict = dict()
-        nodes = [n for n in self.items() if type(n) == DrawNode]
-        for n in nodes:
-            nodeMetaDict[str(n.dagNode.uuid)] = dict()
-            nodeMetaDict[str(n.dagNode.uuid)]['locationX'] = str(n.pos().x())
-            nodeMetaDict[str(n.dagNode.uuid)]['locationY'] = str(n.pos().y())
+        for n in self.drawNodes():
+            nodeMetaDict[str(n.dagNode.uuid)] = self.drawNodeMeta(n)
         return nodeMetaDict
 
 
+    def drawNodeMeta(self, drawNode):
+        """
+        Returns a dictionary containing meta information for a single draw 
+        node.
+        """
+        return {'locationX': str(drawNode.pos().x()),
+                'locationY': str(drawNode.pos().y())}
+
+
     def connectionMetaDict(self):
         """
         Returns a dictionary containing meta information for each of the draw
         edges in the scene.
         """
         connectionMetaDict = dict()
-        connections = [n for n in self.items() if type(n) == DrawEdge]
-        for c in connections:
+        for c in self.drawEdges():
             if not c.sourceDrawNode() or not c.destDrawNode():
                 continue
             connectionString = "%s|%s" % (str(c.sourceDrawNode().dagNode.uuid), str(c.destDrawNode().dagNode.uuid))
@@ -925,46 +1004,68 @@ class SceneWidget(QtGui.QGraphicsScene):
     def restoreSnapshot(self, snapshotDict):
         """
         Given a dictionary that contains dag information and meta information 
-        for the dag, construct all draw objects and register them with the 
-        current scene.
+        for the dag, bring the scene's draw objects in line with the current
+        dag and register them with the current scene.  Only the draw nodes 
+        and draw edges that differ are added, removed, or updated, and the 
+        selection is kept for nodes that remain.
         """
-        # Clear out the drawnodes and connections, then add 'em all back in.
-        selectedItems = self.selectedItems()
+        selectedUUIDs = set(x.dagNode.uuid for x in self.selectedItems() if isinstance(x, DrawNode))
+        dagNodeDict = dict((dagNode.uuid, dagNode) for dagNode in self.dag.nodes())
+        connectionDict = dict(((c[0].uuid, c[1].uuid), c) for c in self.dag.connections())
+
         self.blockSignals(True)
-        for dn in self.drawNodes():
-            self.removeItem(dn)
-        for de in self.drawEdges():
-            self.removeItem(de)
-        for dagNode in self.dag.nodes():
-            newNode = self.addExistingDagNode(dagNode, QtCore.QPointF(0, 0))
-            if selectedItems and dagNode in [x.dagNode for x in selectedItems]:
-                newNode.setSelected(True)
-        for connection in self.dag.connections():
-            newDrawEdge = self.addExistingConnection(connection[0], connection[1])
+
+        # Draw edges that no longer match a connection (and any left dangling) go first
+        for drawEdge in self.drawEdges():
+            if drawEdge.registryKey() not in connectionDict:
+                self.removeDrawEdge(drawEdge)
+
+        # Draw nodes whose dag node is gone (or has changed type) go next, and the
+        # remaining draw nodes are pointed at the dag's current node objects
+        for drawNode in self.drawNodes():
+            dagNode = dagNodeDict.get(drawNode.dagNode.uuid)
+            if dagNode is None or type(dagNode) is not type(drawNode.dagNode):
+                self.removeExistingDagNode(drawNode.dagNode)
+            elif dagNode is not drawNode.dagNode:
+                drawNode.dagNode = dagNode
+                drawNode.update()
+
+        # Add whatever is missing
+        for nodeUUID, dagNode in dagNodeDict.items():
+            if not self.drawNode(dagNode):
+                self.addExistingDagNode(dagNode, QtCore.QPointF(0, 0))
+        for (fromDagNode, toDagNode) in connectionDict.values():
+            if not self.drawEdge(self.drawNode(fromDagNode), self.drawNode(toDagNode)):
+                self.addExistingConnection(fromDagNode, toDagNode)
+
+        for drawNode in self.drawNodes():
+            isSelected = drawNode.dagNode.uuid in selectedUUIDs
+            if drawNode.isSelected() != isSelected:
+                drawNode.setSelected(isSelected)
         self.blockSignals(False)
 
         # DrawNodes get their locations set from this meta entry
         expectedNodeMeta = snapshotDict["NODE_META"]
         if expectedNodeMeta:
-            for dagNode in self.dag.nodes():
+            for dagNode in dagNodeDict.values():
                 drawNode = self.drawNode(dagNode)
                 nodeMeta = expectedNodeMeta[str(dagNode.uuid)]
+                location = drawNode.pos()
                 if 'locationX' in nodeMeta:
-                    locationX = float(nodeMeta['locationX'])
+                    location.setX(float(nodeMeta['locationX']))
                 if 'locationY' in nodeMeta:
-                    locationY = float(nodeMeta['locationY'])
-                drawNode.setPos(QtCore.QPointF(locationX, locationY))
+                    location.setY(float(nodeMeta['locationY']))
+                if location != drawNode.pos():
+                    drawNode.setPos(location)
 
         # DrawEdges get their insertion points set here
         expectedConnectionMeta = snapshotDict["CONNECTION_META"]
         if expectedConnectionMeta:
-            for connection in self.dag.connections():
-                connectionIdString = "%s|%s" % (str(connection[0].uuid), str(connection[1].uuid))
+            for (fromDagNode, toDagNode) in connectionDict.values():
+                connectionIdString = "%s|%s" % (str(fromDagNode.uuid), str(toDagNode.uuid))
                 connectionMeta = expectedConnectionMeta[connectionIdString]
-                drawEdge = self.drawEdge(self.drawNode(self.dag.node(nUUID=connection[0].uuid)),
-                                         self.drawNode(self.dag.node(nUUID=connection[1].uuid))
-                                         )
-                if drawEdge:
+                drawEdge = self.drawEdge(self.drawNode(fromDagNode), self.drawNode(toDagNode))
+                if drawEdge.sourcePort != connectionMeta['sourcePort'] or drawEdge.destPort != connectionMeta['destPort']:
                     drawEdge.sourcePort = connectionMeta['sourcePort']
                     drawEdge.destPort = connectionMeta['destPort']
                     drawEdge.adjust()
@@ -0,0 +1,435 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import json
+import errno
+import socket
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+import depends_workflow_file
+
+
+"""
+An append-only journal of the changes made to a workflow since it was last
+loaded or saved.  Each change is appended as a single JSON record describing
+the new state of whatever it touched (a node, a connection, the groups, or
+the variables), so recording a change costs the same no matter how large the
+workflow is.  The records are replayed on top of a base workflow file to
+recover the session after a crash or a plugin reload.
+
+Every so often the journal is compacted: the whole workflow is written to a
+checkpoint file in the journal's directory, which becomes the new base, and
+the records before it are dropped.  Records are plain 'upserts' and
+'removals', so replaying a record twice is harmless.  This keeps the journal
+consistent if the program dies part way through compaction.
+
+Each session writes its journal into a directory of its own, named after the
+host and process id of the session, inside the workflow's journal directory.
+Sessions working on the same workflow (or on untitled workflows) therefore
+never write to each other's journals, and only the journals of sessions that
+are no longer running are offered for recovery.  A recovering session claims
+a journal by renaming its directory to its own, so no two sessions can
+recover the same changes.
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+JOURNAL_FORMAT_NAME = 'DEPENDS_JOURNAL'
+JOURNAL_FORMAT_VERSION = 1
+
+# How many records are appended before the journal asks to be compacted
+DEFAULT_COMPACT_EVERY = 500
+
+
+def journalDirectory(workflowFilename):
+    """
+    Return the directory holding the journal for the given workflow file.
+    Journals live in the DEPENDS_JOURNAL_DIR environment variable's directory
+    if it is set, or the system's temporary directory otherwise.
+    """
+    rootDir = os.environ.get('DEPENDS_JOURNAL_DIR')
+    if not rootDir:
+        rootDir = os.path.join(tempfile.gettempdir(), 'depends_journal')
+    if not workflowFilename:
+        return os.path.join(rootDir, 'untitled')
+    return os.path.join(rootDir, hashlib.md5(os.path.abspath(workflowFilename)).hexdigest())
+
+
+def sessionName():
+    """
+    Return the name of this session's journal directories: the host name 
+    and process id.
+    """
+    return "%s.%d" % (socket.gethostname(), os.getpid())
+
+
+def sessionDirectory(workflowFilename):
+    """
+    Return the directory holding this session's journal for the given 
+    workflow file.
+    """
+    return os.path.join(journalDirectory(workflowFilename), sessionName())
+
+
+def sessionIsRunning(name):
+    """
+    Returns whether the session with the given journal directory name is 
+    still running, and so still writing its journal.  This session doesn't
+    count, as its journals can only be left over from the program it 
+    replaced (see depends_util.restartProgram).  Sessions on other hosts 
+    can't be checked, so they are assumed to be running.
+    """
+    (host, dot, pid) = name.rpartition('.')
+    if not dot or not pid.isdigit():
+        return False
+    if host != socket.gethostname():
+        return True
+    if int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except OSError, err:
+        return err.errno == errno.EPERM
+    return True
+
+
+def recoverableJournals(workflowFilename):
+    """
+    Return a list of the journals of the given workflow file that hold 
+    changes and whose sessions are no longer running, most recently written
+    first.
+    """
+    directory = journalDirectory(workflowFilename)
+    if not os.path.isdir(directory):
+        return list()
+    journals = list()
+    for name in os.listdir(directory):
+        journal = ChangeJournal(os.path.join(directory, name))
+        if os.path.isdir(journal.directory) and not sessionIsRunning(name) and journal.hasRecoveryData():
+            journals.append(journal)
+    journals.sort(key=lambda j: os.path.getmtime(j.journalFilename), reverse=True)
+    return journals
+
+
+###############################################################################
+###############################################################################
+class ChangeJournal(object):
+    """
+    The journal of a single workflow, kept in its own directory.  The journal
+    file starts with a header record naming its base workflow file, followed
+    by one change record per line.  Records are flushed as they are written,
+    so they survive the program crashing (but not necessarily the machine).
+    """
+
+    def __init__(self, directory, compactEvery=DEFAULT_COMPACT_EVERY):
+        """
+        """
+        self.directory = directory
+        self.compactEvery = compactEvery
+        self.journalFilename = os.path.join(directory, 'journal.jsonl')
+        self.checkpointFilename = os.path.join(directory, 'checkpoint.jsonl')
+
+        self.recordCount = 0
+        self._fp = None
+
+
+    def hasRecoveryData(self):
+        """
+        Returns whether the journal on disk holds any changes, either as
+        records or in a checkpoint.  Journals are reset when their workflow
+        is saved and discarded when the program exits normally, so a journal
+        with changes in it means the session that wrote it didn't.
+        """
+        if not os.path.exists(self.journalFilename):
+            return False
+        with open(self.journalFilename, 'rb') as fp:
+            header = json.loads(fp.readline())
+            if header.get("BASE") == os.path.abspath(self.checkpointFilename):
+                return True
+            for line in fp:
+                if line.strip():
+                    return True
+        return False
+
+
+    def needsCompaction(self):
+        """
+        Returns whether enough records have been appended since the journal
+        was last reset that it should be compacted.
+        """
+        return self.recordCount >= self.compactEvery
+
+
+    def reset(self, baseFilename):
+        """
+        Start an empty journal on top of the given workflow file (or on top of
+        an empty workflow if no filename is given).
+        """
+        self.close()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        # Replace the journal in one step so there is always a complete one on disk
+        tempFilename = self.journalFilename + '.tmp'
+        fp = open(tempFilename, 'wb')
+        try:
+            header = {"FORMAT": JOURNAL_FORMAT_NAME, "VERSION": JOURNAL_FORMAT_VERSION,
+                      "BASE": os.path.abspath(baseFilename) if baseFilename else None}
+            fp.write(json.dumps(header, sort_keys=True))
+            fp.write('\n')
+        finally:
+            fp.close()
+        os.rename(tempFilename, self.journalFilename)
+        self.recordCount = 0
+
+        # A checkpoint the journal no longer starts from is just taking up space
+        if baseFilename != self.checkpointFilename and os.path.exists(self.checkpointFilename):
+            os.remove(self.checkpointFilename)
+
+
+    def compact(self, dag, nodeMetaDict=None, connectionMetaDict=None, variableMetaList=None):
+        """
+        Write the entire workflow to the journal's checkpoint file and start
+        an empty journal on top of it.
+        """
+        self.close()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        tempFilename = self.checkpointFilename + '.tmp'
+        depends_workflow_file.writeWorkflow(tempFilename, dag, nodeMetaDict=nodeMetaDict,
+                                            connectionMetaDict=connectionMetaDict, variableMetaList=variableMetaList,
+                                            fileFormat=depends_workflow_file.FORMAT_STREAM)
+        os.rename(tempFilename, self.checkpointFilename)
+        self.reset(self.checkpointFilename)
+
+
+    def discard(self):
+        """
+        Remove the journal and its checkpoint from disk.
+        """
+        self.close()
+        for filename in (self.journalFilename, self.checkpointFilename):
+            if os.path.exists(filename):
+                os.remove(filename)
+        for directory in (self.directory, os.path.dirname(self.directory)):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+        self.recordCount = 0
+
+
+    def claim(self, directory):
+        """
+        Move the journal to the given directory (a session's own) by renaming
+        its directory.  Returns False if the journal is gone, which happens 
+        when another session claimed it first.  A journal based on its own
+        checkpoint is pointed at the checkpoint's new location.
+        """
+        self.close()
+        try:
+            os.rename(self.directory, directory)
+        except OSError:
+            return False
+        oldCheckpointFilename = os.path.abspath(self.checkpointFilename)
+        self.directory = directory
+        self.journalFilename = os.path.join(directory, 'journal.jsonl')
+        self.checkpointFilename = os.path.join(directory, 'checkpoint.jsonl')
+
+        with open(self.journalFilename, 'rb') as fp:
+            lines = fp.readlines()
+        header = json.loads(lines[0])
+        if header.get("BASE") == oldCheckpointFilename:
+            header["BASE"] = os.path.abspath(self.checkpointFilename)
+            tempFilename = self.journalFilename + '.tmp'
+            with open(tempFilename, 'wb') as fp:
+                fp.write(json.dumps(header, sort_keys=True))
+                fp.write('\n')
+                fp.writelines(lines[1:])
+            os.rename(tempFilename, self.journalFilename)
+        return True
+
+
+    def close(self):
+        """
+        Close the journal file if it is open for appending.
+        """
+        if self._fp:
+            self._fp.close()
+            self._fp = None
+
+
+    ###########################################################################
+    ## Recording
+    ###########################################################################
+    def append(self, recordType, record):
+        """
+        Append a single record to the end of the journal.
+        """
+        if not self._fp:
+            if not os.path.exists(self.journalFilename):
+                raise RuntimeError("Journal %s has not been started." % self.journalFilename)
+            self._fp = open(self.journalFilename, 'ab')
+        record["RECORD"] = recordType
+        self._fp.write(json.dumps(record, sort_keys=True, separators=(',', ':')))
+        self._fp.write('\n')
+        self._fp.flush()
+        self.recordCount += 1
+
+
+    def recordNode(self, nodeSnapshot, nodeMeta=None):
+        """
+        Record the current state of a node, given its DAG.nodeSnapshot().
+        """
+        record = dict(nodeSnapshot)
+        if nodeMeta is not None:
+            record["META"] = nodeMeta
+        self.append("NODE", record)
+
+
+    def recordNodeRemoved(self, nodeUUIDString):
+        """
+        Record a node (and every connection to and from it) being removed.
+        """
+        self.append("NODE_REMOVED", {"UUID": nodeUUIDString})
+
+
+    def recordConnection(self, fromUUIDString, toUUIDString, connectionMeta=None):
+        """
+        Record the current state of a connection between two nodes.
+        """
+        record = {"FROM": fromUUIDString, "TO": toUUIDString}
+        if connectionMeta is not None:
+            record["META"] = connectionMeta
+        self.append("EDGE", record)
+
+
+    def recordConnectionRemoved(self, fromUUIDString, toUUIDString):
+        """
+        Record a connection between two nodes being broken.
+        """
+        self.append("EDGE_REMOVED", {"FROM": fromUUIDString, "TO": toUUIDString})
+
+
+    def recordGroups(self, nodeGroupDict):
+        """
+        Record every node group in the DAG.  Groups are few and small, so
+        they are always recorded as a whole.
+        """
+        groups = [{"NAME": key, "NODES": [str(x.uuid) for x in nodeGroupDict[key]]} for key in nodeGroupDict]
+        self.append("GROUPS", {"GROUPS": groups})
+
+
+    def recordVariables(self, variableMetaList):
+        """
+        Record every workflow variable that isn't read-only.
+        """
+        self.append("VARIABLES", {"VARIABLES": variableMetaList})
+
+
+    ###########################################################################
+    ## Recovery
+    ###########################################################################
+    def read(self):
+        """
+        Return a tuple containing the journal's base filename (or None) and
+        a list of its records.
+        """
+        fp = open(self.journalFilename, 'rb')
+        try:
+            header = json.loads(fp.readline())
+            if header.get("FORMAT") != JOURNAL_FORMAT_NAME:
+                raise RuntimeError("File %s is not a Depends journal." % self.journalFilename)
+            if header.get("VERSION", 0) > JOURNAL_FORMAT_VERSION:
+                raise RuntimeError("Journal %s was written by a newer version of Depends." % self.journalFilename)
+            records = list()
+            for line in fp:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A record cut short by a crash can only be the last one
+                    break
+        finally:
+            fp.close()
+        return (header.get("BASE"), records)
+
+
+    def recover(self, dag):
+        """
+        Load the journal's base workflow into the given dependency graph and
+        replay every change on top of it.  Returns the workflow's file
+        dictionary, just like depends_workflow_file.readWorkflow().
+        """
+        (baseFilename, records) = self.read()
+        self.recordCount = len(records)
+        if baseFilename:
+            if not os.path.exists(baseFilename):
+                raise RuntimeError("Journal %s refers to missing workflow %s." % (self.journalFilename, baseFilename))
+            fileDict = depends_workflow_file.readWorkflow(baseFilename, dag)
+        else:
+            dag.clear()
+            fileDict = {"DAG": dag.snapshot(nodeMetaDict=dict(), connectionMetaDict=dict(), variableMetaList=list())}
+        if not records:
+            return fileDict
+
+        # Gather the base workflow by UUID
+        baseSnapshot = fileDict["DAG"]
+        nodeDict = OrderedDict((n["UUID"], n) for n in dag.snapshot()["NODES"])
+        nodeMetaDict = dict(baseSnapshot["NODE_META"] or dict())
+        edgeDict = OrderedDict(((e["FROM"], e["TO"]), None) for e in baseSnapshot["EDGES"])
+        connectionMetaDict = dict(baseSnapshot["CONNECTION_META"] or dict())
+        groups = list(baseSnapshot["GROUPS"])
+        variables = list(baseSnapshot["VARIABLE_SUBSTITIONS"] or list())
+
+        # Replay the changes in order
+        for record in records:
+            recordType = record.pop("RECORD")
+            if recordType == "NODE":
+                nodeMeta = record.pop("META", None)
+                if nodeMeta is not None:
+                    nodeMetaDict[record["UUID"]] = nodeMeta
+                nodeDict[record["UUID"]] = record
+            elif recordType == "NODE_REMOVED":
+                nodeDict.pop(record["UUID"], None)
+                nodeMetaDict.pop(record["UUID"], None)
+                for key in [k for k in edgeDict if record["UUID"] in k]:
+                    del edgeDict[key]
+                    connectionMetaDict.pop("%s|%s" % key, None)
+            elif recordType == "EDGE":
+                connectionMeta = record.pop("META", None)
+                if connectionMeta is not None:
+                    connectionMetaDict["%s|%s" % (record["FROM"], record["TO"])] = connectionMeta
+                edgeDict[(record["FROM"], record["TO"])] = None
+            elif recordType == "EDGE_REMOVED":
+                edgeDict.pop((record["FROM"], record["TO"]), None)
+                connectionMetaDict.pop("%s|%s" % (record["FROM"], record["TO"]), None)
+            elif recordType == "GROUPS":
+                groups = record["GROUPS"]
+            elif recordType == "VARIABLES":
+                variables = record["VARIABLES"]
+            else:
+                raise RuntimeError("Unknown record type '%s' in journal %s." % (recordType, self.journalFilename))
+
+        # Groups only keep the nodes that are still around
+        for g in groups:
+            g["NODES"] = [x for x in g["NODES"] if x in nodeDict]
+
+        snapshot = {"NODES": nodeDict.values(),
+                    "EDGES": [{"FROM": f, "TO": t} for (f, t) in edgeDict],
+                    "NODE_META": nodeMetaDict,
+                    "CONNECTION_META": connectionMetaDict,
+                    "GROUPS": groups,
+                    "VARIABLE_SUBSTITIONS": variables}
+        dag.restoreSnapshot(snapshot)
+        fileDict["DAG"] = snapshot
+        return fileDict
@@ -6,8 +6,6 @@
 
 import os
 import sys
-import json
-import tempfile
 import itertools
 from functools import partial
 
@@ -16,9 +14,13 @@ from PySide import QtCore, QtGui
 import depends_dag
 import depends_node
 import depends_util
+import depends_engine
+import depends_journal
 import depends_variables
+import depends_execution
 import depends_data_packet
 import depends_undo_commands
+import depends_workflow_file
 import depends_property_widget
 import depends_variable_widget
 import depends_graphics_widgets
@@ -42,7 +44,7 @@ class MainWindow(QtGui.QMainWindow):
     section), loading and saving of DAG snapshots, and much 
     """
 
-    def __init__(self, startFile="", parent=None):
+    def __init__(self, startFile="", recover=False, parent=None):
         """
         """
         QtGui.QMainWindow.__init__(self, parent)
@@ -80,6 +82,14 @@ class MainWindow(QtGui.QMainWindow):
         # Set some locals
         self.dag = None
         self.undoStack = QtGui.QUndoStack(self)
+        self.journal = None
+        self.journalIndex = 0
+        self.recoveredChanges = False
+        self.resultCache = depends_engine.newResultCache()
+        self.executor = None
+        self.maxWorkers = None
+        self.useProcesses = False
+        self.frameChunkSize = None
 
         # Undo and Redo have built-in ways to create their menus
         undoAction = self.undoStack.createUndoAction(self, "&Undo")
@@ -121,6 +131,12 @@ class MainWindow(QtGui.QMainWindow):
         recipeMenu = executeMenu.addMenu("&Output Recipe")
         executeMenu.addSeparator()
         executeMenu.addAction(QtGui.QAction("Version &Up outputs", self, shortcut= "Ctrl+U", triggered=self.versionUpSelectedOutputFilenames))
+        executeMenu.addSeparator()
+        executeMenu.addAction(QtGui.QAction("Set &Worker Count...", self, triggered=self.maxWorkersDialog))
+        processesAction = QtGui.QAction("Run Parallel Nodes in Separate &Processes", self, checkable=True, toggled=self.setUseProcesses)
+        processesAction.setChecked(self.useProcesses)
+        executeMenu.addAction(processesAction)
+        executeMenu.addAction(QtGui.QAction("Set &Frame Chunk Size...", self, triggered=self.frameChunkSizeDialog))
         #executeMenu.addAction(QtGui.QAction("&Test Menu Item", self, shortcut= "Ctrl+T", triggered=self.testMenuItem))
         executeMenu.addSeparator()
         executeMenu.addAction(QtGui.QAction("&Reload plugins", self, shortcut= "Ctrl+0", triggered=self.reloadPlugins))
@@ -130,7 +146,7 @@ class MainWindow(QtGui.QMainWindow):
 
         # Setup the variables, load the plugins, and auto-generate the read dag nodes
         self.setupStartupVariables()
-        depends_node.loadChildNodesFromPaths(depends_variables.value('NODE_PATH').split(':'))
+        depends_engine.loadNodePlugins()
 
         # Generate the Create menu.  Must be done after plugins are loaded.
         menuActions = self.createCreateMenuActions()
@@ -150,12 +166,16 @@ class MainWindow(QtGui.QMainWindow):
             cat.addAction(action)
 
 
-        # Load the starting filename or create a new DAG
+        # Load the starting filename (or the changes a previous session didn't save) or create a new DAG
         self.workingFilename = startFile
-        self.dag = depends_dag.DAG()
+        self.dag = depends_dag.DAG(trackTopologicalOrder=True)
         self.graphicsScene.setDag(self.dag)
-        if not self.open(self.workingFilename):
+        loaded = False
+        if recover or self.recoveryDialog(self.workingFilename):
+            loaded = self.recover(self.workingFilename)
+        if not loaded and not self.open(self.workingFilename):
             self.setWindowTitle("Depends")
+            self.startJournal(self.workingFilename)
         self.undoStack.setClean()
 
         # This is a small workaround to insure the properties dialog doesn't 
@@ -175,9 +195,13 @@ class MainWindow(QtGui.QMainWindow):
         self.graphicsScene.nodesConnected.connect(self.nodesConnected)
         self.propWidget.attrChanged.connect(self.propertyEdited)
         self.variableWidget.addVariable.connect(depends_variables.add)
+        self.variableWidget.addVariable.connect(self.variableChanged)
         self.variableWidget.setVariable.connect(depends_variables.setx)
+        self.variableWidget.setVariable.connect(self.variableChanged)
         self.variableWidget.removeVariable.connect(depends_variables.remove)
+        self.variableWidget.removeVariable.connect(self.variableChanged)
         self.undoStack.cleanChanged.connect(self.setWindowTitleClean)
+        self.undoStack.indexChanged.connect(self.journalUndoStackChanged)
 
 
     ###########################################################################
@@ -186,13 +210,22 @@ class MainWindow(QtGui.QMainWindow):
     def closeEvent(self, event):
         """
         Save program settings and ask "are you sure" if there are unsaved changes.
+        The change journal is only needed if the program doesn't exit normally,
+        so it is discarded unless the user wanted to save but didn't.
         """
-        if not self.undoStack.isClean():
+        saved = True
+        if self.hasUnsavedChanges():
             if self.yesNoDialog("Current workflow is not saved.  Save it before quitting?"):
                 if self.workingFilename:
-                    self.save(self.workingFilename)
+                    saved = self.save(self.workingFilename)
                 else:
-                    self.saveAs()
+                    saved = self.saveAs()
+        if saved:
+            self.journal.discard()
+        else:
+            self.journal.close()
+        if self.executor:
+            self.executor.close()
         self.saveSettings()
         QtGui.QMainWindow.closeEvent(self, event)
 
@@ -209,6 +242,14 @@ class MainWindow(QtGui.QMainWindow):
         return [sdn.dagNode for sdn in selectedDrawNodes]
 
 
+    def hasUnsavedChanges(self):
+        """
+        Returns whether the workflow has changed since it was last saved,
+        including changes recovered from a previous session's journal.
+        """
+        return self.recoveredChanges or not self.undoStack.isClean()
+
+
     def clearSelection(self):
         selectedDrawNodes = self.graphicsScene.selectedItems()
         for dagNode in selectedDrawNodes:
@@ -222,16 +263,7 @@ class MainWindow(QtGui.QMainWindow):
         by where the program is executed from and potentially a set of
         environment variables.
         """
-        # The current session gets a "binary directory" variable
-        depends_variables.add('DEPENDS_DIR')
-        depends_variables.setx('DEPENDS_DIR', os.path.dirname(os.path.realpath(__file__)), readOnly=True)
-
-        # ...And a path that points to where the nodes are loaded from
-        depends_variables.add('NODE_PATH')
-        if not os.environ.get('DEPENDS_NODE_PATH'):
-            depends_variables.setx('NODE_PATH', os.path.join(depends_variables.value('DEPENDS_DIR'), 'nodes'), readOnly=True)
-        else:
-            depends_variables.setx('NODE_PATH', os.environ.get('DEPENDS_NODE_PATH'), readOnly=True)
+        depends_engine.setupStartupVariables()
 
         
     def clearVariableDictionary(self):
@@ -253,6 +285,9 @@ class MainWindow(QtGui.QMainWindow):
         """
         self.settings.setValue("mainWindowGeometry", self.saveGeometry())
         self.settings.setValue("mainWindowState", self.saveState())
+        self.settings.setValue("executionMaxWorkers", self.maxWorkers or 0)
+        self.settings.setValue("executionUseProcesses", int(self.useProcesses))
+        self.settings.setValue("executionFrameChunkSize", self.frameChunkSize or 0)
         self.settings.sync()
         
         
@@ -263,6 +298,9 @@ class MainWindow(QtGui.QMainWindow):
         """
         self.restoreGeometry(self.settings.value('mainWindowGeometry'))
         self.restoreState(self.settings.value('mainWindowState'))
+        self.maxWorkers = int(self.settings.value('executionMaxWorkers', 0)) or None
+        self.useProcesses = bool(int(self.settings.value('executionUseProcesses', 0)))
+        self.frameChunkSize = int(self.settings.value('executionFrameChunkSize', 0)) or None
         
 
     ###########################################################################
@@ -272,8 +310,6 @@ class MainWindow(QtGui.QMainWindow):
         """
         Create a new dag node with a safe name, add it to the dag, and register it with the QGraphicsScene.
         """
-        preSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
-
         newDagNode = nodeType()
         nodeName = depends_node.cleanNodeName(newDagNode.typeStr())
         nodeName = self.dag.safeNodeName(nodeName)
@@ -281,8 +317,7 @@ class MainWindow(QtGui.QMainWindow):
         self.dag.addNode(newDagNode)
         self.graphicsScene.addExistingDagNode(newDagNode, nodeLocation)
 
-        currentSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
-        self.undoStack.push(depends_undo_commands.DagAndSceneUndoCommand(preSnap, currentSnap, self.dag, self.graphicsScene))
+        self.undoStack.push(depends_undo_commands.AddNodesUndoCommand([newDagNode], [nodeLocation], self.dag, self.graphicsScene, self.propWidget))
 
         self.clearSelection()
         drawNode = self.graphicsScene.drawNode(newDagNode)
@@ -294,18 +329,15 @@ class MainWindow(QtGui.QMainWindow):
         Delete an existing dag node and its edges, and make sure the QGraphicsScene cleans up as well.
         """
         nodesAffected = list()
-        preSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
+
+        # Only nodes downstream of the deleted ones can have their properties changed
+        preStates = depends_undo_commands.nodePropertyStates(self.dagNodesAfter(dagNodesToDelete))
+        removeCommand = depends_undo_commands.RemoveNodesUndoCommand(dagNodesToDelete, self.dag, self.graphicsScene)
 
         # Clean up the graphics scene
         # TODO: Should be a signal that tells the scene what to do
         for dagNode in dagNodesToDelete:
-            drawNode = self.graphicsScene.drawNode(dagNode)
-            drawEdges = drawNode.drawEdges()
-            for edge in drawEdges:
-                edge.sourceDrawNode().removeDrawEdge(edge)
-                edge.destDrawNode().removeDrawEdge(edge)
-                self.graphicsScene.removeItem(edge)
-            self.graphicsScene.removeItem(drawNode)
+            self.graphicsScene.removeExistingDagNode(dagNode)
 
         # Remove the nodes from the dag
         for delNode in dagNodesToDelete:
@@ -313,11 +345,11 @@ class MainWindow(QtGui.QMainWindow):
             nodesAffected.remove(delNode)
             self.dag.removeNode(delNode)
 
-        currentSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
-        self.undoStack.push(depends_undo_commands.DagAndSceneUndoCommand(preSnap, currentSnap, self.dag, self.graphicsScene))
+        propertiesCommand = depends_undo_commands.PropertiesUndoCommand(preStates, self.dag, self.graphicsScene)
+        self.undoStack.push(depends_undo_commands.CompoundUndoCommand([propertiesCommand, removeCommand], self.dag, self.graphicsScene, self.propWidget))
         
         # Updates the drawNodes for each of the affected dagNodes
-        self.graphicsScene.refreshDrawNodes(nodesAffected)
+        self.graphicsScene.refreshDrawNodes([n for n in nodesAffected if n not in dagNodesToDelete])
     
     
     def shakeNodes(self, dagNodesToShake):
@@ -326,11 +358,14 @@ class MainWindow(QtGui.QMainWindow):
         losing downstream information.
         """
         nodesAffected = list()
-        preSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
+        addedConnections = list()
+        removedConnections = list()
+        preStates = depends_undo_commands.nodePropertyStates(self.dagNodesAfter(dagNodesToShake) | set(dagNodesToShake))
 
         for dagNode in dagNodesToShake:
-            inNodes = self.dag.nodeConnectionsIn(dagNode)
-            outNodes = self.dag.nodeConnectionsOut(dagNode)
+            # Previous nodes are the edge sources in the network, next nodes the edge targets
+            inNodes = self.dag.nodeConnectionsOut(dagNode)
+            outNodes = self.dag.nodeConnectionsIn(dagNode)
             drawNode = self.graphicsScene.drawNode(dagNode)
             
             # Connect all previous dag nodes to all next nodes & add the draw edges
@@ -339,15 +374,18 @@ class MainWindow(QtGui.QMainWindow):
                 for outputDagNode in outNodes:
                     outputDrawNode = self.graphicsScene.drawNode(outputDagNode)
                     self.dag.connectNodes(inputDagNode, outputDagNode)
+                    addedConnections.append((inputDagNode, outputDagNode, 0, 0))
                     newDrawEdge = self.graphicsScene.addExistingConnection(inputDagNode, outputDagNode)
                     newDrawEdge.horizontalConnectionOffset = self.graphicsScene.drawEdge(drawNode, outputDrawNode).horizontalConnectionOffset
                     newDrawEdge.adjust()
             
             # Disconnect this dag node from everything
             for inputDagNode in inNodes:
+                removedConnections.append((inputDagNode, dagNode) + self.dag.connectionPorts(inputDagNode, dagNode))
                 self.dag.disconnectNodes(inputDagNode, dagNode)
             for outputDagNode in outNodes:
                 nodesAffected = nodesAffected + self.dagNodeDisconnected(dagNode)
+                removedConnections.append((dagNode, outputDagNode) + self.dag.connectionPorts(dagNode, outputDagNode))
                 self.dag.disconnectNodes(dagNode, outputDagNode)
 
             # Remove all draw edges
@@ -360,8 +398,9 @@ class MainWindow(QtGui.QMainWindow):
             for input in dagNode.inputs():
                 dagNode.setInputValue(input.name, "")
 
-        currentSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
-        self.undoStack.push(depends_undo_commands.DagAndSceneUndoCommand(preSnap, currentSnap, self.dag, self.graphicsScene))
+        connectionsCommand = depends_undo_commands.ConnectionsUndoCommand(addedConnections, removedConnections, self.dag, self.graphicsScene)
+        propertiesCommand = depends_undo_commands.PropertiesUndoCommand(preStates, self.dag, self.graphicsScene)
+        self.undoStack.push(depends_undo_commands.CompoundUndoCommand([connectionsCommand, propertiesCommand], self.dag, self.graphicsScene, self.propWidget))
 
         # A few refreshes
         self.propWidget.refresh()
@@ -373,16 +412,17 @@ class MainWindow(QtGui.QMainWindow):
         Create identical copies of the given dag nodes, but drop their 
         incoming and outgoing connections.
         """
-        preSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
-        
+        dupedNodes = list()
+        newLocations = list()
         for dagNode in dagNodesToDupe:
             dupedNode = dagNode.duplicate("_Dupe")
             newLocation = self.graphicsScene.drawNode(dagNode).pos() + QtCore.QPointF(20, 20)
             self.dag.addNode(dupedNode)
             self.graphicsScene.addExistingDagNode(dupedNode, newLocation)
+            dupedNodes.append(dupedNode)
+            newLocations.append(newLocation)
         
-        currentSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
-        self.undoStack.push(depends_undo_commands.DagAndSceneUndoCommand(preSnap, currentSnap, self.dag, self.graphicsScene))
+        self.undoStack.push(depends_undo_commands.AddNodesUndoCommand(dupedNodes, newLocations, self.dag, self.graphicsScene, self.propWidget))
 
 
     def versionUpOutputFilenames(self, dagNodesToVersionUp):
@@ -390,10 +430,11 @@ class MainWindow(QtGui.QMainWindow):
         Increment the filename version of all output filenames in a given
         list of dag nodes.
         """
-        preSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
+        selectedDagNodes = self.selectedDagNodes()
+        preStates = depends_undo_commands.nodePropertyStates(self.dagNodesAfter(selectedDagNodes) | set(selectedDagNodes))
 
         nodesAffected = list()
-        for dagNode in self.selectedDagNodes():
+        for dagNode in selectedDagNodes:
             for output in dagNode.outputs():
                 for soName in output.subOutputNames():
                     if not output.value[soName]:
@@ -401,11 +442,10 @@ class MainWindow(QtGui.QMainWindow):
                     currentValue = output.value[soName]
                     updatedValue = depends_util.nextFilenameVersion(currentValue)
                     dagNode.setOutputValue(output.name, soName, updatedValue)
-                    self.dag.setNodeStale(dagNode, False)
+                    self.dag.setNodeAndDependentsStale(dagNode)
                     nodesAffected = nodesAffected + self.dagNodeOutputChanged(dagNode, dagNode.outputNamed(output.name))
 
-        currentSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
-        self.undoStack.push(depends_undo_commands.DagAndSceneUndoCommand(preSnap, currentSnap, self.dag, self.graphicsScene))
+        self.undoStack.push(depends_undo_commands.PropertiesUndoCommand(preStates, self.dag, self.graphicsScene, self.propWidget))
 
         # Updates the drawNodes for each of the affected dagNodes
         self.propWidget.refresh()
@@ -418,10 +458,17 @@ class MainWindow(QtGui.QMainWindow):
         dag about it.
         """
         print 'disconnect', fromDagNode, toDagNode
+        preStates = depends_undo_commands.nodePropertyStates(self.dagNodesAfter([fromDagNode]))
+        removedConnection = (fromDagNode, toDagNode) + self.dag.connectionPorts(fromDagNode, toDagNode)
+
         nodesAffected = list()
         nodesAffected = nodesAffected + self.dagNodeDisconnected(fromDagNode)
         self.dag.disconnectNodes(fromDagNode, toDagNode)
 
+        connectionsCommand = depends_undo_commands.ConnectionsUndoCommand([], [removedConnection], self.dag, self.graphicsScene)
+        propertiesCommand = depends_undo_commands.PropertiesUndoCommand(preStates, self.dag, self.graphicsScene)
+        self.undoStack.push(depends_undo_commands.CompoundUndoCommand([propertiesCommand, connectionsCommand], self.dag, self.graphicsScene, self.propWidget))
+
         # A few refreshes
         self.propWidget.refresh()
         self.graphicsScene.refreshDrawNodes(nodesAffected)
@@ -435,6 +482,7 @@ class MainWindow(QtGui.QMainWindow):
         print 'connecting nodes', fromDagNode, toDagNode
         print 'ports', sourcePort, destPort
         self.dag.connectNodes(fromDagNode, toDagNode, sourcePort=sourcePort, destPort=destPort )
+        self.undoStack.push(depends_undo_commands.ConnectionsUndoCommand([(fromDagNode, toDagNode, sourcePort, destPort)], [], self.dag, self.graphicsScene, self.propWidget))
 
 
     def propertyEdited(self, dagNode, propName, newValue, propertyType=None):
@@ -444,28 +492,31 @@ class MainWindow(QtGui.QMainWindow):
         and nodes, and handle the repercussions.
         """
         somethingChanged = False
-        preSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
+        preStates = depends_undo_commands.nodePropertyStates([dagNode])
 
         nodesAffected = list()
         if propName == "Name" and propertyType is depends_node.DagNodeAttribute:
             if newValue != dagNode.name:
-                dagNode.setName(newValue)
-                nodesAffected = nodesAffected + [dagNode]
-                somethingChanged = True
+                try:
+                    dagNode.setName(newValue)
+                    nodesAffected = nodesAffected + [dagNode]
+                    somethingChanged = True
+                except RuntimeError, err:
+                    print err
+                    self.propWidget.refresh()
         else:
 
                 
             if propertyType is depends_node.DagNodeAttribute:
                 if newValue != dagNode.attributeValue(propName):
                     dagNode.setAttributeValue(propName, newValue)
-                    nodesAffected = nodesAffected + [dagNode]
+                    nodesAffected = nodesAffected + self.dag.setNodeAndDependentsStale(dagNode) + [dagNode]
                     somethingChanged = True
                 
 
         # Undos aren't registered when the value doesn't actually change
         if somethingChanged:
-            currentSnap = self.dag.snapshot(nodeMetaDict=self.graphicsScene.nodeMetaDict(), connectionMetaDict=self.graphicsScene.connectionMetaDict())
-            self.undoStack.push(depends_undo_commands.DagAndSceneUndoCommand(preSnap, currentSnap, self.dag, self.graphicsScene, self.propWidget))
+            self.undoStack.push(depends_undo_commands.PropertiesUndoCommand(preStates, self.dag, self.graphicsScene, self.propWidget))
 
         # Updates the drawNodes for each of the affected dagNodes
         self.graphicsScene.refreshDrawNodes(nodesAffected)
@@ -473,6 +524,18 @@ class MainWindow(QtGui.QMainWindow):
 
 
 
+    def variableChanged(self, variable, newValue=None):
+        """
+        When the user interface adds, changes, or removes a workflow variable,
+        every node using it (and everything downstream of those) is out of 
+        date.
+        """
+        for dagNode in self.dag.nodes():
+            if variable in self.dagNodeVariablesUsed(dagNode)[0]:
+                self.dag.setNodeAndDependentsStale(dagNode)
+        self.journal.recordVariables(depends_variables.changeableList())
+
+
     def selectNode(self, dagNode):
         """
         Select a node
@@ -535,6 +598,19 @@ class MainWindow(QtGui.QMainWindow):
     ###########################################################################
     ## DAG management
     ###########################################################################
+    def dagNodesAfter(self, dagNodes):
+        """
+        Return a set of all nodes downstream of any of the given nodes.  These
+        are the only nodes whose properties can change when the given nodes
+        are disconnected or their outputs change.
+        """
+        afterNodes = set()
+        for dagNode in dagNodes:
+            if dagNode not in afterNodes:
+                afterNodes.update(self.dag.allNodesAfter(dagNode))
+        return afterNodes
+
+
     def dagNodeDisconnected(self, fromDagNode):
         """
         When a node is disconnected, all nodes after it lose their inputs to
@@ -613,20 +689,10 @@ class MainWindow(QtGui.QMainWindow):
     def dagNodeVariablesUsed(self, dagNode):
         """
         Returns a tuple containing a list of all the single-dollar and a list 
-        of all the double-dollar variables used in the current DAG.
-        """
-        singleDollarList = list()
-        doubleDollarList = list()
-        for attribute in dagNode.attributes():
-            vps = depends_variables.present(dagNode.attributeValue(attribute.name, variableSubstitution=False))
-            vss = (list(), list())
-            vss2 = (list(), list())
-            if dagNode.attributeRange(attribute.name, variableSubstitution=False):
-                vss = depends_variables.present(dagNode.attributeRange(attribute.name, variableSubstitution=False)[0])
-                vss2 = depends_variables.present(dagNode.attributeRange(attribute.name, variableSubstitution=False)[1])
-            singleDollarList += vps[0] + vss[0] + vss2[0]
-            doubleDollarList += vps[1] + vss[1] + vss2[1]
-        return (list(set(singleDollarList)), list(set(doubleDollarList)))
+        of all the double-dollar variables used in the given node's inputs,
+        outputs, and attributes.
+        """
+        return dagNode.variablesUsed()
 
 
         
@@ -685,35 +751,120 @@ class MainWindow(QtGui.QMainWindow):
 
         print 'executing dag nodes'.center(120, '#')
 
-        # get the list of nodes to execute
-        orderedDependencies = self.dag.buildExecutionList(dagNode)
-
-        # include ourselves at the end
-        orderedDependencies.append(dagNode)
-        print orderedDependencies
+        # get the list of nodes to execute (ourselves included, at the end)
+        executionPlan = self.dag.executionPlan(dagNode)
+        print executionPlan.orderedNodes
 
 
         # try:
-        #     self.dagNodesSanityCheck(orderedDependencies)
+        #     self.dagNodesSanityCheck(executionPlan.orderedNodes)
         # except Exception, err:
         #     print err
         #     print "Aborting Dag execution."
         #     return
-        
-        executionList = list()
-        for dagNode in orderedDependencies:
-            print 'executing ', dagNode
 
+        # Independent branches run side by side on the executor's worker pool,
+        # which is kept until the execution settings change
+        if not self.executor:
+            self.executor = depends_execution.DagExecutor(self.dag, maxWorkers=self.maxWorkers, useProcesses=self.useProcesses,
+                                                          resultCache=self.resultCache, frameChunkSize=self.frameChunkSize)
+        report = self.executor.executePlan(executionPlan)
 
-            # Command execution
+        print 'this is what i executed:'
+        print report.summary()
 
-            nodesBefore = self.dag.nodeConnectionsByPort(dagNode)
-            dagNode.setPortValues(nodesBefore)
-            commandList = dagNode.executePython()
-            executionList.append((dagNode.name, dagNode.outVal))
 
-        print 'this is what i executed:'
-        print executionList
+    ###########################################################################
+    ## Change journal
+    ###########################################################################
+    def startJournal(self, filename, resetJournal=True):
+        """
+        Switch to the change journal of the given workflow file.  Unless told 
+        otherwise, the journal is emptied, as the file on disk holds the 
+        current state of the workflow.
+        """
+        directory = depends_journal.sessionDirectory(filename)
+        if self.journal and self.journal.directory != directory:
+            self.journal.discard()
+        self.journal = depends_journal.ChangeJournal(directory)
+        if resetJournal:
+            self.journal.reset(filename)
+        self.journalIndex = self.undoStack.index()
+
+
+    def compactJournal(self):
+        """
+        Write the entire workflow to the journal's checkpoint and empty it.
+        """
+        self.journal.compact(self.dag, nodeMetaDict=self.graphicsScene.nodeMetaDict(),
+                             connectionMetaDict=self.graphicsScene.connectionMetaDict(),
+                             variableMetaList=depends_variables.changeableList())
+
+
+    def journalUndoStackChanged(self, index):
+        """
+        Every edit to the workflow goes through the undo stack, so each time
+        a command is pushed, undone, or redone, the nodes and connections it
+        touched are written to the change journal as they now stand.  Commands
+        that don't say what they touched cause the whole workflow to be 
+        written out instead.
+        """
+        if not self.journal:
+            return
+        if index >= self.journalIndex:
+            commandIndices = range(self.journalIndex, index)
+        else:
+            commandIndices = range(index, self.journalIndex)
+        self.journalIndex = index
+
+        nodeUUIDs = set()
+        connections = set()
+        for commandIndex in commandIndices:
+            command = self.undoStack.command(commandIndex)
+            if not isinstance(command, depends_undo_commands.DeltaUndoCommand):
+                self.compactJournal()
+                return
+            nodeUUIDs.update(command.changedNodeUUIDs())
+            connections.update(command.changedConnections())
+        self.journalChanges(nodeUUIDs, connections)
+
+
+    def journalChanges(self, nodeUUIDs, connections):
+        """
+        Write the current state of the given nodes and (fromUUID, toUUID)
+        connections to the change journal, compacting it if it has grown too
+        long.
+        """
+        for nUUID in nodeUUIDs:
+            dagNode = self.dag.node(nUUID=nUUID)
+            if dagNode is None:
+                self.journal.recordNodeRemoved(str(nUUID))
+                continue
+            nodeMeta = self.graphicsScene.drawNodeMeta(self.graphicsScene.drawNode(dagNode))
+            self.journal.recordNode(self.dag.nodeSnapshot(dagNode), nodeMeta)
+
+        for (fromUUID, toUUID) in connections:
+            fromDagNode = self.dag.node(nUUID=fromUUID)
+            toDagNode = self.dag.node(nUUID=toUUID)
+            if fromDagNode is None or toDagNode is None or not self.dag.network.has_edge(fromDagNode, toDagNode):
+                self.journal.recordConnectionRemoved(str(fromUUID), str(toUUID))
+                continue
+            (sourcePort, destPort) = self.dag.connectionPorts(fromDagNode, toDagNode)
+            self.journal.recordConnection(str(fromUUID), str(toUUID), {'sourcePort': sourcePort, 'destPort': destPort})
+
+        if self.journal.needsCompaction():
+            self.compactJournal()
+
+
+    def recoveryDialog(self, filename):
+        """
+        If a previous session of the given workflow ended without saving its
+        changes, ask whether they should be recovered.  Journals of sessions
+        that are still running aren't offered.
+        """
+        if not depends_journal.recoverableJournals(filename):
+            return False
+        return self.yesNoDialog("A previous session of this workflow ended with unsaved changes.  Recover them?")
 
 
     ###########################################################################
@@ -725,35 +876,49 @@ class MainWindow(QtGui.QMainWindow):
         values it pulls to the currently active dependency graph.  Cleans up
         the UI accordingly.
         """
-        if not os.path.exists(filename):
+        # Load the snapshot off disk and apply it to the in-flight Dag and variables
+        self.clearVariableDictionary()
+        snapshot = depends_engine.loadWorkflow(filename, self.dag)
+        if snapshot is None:
             return False
-        
-        # Load the snapshot off disk
-        with open(filename, 'rb') as fp:
-            snapshot = json.loads(fp.read())
-            
-        # Apply the data to the in-flight Dag
-        self.dag.restoreSnapshot(snapshot["DAG"])
 
-        # Initialize the objects inside the graphWidget & restore the scene
-        self.graphicsScene.restoreSnapshot(snapshot["DAG"])
+        self.workflowLoaded(snapshot, filename)
+        self.startJournal(filename)
+        self.recoveredChanges = False
+        return True
 
 
-        # Variable substitutions
+    def recover(self, filename):
+        """
+        Rebuilds the given workflow from its change journal, replaying the
+        changes a previous session didn't save on top of the file on disk.
+        The recovered changes still count as unsaved.
+        """
         self.clearVariableDictionary()
-        for v in snapshot["DAG"]["VARIABLE_SUBSTITIONS"]:
-            depends_variables.variableSubstitutions[v["NAME"]] = (v["VALUE"], False)
+        try:
+            snapshot = depends_engine.recoverWorkflow(filename, self.dag)
+        except Exception, err:
+            print "Warning: Unable to recover unsaved changes:\n%s" % err
+            return False
+        if snapshot is None:
+            return False
 
-        # The current session gets a variable representing the location of the current workflow
-        if 'WORKFLOW_DIR' not in depends_variables.names():
-            depends_variables.add('WORKFLOW_DIR')
-        depends_variables.setx('WORKFLOW_DIR', os.path.dirname(filename), readOnly=True)
+        self.workflowLoaded(snapshot, filename)
+        self.startJournal(filename, resetJournal=False)
+        self.recoveredChanges = True
+        return True
 
-        # Additional meta-data loading
-        if "RELOAD_PLUGINS_FILENAME_TEMP" in snapshot:
-            filename = snapshot["RELOAD_PLUGINS_FILENAME_TEMP"]
 
-        # UI tidies
+    def workflowLoaded(self, snapshot, filename):
+        """
+        Cleans up the UI after a workflow has been loaded into the in-flight
+        Dag.
+        """
+        # Initialize the objects inside the graphWidget & restore the scene
+        self.graphicsScene.restoreSnapshot(snapshot["DAG"])
+
+        # UI tidies (the change journal is restarted afterwards, so clearing the undo stack isn't a change)
+        self.journalIndex = 0
         self.undoStack.clear()
         self.undoStack.setClean()
         self.workingFilename = filename
@@ -762,7 +927,6 @@ class MainWindow(QtGui.QMainWindow):
 
         self.addRecentItem(filename)
         self.rebuildRecentMenu()
-        return True
 
 
     def openDialog(self):
@@ -771,13 +935,13 @@ class MainWindow(QtGui.QMainWindow):
         on the results.
         """
         # TODO: This code is used twice almost identically.  Can it go into yesNoDialog?
-        if not self.undoStack.isClean():
+        if self.hasUnsavedChanges():
             if self.yesNoDialog("Current workflow is not saved.  Save it before opening?"):
                 if self.workingFilename:
                     self.save(self.workingFilename)
                 else:
                     self.saveAs()
-        filename, throwaway = QtGui.QFileDialog.getOpenFileName(self, caption='Open Workflow', filter="Workflow files (*.json)")
+        filename, throwaway = QtGui.QFileDialog.getOpenFileName(self, caption='Open Workflow', filter=depends_workflow_file.FILE_DIALOG_FILTER)
         if not filename:
             return
         self.open(filename)
@@ -786,10 +950,12 @@ class MainWindow(QtGui.QMainWindow):
     def save(self, filename, additionalFileDictionary=None):
         """
         Functionality for writing snapshots of the software's running state
-        to a json file.  Modifies the UI accordingly.
+        to a workflow file.  The file format is chosen by the filename's 
+        extension (see depends_workflow_file).  Modifies the UI accordingly.
+        Returns whether the workflow was saved.
         """
         if not filename:
-            return
+            return False
 
         currentFileName = self.workingFilename
 
@@ -805,17 +971,15 @@ class MainWindow(QtGui.QMainWindow):
         # TODO: A generic way to pass additional dicts into the snapshot function might be good.
         #       The parameter list is getting long and specific!  (also, variableList->variableDict)
         #       Or maybe we should just merge it all right here?
-        # Concoct a full snapshot from the current DAG and additional information fed into the function
-        snapshot = self.dag.snapshot(nodeMetaDict=nodeMetaDict, connectionMetaDict=connectionMetaDict, variableMetaList=varDicts)
-        fullSnap = {"DAG":snapshot}
-        if additionalFileDictionary:
-            fullSnap = dict({"DAG":snapshot}.items() + additionalFileDictionary.items())
-
-        # Serialize to disk
-        fp = open(filename, 'wb')
-        fp.write(json.dumps(fullSnap, sort_keys=True, indent=4))
-        fp.close()
+        # Serialize the current DAG and additional information fed into the function to disk
+        depends_workflow_file.writeWorkflow(filename, self.dag, nodeMetaDict=nodeMetaDict,
+                                            connectionMetaDict=connectionMetaDict, variableMetaList=varDicts,
+                                            additionalFileDictionary=additionalFileDictionary)
         
+        # The saved file is the new starting point for the change journal
+        self.startJournal(filename)
+        self.recoveredChanges = False
+
         # UI tidies
         self.undoStack.setClean()
         if currentFileName != filename:
@@ -825,17 +989,19 @@ class MainWindow(QtGui.QMainWindow):
 
         self.workingFilename = filename
         self.setWindowTitle("Depends (%s)" % self.workingFilename)
+        return True
         
         
     def saveAs(self):
         """
-        Save the DAG to a filename pulled out of a file dialog.
+        Save the DAG to a filename pulled out of a file dialog.  Returns whether
+        the workflow was saved.
         """
         currentDir = os.path.dirname(self.workingFilename)
-        filename, throwaway = QtGui.QFileDialog.getSaveFileName(self, caption='Save Workflow As', filter="Workflow files (*.json)", dir=currentDir)
+        filename, throwaway = QtGui.QFileDialog.getSaveFileName(self, caption='Save Workflow As', filter=depends_workflow_file.FILE_DIALOG_FILTER, dir=currentDir)
         if not filename:
-            return
-        self.save(filename)
+            return False
+        return self.save(filename)
 
 
     def saveVersionUp(self):
@@ -856,22 +1022,70 @@ class MainWindow(QtGui.QMainWindow):
         return False
 
 
+    def executionSettingsChanged(self):
+        """
+        Drop the current executor, so the next execution uses a new one built
+        with the current settings.
+        """
+        if self.executor:
+            self.executor.close()
+            self.executor = None
+
+
+    def maxWorkersDialog(self):
+        """
+        Ask the user how many nodes may execute at once.  Zero means one for 
+        each CPU.
+        """
+        (count, ok) = QtGui.QInputDialog.getInt(self, "Worker Count", "Nodes to execute at once (0 for one per CPU):", 
+                                                self.maxWorkers or 0, 0, 256)
+        if not ok:
+            return
+        self.maxWorkers = count or None
+        self.executionSettingsChanged()
+
+
+    def setUseProcesses(self, useProcesses):
+        """
+        Set whether embarrassingly parallel nodes execute in separate processes.
+        """
+        self.useProcesses = useProcesses
+        self.executionSettingsChanged()
+
+
+    def frameChunkSizeDialog(self):
+        """
+        Ask the user how many frames each chunk of an embarrassingly parallel
+        node executes.  Zero means nodes aren't split.
+        """
+        (size, ok) = QtGui.QInputDialog.getInt(self, "Frame Chunk Size", "Frames per chunk (0 to not split nodes):",
+                                               self.frameChunkSize or 0, 0, 1000000)
+        if not ok:
+            return
+        self.frameChunkSize = size or None
+        self.executionSettingsChanged()
+
+
     def reloadPlugins(self):
         """
         This menu item reloads all the plugin files off disk by restarting 
-        depends in-place.  If the current workflow has been modified, save 
-        a temporary copy and reload it on startup.
+        depends in-place.  If the current workflow has been modified, its
+        change journal already holds the modifications, so the restarted
+        program is simply told to recover them.
         """
         self.saveSettings()
         args = QtGui.qApp.arguments()
-        if not self.undoStack.isClean():
-            (osJunk, filename) = tempfile.mkstemp(prefix="dependsreload_", suffix=".json")
-    
-            metaDict = {"RELOAD_PLUGINS_FILENAME_TEMP":self.workingFilename}
-            self.save(filename, metaDict)
-    
-            filenameIndexMinusOne = args.index('-workflow')
-            args[filenameIndexMinusOne+1] = filename
+        if '-workflow' in args:
+            workflowIndex = args.index('-workflow')
+            del args[workflowIndex:workflowIndex+2]
+        # Untitled workflows are started without one, and -recover finds their journal all the same
+        if self.workingFilename:
+            args += ['-workflow', self.workingFilename]
+        if '-recover' in args:
+            args.remove('-recover')
+        if self.hasUnsavedChanges():
+            self.journal.close()
+            args.append('-recover')
         depends_util.restartProgram(args)
         
     
@@ -931,6 +1145,7 @@ class MainWindow(QtGui.QMainWindow):
         groupName = depends_util.generateUniqueNameSimiarToExisting('group', self.dag.nodeGroupDict.keys())
         self.dag.addNodeGroup(groupName, selDagNodes)
         self.graphicsScene.addExistingGroupBox(groupName, selDagNodes)
+        self.journal.recordGroups(self.dag.nodeGroupDict)
 
 
     def ungroupSelectedNodes(self):
@@ -944,6 +1159,7 @@ class MainWindow(QtGui.QMainWindow):
             return
         self.graphicsScene.removeExistingGroupBox(groupNameInDag)
         self.dag.removeNodeGroup(nodeListToRemove=selDagNodes)
+        self.journal.recordGroups(self.dag.nodeGroupDict)
         
 
     def versionUpSelectedOutputFilenames(self):
@@ -977,7 +1193,7 @@ class MainWindow(QtGui.QMainWindow):
         """
         actionList = list()
         for tipe in depends_node.dagNodeTypes():
-            menuAction = QtGui.QAction(tipe().typeStr(), self, triggered=self.createNodeFromMenuStub)
+            menuAction = QtGui.QAction(depends_node.nodeTypeStr(tipe), self, triggered=self.createNodeFromMenuStub)
             menuAction.setData((tipe, None))
             menuAction.category = tipe.category
             actionList.append(menuAction)
@@ -4,14 +4,17 @@
 # BSD license (LICENSE.txt for details).
 #
 
+import os
 import re
 import copy
+import glob
 import uuid
 from collections import OrderedDict
 
 import depends_util
 import depends_variables
 import depends_data_packet
+import depends_plugin_manifest
 
 
 """
@@ -32,9 +35,30 @@ inherited node should be as atomic as possible, performing one operation well.
 ###############################################################################
 def dagNodeTypes():
     """
-    Return a list of node types presently loaded.
+    Return a list of node types presently known.  Plugin node types whose 
+    modules haven't been imported yet are represented by NodeTypeStubs.
     """
-    return DagNode.__subclasses__()
+    nodeTypeDict = dict((t.__name__, t) for t in DagNode.__subclasses__())
+    nodeTypeDict.update(_nodeTypeDict)
+    return nodeTypeDict.values()
+
+
+def typeStrFromClassName(className):
+    """
+    Returns a human readable type string from a node class name, with 
+    CamelCaps->spaces and the 'DagNode' prefix removed.
+    """
+    return re.sub(r'(?!^)([A-Z]+)', r' \1', className[len('DagNode'):])
+
+
+def nodeTypeStr(nodeType):
+    """
+    Returns the human readable type string of a node type.  Node types that
+    haven't been imported yet aren't imported to find it.
+    """
+    if isinstance(nodeType, NodeTypeStub):
+        return typeStrFromClassName(nodeType.__name__)
+    return nodeType().typeStr()
 
 
 def cleanNodeName(name):
@@ -51,14 +75,36 @@ def cleanNodeName(name):
 # NOTE : If these get many more attributes, they may very well need to get their
 #        own dicts of values, ranges, etc.
 # NOTE : Sequence ranges are tuples containing two strings, the start and the end.
+# NOTE : Each class lists its members in __slots__ to keep nodes small, so any
+#        new member must be added there as well.
 #
 
-class DagNodeInput(object):
+class DagNodeProperty(object):
+    """
+    The common base of the input, output, and attribute classes.  Provides
+    pickling (and copying) support for their __slots__.
+    """
+
+    __slots__ = ()
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__ if hasattr(self, name))
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+###############################################################################
+###############################################################################
+class DagNodeInput(DagNodeProperty):
     """
     An input property of a DagNode.  Contains the datapacket type is accepts,
     a flag denoting if it's required or not, a name, and documentation.
     """
 
+    __slots__ = ('name', 'value', 'seqRange', 'docString', 'dataType', 'required')
+
 
     def __init__(self, name, dataType='', required=True, docString=None):
         """
@@ -84,7 +130,7 @@ class DagNodeInput(object):
 
 ###############################################################################
 ###############################################################################
-class DagNodeOutput(object):
+class DagNodeOutput(DagNodeProperty):
     """
     An output property of a DagNode.  Contains its data packet type, a doc
     string, a name, and potentially a string containing a custom file dialog
@@ -92,6 +138,8 @@ class DagNodeOutput(object):
     must contain the exact number of files as the rest of the sub-outputs, thus
     a single sequence range is present for an entire output.
     """
+
+    __slots__ = ('name', 'value', 'seqRange', 'docString', 'dataType')
     
     def __init__(self, name, dataType='', docString=None):
         """
@@ -112,13 +160,15 @@ class DagNodeOutput(object):
 
 ###############################################################################
 ###############################################################################
-class DagNodeAttribute(object):
+class DagNodeAttribute(DagNodeProperty):
     """
     An attribute property of a DagNode.  These contain a name, default value,
     a doc string, a potential custom file dialog specifier, and a flag stating
     if it's a file type or not.  The data is stored as a string, so whatever
     the user needs can be placed in here.
     """
+
+    __slots__ = ('name', 'value', 'seqRange', 'docString', 'dataType')
     
     def __init__(self, name, defaultValue, dataType='string', docString=None):
         """
@@ -158,19 +208,24 @@ class DagNode(object):
     def __init__(self, name="", nUUID=None):
         """
         """
+        # The DAG this node is a member of (set by DAG.addNode)
+        self.dag = None
         self.setName(name)
         self._properties = OrderedDict()
         self.outVal = None
         self.uuid = nUUID if nUUID else uuid.uuid4()
         self._portValues = dict()
 
+        # Tuples of the inputs, outputs, and attributes (built when first needed)
+        self._propertyTuples = None
+
         # Give the inputs, outputs, and attributes a place to live in the storage dict
         for input in self._defineInputs():
-            self._properties[self._inputNameInPropertyDict(input.name)] = input
+            self._setProperty(self._inputNameInPropertyDict(input.name), input)
         for output in self._defineOutputs():
-            self._properties[self._outputNameInPropertyDict(output.name)] = output
+            self._setProperty(self._outputNameInPropertyDict(output.name), output)
         for attribute in self._defineAttributes():
-            self._properties[attribute.name] = attribute
+            self._setProperty(attribute.name, attribute)
 
     def __repr__(self):
         return "<DagNode - name:%s  type:%s  uuid:%s>" % (self.name, type(self).__name__, str(self.uuid))
@@ -209,6 +264,16 @@ class DagNode(object):
         return hash(self.uuid)
 
 
+    def __getstate__(self):
+        """
+        For pickling (eg. when sent to another process for execution).  The
+        owning DAG is left behind.
+        """
+        state = self.__dict__.copy()
+        state['dag'] = None
+        return state
+
+
     def _inputNameInPropertyDict(self, inputName):
         """
         The property dict stores inputs with an interesting key.  Compute it.
@@ -225,6 +290,29 @@ class DagNode(object):
         return OUTPUT_ATTR_PREFIX+"@"+outputName
 
 
+    def _setProperty(self, propertyKey, nodeProperty):
+        """
+        Store an input, output, or attribute in the property dict under the
+        given key.  All changes to the property dict must go through here, as
+        it invalidates the cached property tuples.
+        """
+        self._properties[propertyKey] = nodeProperty
+        self._propertyTuples = None
+
+
+    def _categorizedProperties(self):
+        """
+        Return a tuple containing a tuple of inputs, a tuple of outputs, and a
+        tuple of attributes, each in the order they were defined.
+        """
+        if self._propertyTuples is None:
+            properties = self._properties.values()
+            self._propertyTuples = (tuple(x for x in properties if type(x) is DagNodeInput),
+                                    tuple(x for x in properties if type(x) is DagNodeOutput),
+                                    tuple(x for x in properties if type(x) is DagNodeAttribute))
+        return self._propertyTuples
+
+
     def setPortValues(self, inDict={}):
 
         self._portValues = dict()
@@ -252,13 +340,9 @@ class DagNode(object):
     ###########################################################################
     def inputs(self):
         """
-        Return a list of all input objects.
+        Return a tuple of all input objects.
         """
-        inputList = list()
-        for x in self._properties:
-            if type(self._properties[x]) is DagNodeInput:
-                inputList.append(self._properties[x])
-        return inputList
+        return self._categorizedProperties()[0]
 
 
     def setInputValue(self, inputName, value):
@@ -313,13 +397,9 @@ class DagNode(object):
     ###########################################################################
     def outputs(self):
         """
-        Return a list of all output objects.
+        Return a tuple of all output objects.
         """
-        outputList = list()
-        for x in self._properties:
-            if type(self._properties[x]) is DagNodeOutput:
-                outputList.append(self._properties[x])
-        return outputList
+        return self._categorizedProperties()[1]
 
 
     def setOutputValue(self, outputName, subOutputName, value):
@@ -377,20 +457,42 @@ class DagNode(object):
         filename = self.outputValue(outputName, subOutputName)
         seqRange = self.outputRange(outputName)
         return depends_util.framespec(filename, seqRange)
-    
+
+
+    def frameRange(self):
+        """
+        Return a (startFrame, endFrame) tuple of ints for the frames this node
+        produces, taken from the first output with a complete range, or None
+        if no output has one.  Workflow variables are substituted.
+        """
+        for output in self.outputs():
+            if not output.seqRange:
+                continue
+            spec = depends_util.framespec(None, self.outputRange(output.name))
+            if spec.hasFramerange():
+                return (spec.startFrame, spec.endFrame)
+        return None
+
+
+    def setFrameRange(self, startFrame, endFrame):
+        """
+        Narrow every output with a range to the given frames.  The execution
+        engine does this to a copy of the node when it executes the node's
+        frames in chunks.
+        """
+        for output in self.outputs():
+            if output.seqRange:
+                self.setOutputRange(output.name, (str(startFrame), str(endFrame)))
+
 
     ###########################################################################
     ## Attribute functions
     ###########################################################################
     def attributes(self):
         """
-        Return a list of all attribute objects.
+        Return a tuple of all attribute objects.
         """
-        attributeList = list()
-        for x in self._properties:
-            if type(self._properties[x]) is DagNodeAttribute:
-                attributeList.append(self._properties[x])
-        return attributeList
+        return self._categorizedProperties()[2]
 
 
     def setAttributeValue(self, attrName, value):
@@ -454,16 +556,22 @@ class DagNode(object):
         Returns a human readable type string with CamelCaps->spaces.
         """
         # TODO: MAKE EXPLICIT!
-        return re.sub(r'(?!^)([A-Z]+)', r' \1', type(self).__name__[len('DagNode'):])
+        return typeStrFromClassName(type(self).__name__)
     
     
     def setName(self, name):
         """
         Set the name value, converting all special characters (and spaces) into
-        underscores.
+        underscores.  A node in a DAG can't take the name of another node in
+        the same DAG.
         """
         processedName = cleanNodeName(name)
+        if self.dag and self.dag.node(name=processedName) not in (None, self):
+            raise RuntimeError('Cannot rename node %s to %s, as a node with that name already exists.' % (self.name, processedName))
+        oldName = getattr(self, 'name', None)
         self.name = processedName
+        if self.dag and oldName != processedName:
+            self.dag.nodeRenamed(self, oldName)
 
 
     def duplicate(self, nameExtension):
@@ -473,10 +581,10 @@ class DagNode(object):
         """
         dupe = type(self)(name=self.name+nameExtension)
         for attribute in self.attributes():
-            dupe._properties[attribute.name] = copy.deepcopy(attribute)
+            dupe._setProperty(attribute.name, copy.deepcopy(attribute))
         for output in self.outputs():
             fullOutputName = self._outputNameInPropertyDict(output.name)
-            dupe._properties[fullOutputName] = copy.deepcopy(output)
+            dupe._setProperty(fullOutputName, copy.deepcopy(output))
         return dupe
         
 
@@ -489,6 +597,30 @@ class DagNode(object):
         for input in self.inputs():
             acceptedTypes.update(input.allPossibleInputTypes())
         return list(acceptedTypes)
+
+
+    def variablesUsed(self):
+        """
+        Returns a tuple containing a list of all the single-dollar and a list
+        of all the double-dollar variables used in this node.  Every string 
+        that goes through variable substitution is checked: the values and 
+        ranges of the inputs, outputs (including every sub-output), and 
+        attributes.
+        """
+        propertyStrings = list()
+        for nodeProperty in self.inputs() + self.outputs() + self.attributes():
+            values = nodeProperty.value.values() if isinstance(nodeProperty.value, dict) else [nodeProperty.value]
+            if nodeProperty.seqRange:
+                values += list(nodeProperty.seqRange)
+            propertyStrings += [x for x in values if isinstance(x, basestring)]
+
+        singleDollarSet = set()
+        doubleDollarSet = set()
+        for propertyString in propertyStrings:
+            (singleDollarList, doubleDollarList) = depends_variables.present(propertyString)
+            singleDollarSet.update(singleDollarList)
+            doubleDollarSet.update(doubleDollarList)
+        return (list(singleDollarSet), list(doubleDollarSet))
     
 
     def inputRequirementsFulfilled(self, dataPackets):
@@ -637,6 +769,57 @@ class DagNode(object):
         Nodes that can process each input independently of the other inputs can
         overload this function and return True.  This gives the execution engine
         a hint that a single node or entire groups of nodes' can be parallelized.
+        An engine splitting frames runs executePython on copies of the node
+        whose outputs cover only part of its frameRange(), so such nodes
+        should work from their output ranges (eg. outputFramespec) and set
+        their outVal to a list with one entry per frame.
+        """
+        return False
+
+
+    def isCacheable(self):
+        """
+        Nodes whose result depends only on their properties and inputs can
+        have their outVal reused by the execution engine when none of those
+        have changed.  Nodes that talk to the outside world (other programs,
+        the filesystem) should overload this function and return False.  The
+        outVal of a cacheable node may be handed to later runs as it is, so
+        neither the node nor the nodes reading it should modify it in place.
+        """
+        return True
+
+
+    def isStreaming(self):
+        """
+        Nodes that set their outVal to an iterator (usually by yielding their
+        results from a generator) rather than a finished value can overload
+        this function and return True.  The execution engine then hands the
+        nodes they feed a depends_stream.Stream, which they can iterate over
+        once while this node is still producing it, if they read streams 
+        (see readsStreams), or a list of its items otherwise.  If nothing in
+        a run reads the stream, the node's outVal becomes a list of its items.
+        """
+        return False
+
+
+    def readsStreams(self):
+        """
+        Nodes that can iterate over a depends_stream.Stream found in their
+        port values, and don't hold on to it past their execution, can 
+        overload this function and return True.  Other nodes are given a
+        list of the stream's items instead.
+        """
+        return False
+
+
+    def isBatchable(self):
+        """
+        Nodes that do their work by queueing remote calls with 
+        depends_remote.runForNode(), and never look at the values of their
+        inputs, can overload this function and return True.  The execution
+        engine then runs them as soon as the nodes before them have queued
+        their calls, rather than waiting for the results, so whole chains of
+        them reach the remote host in a single message.
         """
         return False
         
@@ -686,22 +869,142 @@ def readNodeClassFactory(dataPacketType):
         return True
     NewClassType.validate = validate
 
+    # Make the new type available to snapshot restores
+    registerNodeType(NewClassType)
     return NewClassType
 
 
 
 
-############ FUNCTION TO IMPORT PLUGIN NODES INTO THIS NAMESPACE  #############
-def loadChildNodesFromPaths(pathList):
+###############################################################################
+## Node type registry
+###############################################################################
+# Every plugin node type by class name, as a NodeTypeStub until its module is imported
+_nodeTypeDict = dict()
+
+# Plugin modules imported so far, and the plugin modules each one's classes inherit from
+_loadedModuleSet = set()
+_baseModuleDict = dict()
+
+
+class NodeTypeStub(object):
     """
-    Given a list of directories, import all classes that reside in modules in those
-    directories into the node namespace.
+    Stands in for a plugin node class whose module hasn't been imported yet.
+    It has the class' name and category, and calling it like the class 
+    imports the module and returns a node of the real class.
     """
-    for path in pathList:
-        nodeClassDict = depends_util.allClassesOfInheritedTypeFromDir(path, DagNode)
-        for nc in nodeClassDict:
-            globals()[nc] = nodeClassDict[nc]
 
+    def __init__(self, className, category, moduleFilename):
+        """
+        """
+        self.__name__ = className
+        self.category = category
+        self.moduleFilename = moduleFilename
 
 
+    def __call__(self, *args, **kwargs):
+        """
+        Create a node of the real class.
+        """
+        return self.load()(*args, **kwargs)
 
+
+    def load(self):
+        """
+        Import the module defining this node type (if need be) and return the
+        real class.
+        """
+        nodeType = _nodeTypeDict.get(self.__name__)
+        if isinstance(nodeType, NodeTypeStub):
+            loadNodeModule(self.moduleFilename)
+            nodeType = _nodeTypeDict.get(self.__name__)
+        if nodeType is None or isinstance(nodeType, NodeTypeStub):
+            raise RuntimeError("Node type %s could not be loaded from plugin module %s." % (self.__name__, self.moduleFilename))
+        return nodeType
+
+
+def nodeTypeNamed(typeName):
+    """
+    Return the node type (a class or a NodeTypeStub) with the given class 
+    name.  Node classes that weren't registered, like ones defined outside of
+    plugin modules, are found among DagNode's descendants and registered the
+    first time they are asked for.  Raises a RuntimeError if there is no such
+    node type.
+    """
+    nodeType = _nodeTypeDict.get(typeName)
+    if nodeType is None:
+        for childType in depends_util.allClassChildren(DagNode):
+            if childType.__name__ == typeName:
+                nodeType = childType
+                registerNodeType(nodeType)
+                break
+        else:
+            raise RuntimeError("Node type %s does not exist in the current session." % typeName)
+    return nodeType
+
+
+def registerNodeType(nodeType):
+    """
+    Make a node class (or a NodeTypeStub) available through nodeTypeNamed.
+    Only real classes are made available by name in this namespace, so a
+    plugin class inheriting from another plugin's class never inherits from
+    a stub.
+    """
+    _nodeTypeDict[nodeType.__name__] = nodeType
+    if isinstance(nodeType, type):
+        globals()[nodeType.__name__] = nodeType
+
+
+def loadNodeModule(filename):
+    """
+    Import a plugin module and register every node class in it.  The plugin
+    modules defining the classes its classes inherit from are imported 
+    first, so it finds them in this namespace.  Modules are only imported 
+    once.
+    """
+    if filename in _loadedModuleSet:
+        return
+    _loadedModuleSet.add(filename)
+    for baseFilename in sorted(_baseModuleDict.get(filename, ())):
+        loadNodeModule(baseFilename)
+
+    nodeClassDict = depends_util.allClassesOfInheritedTypeFromFile(filename, DagNode)
+    for nc in nodeClassDict:
+        registerNodeType(nodeClassDict[nc])
+
+
+############ FUNCTION TO IMPORT PLUGIN NODES INTO THIS NAMESPACE  #############
+def loadChildNodesFromPaths(pathList):
+    """
+    Given a list of directories, make all node classes that reside in modules
+    in those directories available in the node namespace.  The classes are 
+    found through the plugin manifest without importing anything, and each 
+    module is imported the first time one of its nodes is created.  Modules
+    whose classes the manifest can't describe are imported right away.
+    """
+    manifest = depends_plugin_manifest.PluginManifest()
+    moduleEntries = list()
+    for path in pathList:
+        for filename in sorted(glob.glob(os.path.join(path, "*.py"))):
+            moduleEntries.append((filename, manifest.moduleEntry(filename)))
+    manifest.save()
+
+    eagerModules = set(filename for (filename, entry) in moduleEntries if entry["EAGER"])
+    nodeClasses = depends_plugin_manifest.nodeClasses(moduleEntries, DagNode.__name__, DagNode.category)
+
+    # A module's base classes from other plugin modules must be defined before it is imported
+    classModuleDict = dict((className, filename) for (filename, className, category, static) in nodeClasses)
+    for (filename, entry) in moduleEntries:
+        baseNames = set(b for classDict in entry["CLASSES"] for b in classDict["BASES"])
+        _baseModuleDict[filename] = set(classModuleDict[b] for b in baseNames
+                                        if b in classModuleDict and classModuleDict[b] != filename)
+
+    for (filename, className, category, static) in nodeClasses:
+        if not static:
+            eagerModules.add(filename)
+        elif not isinstance(_nodeTypeDict.get(className), type):
+            registerNodeType(NodeTypeStub(className, category, filename))
+
+    for (filename, entry) in moduleEntries:
+        if filename in eagerModules:
+            loadNodeModule(filename)
@@ -0,0 +1,192 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import ast
+import json
+import hashlib
+import tempfile
+
+
+"""
+A manifest of the node classes found in plugin modules, built by parsing the
+modules' source rather than importing them.  Each module's entry records the
+classes it defines (their names, base class names, and categories) along with
+the file's modification time, size, and content hash.  An entry is reused as
+long as the file's modification time and size are unchanged, or its content
+hash still matches, so a session only parses the plugins that changed since
+the last one.  Nothing in a plugin module is executed until one of its nodes
+is actually needed.
+
+A plugin module is imported at startup as it always was if its node classes
+can't be fully described without running it.  This is the case when a class
+overrides typeStr(), sets its category to something other than a string
+literal, or when the module doesn't parse at all.
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+MANIFEST_VERSION = 1
+
+
+def manifestFilename():
+    """
+    Return where the manifest is kept.  The DEPENDS_PLUGIN_MANIFEST
+    environment variable names the file if it is set, otherwise it lives in
+    the system's temporary directory.
+    """
+    filename = os.environ.get('DEPENDS_PLUGIN_MANIFEST')
+    if filename:
+        return filename
+    return os.path.join(tempfile.gettempdir(), 'depends_plugin_manifest.json')
+
+
+def _baseClassName(baseNode):
+    """
+    Return the name of a base class in a class statement (the last part of a
+    dotted name), or None if it is anything more complicated.
+    """
+    if isinstance(baseNode, ast.Name):
+        return baseNode.id
+    if isinstance(baseNode, ast.Attribute):
+        return baseNode.attr
+    return None
+
+
+def scanModuleSource(source, filename="<plugin>"):
+    """
+    Parse the source of a plugin module and return its manifest entry: a
+    dictionary containing a list of the classes defined at the top level of
+    the module, and whether the module must be imported to be understood.
+    """
+    try:
+        tree = ast.parse(source, filename)
+    except SyntaxError:
+        return {"CLASSES": list(), "EAGER": True}
+
+    classes = list()
+    for statement in tree.body:
+        if not isinstance(statement, ast.ClassDef):
+            continue
+        category = None
+        static = True
+        for item in statement.body:
+            if isinstance(item, ast.Assign):
+                if not [t for t in item.targets if isinstance(t, ast.Name) and t.id == 'category']:
+                    continue
+                if isinstance(item.value, ast.Str):
+                    category = item.value.s
+                else:
+                    static = False
+            elif isinstance(item, ast.FunctionDef) and item.name == 'typeStr':
+                static = False
+        classes.append({"NAME": statement.name,
+                        "BASES": [_baseClassName(b) for b in statement.bases],
+                        "CATEGORY": category,
+                        "STATIC": static})
+    return {"CLASSES": classes, "EAGER": False}
+
+
+def nodeClasses(moduleEntries, baseClassName, baseCategory):
+    """
+    Given a list of (moduleFilename, manifestEntry) tuples, find every class
+    that inherits (directly or through other listed classes) from the class
+    with the given name.  Returns a list of (moduleFilename, className,
+    category, static) tuples, where static says whether the class can be
+    used without importing its module.  Classes without a category of their
+    own inherit their base's.
+    """
+    knownDict = {baseClassName: (baseCategory, True)}
+    pending = [(f, c) for (f, entry) in moduleEntries for c in entry["CLASSES"]]
+    found = list()
+    while pending:
+        stillPending = list()
+        for (moduleFilename, classDict) in pending:
+            bases = [b for b in classDict["BASES"] if b in knownDict]
+            if not bases:
+                stillPending.append((moduleFilename, classDict))
+                continue
+            (category, static) = knownDict[bases[0]]
+            if classDict["CATEGORY"] is not None:
+                category = classDict["CATEGORY"]
+            static = static and classDict["STATIC"]
+            knownDict[classDict["NAME"]] = (category, static)
+            found.append((moduleFilename, classDict["NAME"], category, static))
+        if len(stillPending) == len(pending):
+            break
+        pending = stillPending
+    return found
+
+
+###############################################################################
+###############################################################################
+class PluginManifest(object):
+    """
+    The manifest entries of every plugin module seen so far, keyed by the
+    module's absolute filename, and kept on disk between sessions.
+    """
+
+    def __init__(self, filename=None):
+        """
+        """
+        self.filename = filename if filename else manifestFilename()
+        self.entryDict = dict()
+        self.dirty = False
+
+        # A manifest that can't be read is simply rebuilt
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'rb') as fp:
+                    manifestDict = json.load(fp)
+                if manifestDict.get("VERSION") == MANIFEST_VERSION:
+                    self.entryDict = manifestDict["MODULES"]
+            except Exception, err:
+                print "Warning: Plugin manifest %s could not be read and will be rebuilt." % self.filename
+                print '    "%s"' % (str(err))
+
+
+    def moduleEntry(self, moduleFilename):
+        """
+        Return the manifest entry for the given plugin module, parsing the
+        module only if it has changed since its entry was made.
+        """
+        key = os.path.abspath(moduleFilename)
+        fileStat = os.stat(key)
+        entry = self.entryDict.get(key)
+        if entry and entry["MTIME"] == fileStat.st_mtime and entry["SIZE"] == fileStat.st_size:
+            return entry
+
+        with open(key, 'rb') as fp:
+            source = fp.read()
+        digest = hashlib.md5(source).hexdigest()
+        if not entry or entry["HASH"] != digest:
+            entry = scanModuleSource(source, key)
+            entry["HASH"] = digest
+        entry["MTIME"] = fileStat.st_mtime
+        entry["SIZE"] = fileStat.st_size
+        self.entryDict[key] = entry
+        self.dirty = True
+        return entry
+
+
+    def save(self):
+        """
+        Write the manifest to disk if anything in it changed.  Failing to do
+        so only costs the next session some parsing, so it isn't an error.
+        """
+        if not self.dirty:
+            return
+        tempFilename = self.filename + '.%d.tmp' % os.getpid()
+        try:
+            with open(tempFilename, 'wb') as fp:
+                json.dump({"VERSION": MANIFEST_VERSION, "MODULES": self.entryDict}, fp, sort_keys=True)
+            os.rename(tempFilename, self.filename)
+            self.dirty = False
+        except (IOError, OSError), err:
+            print "Warning: Plugin manifest %s could not be written." % self.filename
+            print '    "%s"' % (str(err))
@@ -4,6 +4,8 @@
 # BSD license (LICENSE.txt for details).
 #
 
+from collections import OrderedDict
+
 from PySide import QtCore, QtGui
 
 import depends_node
@@ -14,10 +16,16 @@ import depends_file_dialog
 """
 A QT graphics widget that displays the properties (attributes, outputs, and
 inputs) of a given node.  Inputs can be modified with drag'n'drop, attributes
-can be modified with keyboard input, and outputs are the same.
+can be modified with keyboard input, and outputs are the same.  The edit 
+widgets for each type of node are built once and reused for every node of
+that type.
 """
 
 
+# How many node types keep their edit widgets around when they aren't shown
+MAX_POOLED_PANELS = 32
+
+
 ###############################################################################
 ###############################################################################
 class GeneralEdit(QtGui.QWidget):
@@ -202,12 +210,121 @@ class BoolAttrEdit(StringAttrEdit):
         self.lineEdit.setChecked(bool(value))
         self.lineEdit.stateChanged.emit(bool(value))  # TODO: Is this necessary?  Might be legacy.
 
+###############################################################################
+###############################################################################
+class NodePropertyPanel(QtGui.QWidget):
+    """
+    The name, attribute, and result edits (and an execute button, for execute
+    nodes) for one type of node with one layout of attributes.  A panel is
+    built from a node, but can be bound to any node of the same type and 
+    layout with bind(), which only changes the values shown.
+    """
+
+    # Signals
+    valueChanged = QtCore.Signal(str, object, type)
+    executeClicked = QtCore.Signal()
+
+    def __init__(self, dagNode, parent=None):
+        """
+        """
+        QtGui.QWidget.__init__(self, parent)
+        layout = QtGui.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+
+        # Populate the UI with name and type
+        self.nameWidget = GeneralEdit("Name", parent=self)
+        self.nameWidget.valueChanged.connect(self.valueChanged.emit)
+        layout.addWidget(self.nameWidget)
+
+        attributeGroup = QtGui.QTabWidget()
+        attributeGroup.setSizePolicy(QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        tabWidget = QtGui.QWidget()
+        attributeGroup.addTab(tabWidget, dagNode.typeStr())
+        attributeLayout = QtGui.QVBoxLayout(tabWidget)
+        attributeLayout.setContentsMargins(2, 2, 2, 2)
+        attributeLayout.setSpacing(2)
+
+        # Add the attributes
+        self.attributeEdits = list()
+        if dagNode.attributes():
+            for attribute in dagNode.attributes():
+                if attribute.dataType in ['float', 'int']:
+                    newThing = FloatAttrEdit(attribute=attribute, dagNode=dagNode, parent=attributeGroup)
+                elif attribute.dataType in ['bool']:
+                    newThing = BoolAttrEdit(attribute=attribute, dagNode=dagNode, parent=attributeGroup)
+                else:
+                    newThing = StringAttrEdit(attribute=attribute, dagNode=dagNode, parent=attributeGroup)
+                attributeLayout.addWidget(newThing)
+                newThing.valueChanged.connect(self.valueChanged.emit)
+                self.attributeEdits.append(newThing)
+        else:
+            noAttrLabel = QtGui.QLabel()
+            noAttrLabel.setText('No attributes')
+            attributeLayout.addWidget(noAttrLabel)
+        layout.addWidget(attributeGroup)
+
+        self.resultField = GeneralEdit("Result",
+                                       enabled=False,
+                                       toolTip='Result of this nodes last run',
+                                       parent=self)
+        layout.addWidget(self.resultField)
+
+        if type(dagNode).__name__ == 'DagNodeExecute':
+            executeBtn = QtGui.QPushButton(self)
+            executeBtn.setText('Execute')
+            executeBtn.clicked.connect(self.executeClicked.emit)
+            layout.addWidget(executeBtn)
+
+
+    @staticmethod
+    def layoutKey(dagNode):
+        """
+        Returns a key that is the same for every node a panel built from the
+        given node can be bound to.
+        """
+        return (type(dagNode), tuple((a.name, a.dataType, a.docString) for a in dagNode.attributes()))
+
+
+    def bind(self, dag, dagNode):
+        """
+        Point the edits at the given node and show its values.
+        """
+        for attrEdit, attribute in zip(self.attributeEdits, dagNode.attributes()):
+            attrEdit.dag = dag
+            attrEdit.dagNode = dagNode
+            attrEdit.attribute = attribute
+        self.refresh(dagNode)
+
+
+    def refresh(self, dagNode):
+        """
+        Show the current values of the given node.  Signals are blocked, so
+        setting the values doesn't look like the user edited them.
+        """
+        self.nameWidget.blockSignals(True)
+        self.nameWidget.setValue(dagNode.name)
+        self.nameWidget.blockSignals(False)
+
+        for attrEdit in self.attributeEdits:
+            attrEdit.blockSignals(True)
+            attrEdit.setValue(dagNode.attributeValue(attrEdit.attribute.name, variableSubstitution=False))
+            attrEdit.blockSignals(False)
+
+        self.resultField.blockSignals(True)
+        self.resultField.setValue(dagNode.outVal)
+        self.resultField.blockSignals(False)
+
+
 ###############################################################################
 ###############################################################################
 class PropWidget(QtGui.QWidget):
     """
     The full graphics view containing general edits for the object name and
     type, and input, attribute, and output edits for all the node's properties.
+    The edits are kept in a NodePropertyPanel per node type, and the panels of
+    recently shown node types are hidden rather than destroyed when the 
+    selection changes.
     """
 
     # Signals
@@ -239,81 +356,54 @@ class PropWidget(QtGui.QWidget):
         self.setMinimumHeight(400)
 
         self.dagNode = None
-        self.resultField = None
+        self.currentPanel = None
+
+        # Panels by NodePropertyPanel.layoutKey(), least recently shown first
+        self.panelDict = OrderedDict()
 
 
     def rebuild(self, dag, dagNodes):
         """
-        Completely reconstruct the entire widget from a dag and a list of
-        nodes.
+        Show the properties of a list of nodes from a dag.  The panel for the
+        node's type is reused if there is one, so only its values change.
         """
-        # Clear out all existing widgets
-        for child in self.foo.children():
-            if type(child) is not type(QtGui.QVBoxLayout()):
-                self.scrollAreaLayout.removeWidget(child)
-                child.setParent(None)
-                child.deleteLater()
+        if self.currentPanel:
+            self.currentPanel.hide()
+            self.currentPanel = None
 
         # We only allow one node to be selected so far
         if not dagNodes or len(dagNodes) > 1:
+            self.dagNode = None
             return
-
-        # Helpers
         self.dagNode = dagNodes[0]
-        attrChangedLambda = lambda propName, newValue, type, func=self.attrChanged.emit: func(self.dagNode, propName,
-                                                                                              newValue, type)
-
-        # Populate the UI with name and type
-        nameWidget = GeneralEdit("Name", parent=self)
-        nameWidget.setValue(self.dagNode.name)
-        nameWidget.valueChanged.connect(attrChangedLambda)
-        self.scrollAreaLayout.addWidget(nameWidget)
-
-        attributeGroup = QtGui.QTabWidget()
-        attributeGroup.setSizePolicy(QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        tabWidget = QtGui.QWidget()
-        attributeTab= attributeGroup.addTab(tabWidget, self.dagNode.typeStr())
-        attributeLayout = QtGui.QVBoxLayout(tabWidget)
-        attributeLayout.setContentsMargins(2, 2, 2, 2)
-        attributeLayout.setSpacing(2)
 
-       # Add the attributes (don't show any attributes that begin with input/output keywords)
-        if self.dagNode.attributes():
+        panelKey = NodePropertyPanel.layoutKey(self.dagNode)
+        panel = self.panelDict.pop(panelKey, None)
+        if panel is None:
+            panel = NodePropertyPanel(self.dagNode, parent=self.foo)
+            panel.valueChanged.connect(self.panelValueChanged)
+            panel.executeClicked.connect(self.executeBtnClicked)
+            self.scrollAreaLayout.addWidget(panel)
 
-            for attribute in self.dagNode.attributes():
+            # Make room by destroying the panel that was shown longest ago
+            if len(self.panelDict) >= MAX_POOLED_PANELS:
+                (oldKey, oldPanel) = self.panelDict.popitem(last=False)
+                self.scrollAreaLayout.removeWidget(oldPanel)
+                oldPanel.setParent(None)
+                oldPanel.deleteLater()
+        self.panelDict[panelKey] = panel
 
-                if attribute.dataType in ['float', 'int']:
-                    newThing = FloatAttrEdit(attribute=attribute, dagNode=self.dagNode, dag=dag, parent=attributeGroup)
-                elif attribute.dataType in ['bool']:
-                    newThing = BoolAttrEdit(attribute=attribute, dagNode=self.dagNode, dag=dag, parent=attributeGroup)
-
-                else:
-                    newThing = StringAttrEdit(attribute=attribute, dagNode=self.dagNode, dag=dag, parent=attributeGroup)
-
-                newThing.setValue(self.dagNode.attributeValue(attribute.name, variableSubstitution=False))
-
-                attributeLayout.addWidget(newThing)
-                newThing.valueChanged.connect(attrChangedLambda)
-        else:
-            noAttrLabel = QtGui.QLabel()
-            noAttrLabel.setText('No attributes')
-            attributeLayout.addWidget(noAttrLabel)
+        panel.bind(dag, self.dagNode)
+        panel.show()
+        self.currentPanel = panel
 
-       # attributeTab.setLayout(attributeLayout)
-        self.scrollAreaLayout.addWidget(attributeGroup)
 
-        self.resultField = GeneralEdit("Result",
-                                       enabled=False,
-                                       toolTip='Result of this nodes last run',
-                                       parent=self)
-        self.resultField.setValue(self.dagNode.outVal)
-        self.scrollAreaLayout.addWidget(self.resultField)
-
-        if type(self.dagNode).__name__ == 'DagNodeExecute':
-            executeBtn = QtGui.QPushButton(self)
-            executeBtn.setText('Execute')
-            executeBtn.clicked.connect(self.executeBtnClicked)
-            self.scrollAreaLayout.addWidget(executeBtn)
+    def panelValueChanged(self, propName, newValue, propertyType):
+        """
+        Pass an edit made in the current panel on, along with the node it 
+        was made to.
+        """
+        self.attrChanged.emit(self.dagNode, propName, newValue, propertyType)
 
 
     def executeBtnClicked(self, *args):
@@ -329,30 +419,5 @@ class PropWidget(QtGui.QWidget):
         Refresh the values of all the input, output, and attribute fields
         without a full reconstruction of the widget.
         """
-        groupBoxes = self.findChildren(QtGui.QGroupBox)
-        inputBox = None
-        attributeBox = None
-        outputBox = None
-        for gb in groupBoxes:
-            title = gb.title()
-            if title == "Inputs":
-                inputBox = gb
-            elif title == "Attributes":
-                attributeBox = gb
-            elif title == "Outputs":
-                outputBox = gb
-
-        if attributeBox:
-            attributeEdits = attributeBox.findChildren(StringAttrEdit)
-            for attrEdit in attributeEdits:
-                attrEdit.blockSignals(True)
-                attributeName = attrEdit.label.text()
-                attrEdit.setValue(self.dagNode.attributeValue(attributeName, variableSubstitution=False))
-                attrEdit.blockSignals(False)
-
-        if self.resultField:
-            self.resultField.blockSignals(True)
-            self.resultField.setValue(self.dagNode.outVal)
-            self.resultField.blockSignals(False)
-
-
+        if self.currentPanel:
+            self.currentPanel.refresh(self.dagNode)
@@ -0,0 +1,522 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import time
+import socket
+import cPickle
+import threading
+import traceback
+import contextlib
+from collections import OrderedDict
+
+
+"""
+Shared rpyc connections to the remote hosts (Maya, for now) that DCC nodes
+talk to.  Opening a connection costs several round trips, so connections are
+kept in a pool per host and port and handed to whichever node needs one next.
+A connection that has sat idle for a while is pinged before it is reused,
+and connections that fail are dropped.  A connection that fails before a
+batch is sent on it is replaced by a new one, but a batch whose connection
+fails while it is being sent or run isn't sent again, since some of its
+calls may already have run.
+
+Remote work is described as a list of calls (a module name, a function name,
+and arguments) and run as a batch.  The calls of a batch can be split into
+groups, where a failed call stops the rest of its group (and optionally every
+later group) from running.  The whole batch goes to the remote host in a
+single message, runs there in the host's main thread, and all of its results
+come back pickled in the reply, so a batch costs one round trip no matter how
+many calls it holds.  Arguments travel by value as long as they
+are immutable builtins (strings, numbers, tuples, None); anything else is
+proxied back to this process and costs extra round trips whenever the remote
+side looks at it.
+
+Each graph run has a CommandBuffer of its own, which the execution engine
+installs in a worker thread while the thread executes one of the run's
+nodes.  Nodes that hand their calls to runForNode() then only queue them,
+and the engine sends everything queued to each remote host in one message
+when it runs out of other work, setting each node's outVal from its calls'
+results.
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+DEFAULT_MAYA_HOST = '127.0.0.1'
+DEFAULT_MAYA_PORT = 8003
+
+# How many unused connections each pool keeps open
+DEFAULT_MAX_IDLE = 4
+
+# Connections idle for longer than this many seconds are pinged before reuse
+DEFAULT_HEALTH_CHECK_AFTER = 5.0
+DEFAULT_PING_TIMEOUT = 3.0
+
+# Errors meaning the connection itself is no longer usable
+CONNECTION_ERRORS = (EOFError, socket.error)
+
+# Installed in each remote interpreter the first time a connection runs a batch
+_BATCH_RUNNER_SOURCE = '''
+def _dependsRunBatch(groups, mainThread, stopOnError):
+    import importlib
+    import traceback
+    try:
+        import cPickle as pickle
+    except ImportError:
+        import pickle
+
+    def runGroup(calls):
+        groupOutcomes = list()
+        for (moduleName, functionName, args, kwargs) in calls:
+            if groupOutcomes and not groupOutcomes[-1][0]:
+                groupOutcomes.append((False, "Not run, an earlier call in the batch failed."))
+                continue
+            try:
+                function = getattr(importlib.import_module(moduleName), functionName)
+                groupOutcomes.append((True, function(*args, **dict(kwargs))))
+            except Exception:
+                groupOutcomes.append((False, traceback.format_exc()))
+        return groupOutcomes
+
+    def runAll():
+        outcomes = list()
+        for calls in groups:
+            if stopOnError and [o for o in outcomes if o is None or not o[-1][0]]:
+                outcomes.append(None)
+                continue
+            outcomes.append(runGroup(calls))
+        return outcomes
+
+    outcomes = None
+    if mainThread:
+        try:
+            import maya.utils
+            outcomes = maya.utils.executeInMainThreadWithResult(runAll)
+        except ImportError:
+            pass
+    if outcomes is None:
+        outcomes = runAll()
+
+    # Results that can't be pickled come back as proxies instead
+    try:
+        return (pickle.dumps(outcomes, 2), True)
+    except Exception:
+        return (tuple(outcomes), False)
+'''
+
+
+def remoteCall(moduleName, functionName, *args, **kwargs):
+    """
+    Describe a call of a function in a module on the remote host, for
+    RemoteConnectionPool.runBatch().
+    """
+    return (moduleName, functionName, tuple(args), tuple(sorted(kwargs.items())))
+
+
+def mayaAddress():
+    """
+    Return the (host, port) tuple of the Maya command server.  They can be
+    set with the DEPENDS_MAYA_HOST and DEPENDS_MAYA_PORT environment
+    variables.
+    """
+    host = os.environ.get('DEPENDS_MAYA_HOST') or DEFAULT_MAYA_HOST
+    port = int(os.environ.get('DEPENDS_MAYA_PORT') or DEFAULT_MAYA_PORT)
+    return (host, port)
+
+
+class RemoteCallError(RuntimeError):
+    """
+    A call in a batch raised an exception on the remote host.  The message
+    holds the remote traceback.
+    """
+    pass
+
+
+###############################################################################
+###############################################################################
+class PooledConnection(object):
+    """
+    A connection held by a RemoteConnectionPool, along with the remote batch
+    runner once it has been installed.
+    """
+
+    def __init__(self, conn):
+        """
+        """
+        self.conn = conn
+        self.runner = None
+        self.lastUsed = time.time()
+
+
+###############################################################################
+###############################################################################
+class RemoteConnectionPool(object):
+    """
+    A pool of rpyc classic connections to one host and port.  Connections
+    are checked out by one thread at a time, so nodes executing in parallel
+    each get their own.  The connectFunction, if given, is called with the
+    host and port instead of rpyc.classic.connect.
+    """
+
+    def __init__(self, host, port, maxIdle=DEFAULT_MAX_IDLE, healthCheckAfter=DEFAULT_HEALTH_CHECK_AFTER,
+                 connectFunction=None):
+        """
+        """
+        self.host = host
+        self.port = port
+        self.maxIdle = maxIdle
+        self.healthCheckAfter = healthCheckAfter
+        self.connectFunction = connectFunction
+
+        # How many connections have been opened so far
+        self.connectCount = 0
+
+        self._idle = list()
+        self._lock = threading.Lock()
+
+
+    def _connect(self):
+        """
+        Open a new connection.
+        """
+        if self.connectFunction:
+            conn = self.connectFunction(self.host, self.port)
+        else:
+            import rpyc
+            conn = rpyc.classic.connect(self.host, port=self.port)
+        with self._lock:
+            self.connectCount += 1
+        return PooledConnection(conn)
+
+
+    def _isHealthy(self, pooled):
+        """
+        Returns whether an idle connection can still be used, pinging the
+        remote host if the connection hasn't been used in a while.
+        """
+        if pooled.conn.closed:
+            return False
+        if time.time() - pooled.lastUsed < self.healthCheckAfter:
+            return True
+        try:
+            pooled.conn.ping(timeout=DEFAULT_PING_TIMEOUT)
+        except Exception:
+            return False
+        return True
+
+
+    def _close(self, pooled):
+        """
+        Close a connection, ignoring any trouble doing so.
+        """
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+
+    def acquire(self):
+        """
+        Check a connection out of the pool, reconnecting if none of the idle
+        connections are healthy.  Hand it back with release().
+        """
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return self._connect()
+            if self._isHealthy(pooled):
+                return pooled
+            self._close(pooled)
+
+
+    def release(self, pooled, broken=False):
+        """
+        Return a connection to the pool.  Broken connections, and any beyond
+        the pool's idle limit, are closed.
+        """
+        pooled.lastUsed = time.time()
+        if not broken and not pooled.conn.closed:
+            with self._lock:
+                if len(self._idle) < self.maxIdle:
+                    self._idle.append(pooled)
+                    return
+        self._close(pooled)
+
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        A context manager checking out a raw rpyc connection for the length of
+        a with block.
+        """
+        pooled = self.acquire()
+        broken = False
+        try:
+            yield pooled.conn
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(pooled, broken)
+
+
+    def closeAll(self):
+        """
+        Close every idle connection.
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = list()
+        for pooled in idle:
+            self._close(pooled)
+
+
+    def _acquireRunner(self):
+        """
+        Check a connection out of the pool with the batch runner installed.
+        If installing the runner fails, nothing has been sent to run yet, so
+        it is tried once more on a newly opened connection.
+        """
+        pooled = self.acquire()
+        for attempt in range(2):
+            try:
+                if pooled.runner is None:
+                    pooled.conn.execute(_BATCH_RUNNER_SOURCE)
+                    pooled.runner = pooled.conn.namespace['_dependsRunBatch']
+                return pooled
+            except CONNECTION_ERRORS:
+                self.release(pooled, broken=True)
+                if attempt:
+                    raise
+            pooled = self._connect()
+
+
+    def runGroupOutcomes(self, groups, mainThread=True, stopOnError=True):
+        """
+        Run a list of groups of remoteCall() descriptions on the remote host
+        in a single round trip.  A failed call stops the rest of its group,
+        and if stopOnError is set, every later group as well.  Returns a list
+        holding, per group, either None if it was not run, or a list with a
+        (succeeded, value) tuple per call, where value is the call's result 
+        or the remote traceback string.  A connection that fails before the
+        batch is sent is replaced, but if it fails once the batch is on its
+        way the error is raised, as the remote host may have run some of the
+        calls already.
+        """
+        if not groups:
+            return list()
+        pooled = self._acquireRunner()
+        broken = False
+        try:
+            (outcomes, pickled) = pooled.runner(tuple(tuple(g) for g in groups), mainThread, stopOnError)
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(pooled, broken)
+        if pickled:
+            return cPickle.loads(outcomes)
+        return [list(o) if o is not None else None for o in outcomes]
+
+
+    def runBatchOutcomes(self, calls, mainThread=True, stopOnError=True):
+        """
+        Run a list of remoteCall() descriptions on the remote host in a single
+        round trip.  Returns a list with a (succeeded, value) tuple per call,
+        where value is the call's result or the remote traceback string.  If
+        stopOnError is set, the calls after a failed one are not run.
+        """
+        if not calls:
+            return list()
+        if stopOnError:
+            return self.runGroupOutcomes([calls], mainThread=mainThread)[0]
+        outcomes = self.runGroupOutcomes([(c,) for c in calls], mainThread=mainThread, stopOnError=False)
+        return [o[0] for o in outcomes]
+
+
+    def runBatch(self, calls, mainThread=True):
+        """
+        Run a list of remoteCall() descriptions in a single round trip and
+        return their results.  Raises a RemoteCallError for the first call
+        that failed.
+        """
+        results = list()
+        for (succeeded, value) in self.runBatchOutcomes(calls, mainThread=mainThread):
+            if not succeeded:
+                raise RemoteCallError(value)
+            results.append(value)
+        return results
+
+
+###############################################################################
+## Shared pools
+###############################################################################
+_poolDict = dict()
+_poolDictLock = threading.Lock()
+
+
+def connectionPool(host, port):
+    """
+    Return the session's shared pool for the given host and port.
+    """
+    with _poolDictLock:
+        if (host, port) not in _poolDict:
+            _poolDict[(host, port)] = RemoteConnectionPool(host, port)
+        return _poolDict[(host, port)]
+
+
+def mayaConnectionPool():
+    """
+    Return the session's shared pool of connections to the Maya command
+    server (see mayaAddress()).
+    """
+    return connectionPool(*mayaAddress())
+
+
+###############################################################################
+## Command buffering
+###############################################################################
+# The CommandBuffer of the run each thread is executing a node for
+_threadState = threading.local()
+
+
+def setCommandBuffer(commandBuffer):
+    """
+    Make the given CommandBuffer (or None) the one runForNode() queues calls
+    in when called from the current thread, returning the previous one.
+    Other threads, which may be executing nodes for other runs, keep theirs.
+    """
+    previousBuffer = getattr(_threadState, 'commandBuffer', None)
+    _threadState.commandBuffer = commandBuffer
+    return previousBuffer
+
+
+def commandBuffer():
+    """
+    Return the CommandBuffer runForNode() currently queues calls in when 
+    called from the current thread, or None.
+    """
+    return getattr(_threadState, 'commandBuffer', None)
+
+
+def runForNode(dagNode, calls, pool=None, resultFunction=None):
+    """
+    Run a list of remoteCall() descriptions on behalf of a node and set the
+    node's outVal to the list of their results, or to whatever the
+    resultFunction returns when given that list.  The calls run on the Maya
+    command server unless a pool is given.  If a CommandBuffer is installed
+    the calls are only queued, and the node's outVal is set when the buffer
+    is flushed.  Otherwise they run right away, and a failed call raises a
+    RemoteCallError.
+    """
+    if pool is None:
+        pool = mayaConnectionPool()
+    activeBuffer = commandBuffer()
+    if activeBuffer is not None:
+        activeBuffer.queue(dagNode, pool, calls, resultFunction)
+        return
+    results = pool.runBatch(calls)
+    dagNode.outVal = resultFunction(results) if resultFunction else results
+
+
+###############################################################################
+###############################################################################
+class CommandBuffer(object):
+    """
+    Remote calls queued by nodes during a graph run.  Each node's calls are
+    a group of their own, and the groups are sent in the order they were
+    queued, one message per connection pool.  Once a node's calls fail,
+    nothing queued after them is run, since later nodes may depend on them.
+    """
+
+    def __init__(self):
+        """
+        """
+        self._entryList = list()
+        self._pendingNodeDict = dict()
+        self._lock = threading.Lock()
+
+
+    def queue(self, dagNode, pool, calls, resultFunction=None):
+        """
+        Queue a node's calls to be run on the given pool's host.
+        """
+        with self._lock:
+            self._entryList.append((dagNode, pool, tuple(calls), resultFunction))
+            self._pendingNodeDict[dagNode] = self._pendingNodeDict.get(dagNode, 0) + 1
+
+
+    def isPending(self, dagNode):
+        """
+        Returns whether the given node has calls waiting to be flushed.
+        """
+        return dagNode in self._pendingNodeDict
+
+
+    def pendingNodes(self):
+        """
+        Return a list of the nodes with calls waiting to be flushed.
+        """
+        return self._pendingNodeDict.keys()
+
+
+    def discard(self):
+        """
+        Drop every queued call without sending it, and return a list of the
+        nodes whose calls were dropped.
+        """
+        with self._lock:
+            discardedNodes = [dagNode for (dagNode, p, c, f) in self._entryList]
+            self._entryList = list()
+            self._pendingNodeDict = dict()
+        return list(OrderedDict.fromkeys(discardedNodes))
+
+
+    def flush(self, mainThread=True):
+        """
+        Send every queued call and set each node's outVal from the results.
+        Returns a list of (dagNode, error) tuples in the order the nodes were
+        queued, where error is None if the node's calls succeeded and the 
+        remote traceback otherwise.  Nodes whose calls were never run are
+        left out.
+        """
+        with self._lock:
+            entryList = self._entryList
+            self._entryList = list()
+            self._pendingNodeDict = dict()
+
+        # One message per pool, in the order the pools were first used
+        poolEntryDict = OrderedDict()
+        for entry in entryList:
+            poolEntryDict.setdefault(entry[1], list()).append(entry)
+
+        nodeErrorDict = OrderedDict()
+        for pool, poolEntries in poolEntryDict.items():
+            try:
+                outcomes = pool.runGroupOutcomes([calls for (n, p, calls, f) in poolEntries], mainThread=mainThread)
+            except Exception:
+                nodeErrorDict[poolEntries[0][0]] = traceback.format_exc()
+                break
+            for ((dagNode, p, calls, resultFunction), groupOutcomes) in zip(poolEntries, outcomes):
+                if groupOutcomes is None:
+                    break
+                errors = [value for (succeeded, value) in groupOutcomes if not succeeded]
+                if errors:
+                    nodeErrorDict[dagNode] = errors[0]
+                    break
+                results = [value for (succeeded, value) in groupOutcomes]
+                try:
+                    dagNode.outVal = resultFunction(results) if resultFunction else results
+                except Exception:
+                    nodeErrorDict[dagNode] = traceback.format_exc()
+                    break
+                nodeErrorDict.setdefault(dagNode, None)
+            if [e for e in nodeErrorDict.values() if e]:
+                break
+        return nodeErrorDict.items()
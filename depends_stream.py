@@ -0,0 +1,310 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import time
+import cPickle
+import tempfile
+import threading
+import traceback
+import collections
+
+
+"""
+Streams carry the result of a streaming node (see DagNode.isStreaming) to the
+nodes it feeds one item at a time, so a long list never has to exist in
+memory all at once.  The producing node's iterator runs on a thread of its
+own as soon as the first consumer starts reading, and each consumer reads
+from a buffer of its own.  Backpressure keeps the producer from running
+ahead: it waits whenever every consumer's buffer is full.  A buffer holds at
+most the buffer size in memory, and the items a slower (or late starting)
+consumer falls further behind by are pickled to a temporary file and read
+back as it catches up, so a slow consumer never holds up the others.  Items
+that can't be pickled are kept in memory instead.
+
+Each consumer may iterate over a stream once.  The execution engine gives a
+stream one reader per consumer in the run, and drops the readers of any
+consumers it skips.
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+# How many items a consumer's buffer holds in memory.  The producer waits while
+# every buffer is this full, and buffers further behind spill to disk.
+DEFAULT_BUFFER_SIZE = 256
+
+# The producer hands over items this many at a time, unless they are slow to
+# come and a reader is waiting
+CHUNK_SIZE = 64
+SLOW_ITEM_SECONDS = 0.001
+
+
+def isStream(value):
+    """
+    Returns whether a port value is a Stream rather than a regular value.
+    """
+    return isinstance(value, Stream)
+
+
+class StreamError(RuntimeError):
+    """
+    The node producing a stream raised an exception while it was being read.
+    The message holds the producer's traceback.
+    """
+    pass
+
+
+class _ReaderBuffer(object):
+    """
+    The items waiting for one reader of a stream.  Up to memoryLimit items
+    are held in memory, and any beyond that are spilled to a temporary file
+    until the reader catches up.  Once an item fails to pickle, nothing more
+    is spilled.  The stream's condition guards every call.
+    """
+
+    def __init__(self, memoryLimit):
+        """
+        """
+        self.memoryLimit = max(1, memoryLimit)
+        self._items = collections.deque()
+        self._spillFile = None
+        self._spilledCount = 0
+        self._readPosition = 0
+        self._spillable = True
+
+
+    def __len__(self):
+        return len(self._items) + self._spilledCount
+
+
+    def extend(self, items):
+        """
+        Append items, spilling those that don't fit in memory.
+        """
+        if not self._spilledCount:
+            room = self.memoryLimit - len(self._items) if self._spillable else len(items)
+            self._items.extend(items[:room])
+            items = items[room:]
+        if not items:
+            return
+
+        if self._spillFile is None:
+            self._spillFile = tempfile.TemporaryFile(prefix='depends_stream_')
+        self._spillFile.seek(0, 2)
+        for (index, item) in enumerate(items):
+            try:
+                cPickle.dump(item, self._spillFile, 2)
+            except Exception:
+                # Bring back what was spilled, so the items stay in order
+                self._items.extend(self._unspill(self._spilledCount))
+                self._items.extend(items[index:])
+                self._spillable = False
+                self._closeSpillFile()
+                return
+            self._spilledCount += 1
+
+
+    def take(self):
+        """
+        Remove and return a list of the items in memory, or if there are none,
+        up to memoryLimit items read back from the spill file.
+        """
+        if self._items:
+            items = list(self._items)
+            self._items.clear()
+            return items
+        return self._unspill(min(self._spilledCount, self.memoryLimit))
+
+
+    def _unspill(self, count):
+        """
+        Remove and return the given number of items from the spill file.
+        """
+        if not count:
+            return list()
+        self._spillFile.seek(self._readPosition)
+        items = [cPickle.load(self._spillFile) for i in xrange(count)]
+        self._readPosition = self._spillFile.tell()
+        self._spilledCount -= count
+        if not self._spilledCount:
+            self._spillFile.seek(0)
+            self._spillFile.truncate()
+            self._readPosition = 0
+        return items
+
+
+    def _closeSpillFile(self):
+        if self._spillFile is not None:
+            self._spillFile.close()
+            self._spillFile = None
+        self._spilledCount = 0
+        self._readPosition = 0
+
+
+    def clear(self):
+        """
+        Discard every item, along with the spill file.
+        """
+        self._items.clear()
+        self._closeSpillFile()
+
+
+###############################################################################
+###############################################################################
+class Stream(object):
+    """
+    The items of an iterator, handed to a fixed number of readers as they
+    are produced.
+    """
+
+    def __init__(self, iterable, readerCount=1, bufferSize=DEFAULT_BUFFER_SIZE, name=None):
+        """
+        """
+        self.name = name
+        self.bufferSize = bufferSize
+
+        self._iterator = iter(iterable)
+        self._buffers = [_ReaderBuffer(bufferSize) for i in range(readerCount)]
+        self._activeReaders = set(range(readerCount))
+        self._claimedCount = 0
+        self._thread = None
+        self._finished = False
+        self._closed = False
+        self._error = None
+        self._waitingReaderCount = 0
+        self._producerWaiting = False
+        self._condition = threading.Condition()
+
+
+    def __repr__(self):
+        """
+        """
+        return "<Stream from %s>" % (self.name if self.name else "an iterator")
+
+
+    def __iter__(self):
+        """
+        Claim the next reader and return an iterator over the stream's items.
+        """
+        with self._condition:
+            if self._claimedCount >= len(self._buffers):
+                raise RuntimeError("%r has no readers left." % self)
+            readerIndex = self._claimedCount
+            self._claimedCount += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._produce, name=repr(self))
+                self._thread.daemon = True
+                self._thread.start()
+        return self._read(readerIndex)
+
+
+    def dropReader(self):
+        """
+        Give up the next reader without reading anything, so the producer
+        doesn't wait on it.
+        """
+        with self._condition:
+            if self._claimedCount >= len(self._buffers):
+                return
+            self._removeReader(self._claimedCount)
+            self._claimedCount += 1
+
+
+    def close(self):
+        """
+        Stop producing items.  Readers finish once their buffers are empty.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+    def _removeReader(self, readerIndex):
+        """
+        Stop feeding a reader.  Must be called with the condition held.
+        """
+        self._activeReaders.discard(readerIndex)
+        self._buffers[readerIndex].clear()
+        self._condition.notify_all()
+
+
+    def _produce(self):
+        """
+        Runs on the producer thread, copying the items of the iterator into
+        every active reader's buffer a chunk at a time.  When items are slow
+        to come, a waiting reader gets each one as soon as it arrives.
+        """
+        try:
+            chunk = list()
+            chunkSize = max(1, min(CHUNK_SIZE, self.bufferSize))
+            lastItemTime = time.time()
+            for item in self._iterator:
+                chunk.append(item)
+                itemTime = time.time()
+                slowItem = itemTime - lastItemTime > SLOW_ITEM_SECONDS
+                lastItemTime = itemTime
+                if len(chunk) < chunkSize and not (slowItem and self._waitingReaderCount):
+                    continue
+                if not self._deliver(chunk):
+                    return
+                chunk = list()
+            if chunk:
+                self._deliver(chunk)
+        except Exception:
+            with self._condition:
+                self._error = traceback.format_exc()
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+
+    def _deliver(self, chunk):
+        """
+        Append a chunk of items to every active reader's buffer, once any of
+        them has room.  The buffers of readers further behind spill what 
+        doesn't fit in memory.  Returns False if nobody is reading anymore.
+        """
+        with self._condition:
+            while not self._closed and self._activeReaders and \
+                  min(len(self._buffers[i]) for i in self._activeReaders) >= self.bufferSize:
+                self._producerWaiting = True
+                self._condition.wait()
+                self._producerWaiting = False
+            if self._closed or not self._activeReaders:
+                return False
+            for readerIndex in self._activeReaders:
+                self._buffers[readerIndex].extend(chunk)
+            if self._waitingReaderCount:
+                self._condition.notify_all()
+        return True
+
+
+    def _read(self, readerIndex):
+        """
+        Yield the items of one reader's buffer as they arrive.
+        """
+        buffer = self._buffers[readerIndex]
+        try:
+            while True:
+                with self._condition:
+                    while not buffer and not self._finished and not self._closed:
+                        self._waitingReaderCount += 1
+                        self._condition.wait()
+                        self._waitingReaderCount -= 1
+                    if not buffer:
+                        if self._error:
+                            raise StreamError("%r failed:\n%s" % (self, self._error))
+                        return
+                    items = buffer.take()
+                    if self._producerWaiting:
+                        self._condition.notify_all()
+                for item in items:
+                    yield item
+        finally:
+            with self._condition:
+                self._removeReader(readerIndex)
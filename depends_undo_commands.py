@@ -4,108 +4,458 @@
 # BSD license (LICENSE.txt for details).
 #
 
-from PySide import QtGui
+import copy
+
+from PySide import QtCore, QtGui
 
 
 """
 A collection of QUndoCommand objects that are managed by the QT undo manager.
+Each command stores only the nodes, connections, properties, or positions an
+edit touched, rather than entire DAG and scene states.
 """
 
 
 ###############################################################################
+## Delta commands
 ###############################################################################
-class SceneOnlyUndoCommand(QtGui.QUndoCommand):
+def nodePropertyState(dagNode):
+    """
+    Return a tuple describing the name and the values and ranges of every 
+    input, output, and attribute of the given node.  Only the node's own
+    properties are copied, so this is cheap compared to a full DAG snapshot.
     """
-    An undo command that only tracks the state of the user interface 
-    QGraphicsScene.  No internal dependency graph info is tracked here.
+    return (dagNode.name,
+            tuple((x.name, copy.deepcopy(x.value), copy.deepcopy(x.seqRange)) for x in dagNode.inputs()),
+            tuple((x.name, copy.deepcopy(x.value), copy.deepcopy(x.seqRange)) for x in dagNode.outputs()),
+            tuple((x.name, copy.deepcopy(x.value), copy.deepcopy(x.seqRange)) for x in dagNode.attributes()))
+
+
+def restoreNodePropertyState(dagNode, state):
     """
-    
-    def __init__(self, oldSnap, newSnap, scene, parent=None):
+    Apply a tuple created by nodePropertyState() to the given node.
+    """
+    (name, inputs, outputs, attributes) = state
+    if dagNode.name != name:
+        dagNode.setName(name)
+    for (inputName, value, seqRange) in inputs:
+        dagNode.setInputValue(inputName, value)
+        dagNode.setInputRange(inputName, copy.deepcopy(seqRange))
+    for (outputName, value, seqRange) in outputs:
+        for subOutputName in value:
+            dagNode.setOutputValue(outputName, subOutputName, value[subOutputName])
+        dagNode.setOutputRange(outputName, copy.deepcopy(seqRange))
+    for (attributeName, value, seqRange) in attributes:
+        dagNode.setAttributeValue(attributeName, copy.deepcopy(value))
+        dagNode.setAttributeRange(attributeName, copy.deepcopy(seqRange))
+
+
+def nodePropertyStates(dagNodes):
+    """
+    Return a dictionary of node UUID -> nodePropertyState() for each of the
+    given nodes.
+    """
+    return dict((dagNode.uuid, nodePropertyState(dagNode)) for dagNode in dagNodes)
+
+
+###############################################################################
+###############################################################################
+class DeltaUndoCommand(QtGui.QUndoCommand):
+    """
+    The base class for undo commands that only store what an edit changed, 
+    rather than snapshots of the entire dependency graph and scene.  Commands
+    refer to nodes by UUID and apply themselves incrementally to the given
+    dependency graph and scene.  Like the snapshot commands, they are pushed
+    after the edit has happened, so the first redo is stifled.  Children
+    implement applyUndo() and applyRedo().
+    """
+
+    def __init__(self, dag, scene, propertyWidget=None, parent=None):
         """
         """
         QtGui.QUndoCommand.__init__(self, parent)
+        self.dag = dag
         self.scene = scene
-        self.oldSnap = oldSnap
-        self.newSnap = newSnap
+        self.propertyWidget = propertyWidget
         self.first = True
-        
-    
-    def id(self):
-        """
-        Required for commands that are capable of merging themselves.
-        """
-        return (0xbeef + 0x0000)
 
 
     def undo(self):
         """
-        Restore the old state of the user interface.
+        Revert the edit and refresh the property widget if it was provided.
         """
-        self.scene.restoreSnapshot(self.oldSnap)
-        
-        
+        self.applyUndo()
+        self.refreshPropertyWidget()
+
+
     def redo(self):
         """
-        Restore the new state of the user interface.
+        Reapply the edit and refresh the property widget if it was provided.
         The 'first' flag is used to stifle a double-apply when the command is
         first executed.
         """
         if not self.first:
-            self.scene.restoreSnapshot(self.newSnap)
+            self.applyRedo()
+            self.refreshPropertyWidget()
         self.first = False
 
 
+    def applyUndo(self):
+        pass
+
+
+    def applyRedo(self):
+        pass
+
+
+    def changedNodeUUIDs(self):
+        """
+        Return a set of the UUIDs of every node this command adds, removes,
+        moves, or modifies.
+        """
+        return set()
+
+
+    def changedConnections(self):
+        """
+        Return a set of (fromUUID, toUUID) tuples for every connection this
+        command makes or breaks.
+        """
+        return set()
+
+
+    def refreshPropertyWidget(self):
+        """
+        Rebuild the property widget for the scene's current selection.
+        """
+        if self.propertyWidget:
+            selectedDagNodes = [sdn.dagNode for sdn in self.scene.selectedItems()]
+            self.propertyWidget.rebuild(self.dag, selectedDagNodes)
+
+
+    def dagNode(self, nUUID):
+        """
+        Find the dag node with the given UUID in the dependency graph.
+        """
+        return self.dag.node(nUUID=nUUID)
+
+
 ###############################################################################
 ###############################################################################
-class DagAndSceneUndoCommand(QtGui.QUndoCommand):
+class AddNodesUndoCommand(DeltaUndoCommand):
     """
-    An undo command that tracks the state of the user interface as well as the
-    state of the given dependency graph.
+    Tracks dag nodes being added to the dependency graph and their draw nodes
+    being added to the scene at the given positions.
     """
 
-    def __init__(self, oldSnap, newSnap, dag, scene, propertyWidget=None, parent=None):
+    def __init__(self, dagNodes, positions, dag, scene, propertyWidget=None, parent=None):
         """
         """
-        QtGui.QUndoCommand.__init__(self, parent)
-        self.dag = dag
-        self.scene = scene
-        self.propertyWidget = propertyWidget
-        self.oldSnap = oldSnap
-        self.newSnap = newSnap
-        self.first = True
-        
-    
+        DeltaUndoCommand.__init__(self, dag, scene, propertyWidget, parent)
+        self.dagNodes = list(dagNodes)
+        self.positions = [(p.x(), p.y()) for p in positions]
+
+
     def id(self):
         """
         Required for commands that are capable of merging themselves.
         """
-        return (0xbeef + 0x0002)
+        return (0xbeef + 0x0004)
 
 
-    def undo(self):
+    def applyUndo(self):
         """
-        Restore the old state of the user interface and dependency graph.
-        Rebuild the property widget if it was provided as well.
+        Remove the nodes (and anything still connected to them).
         """
-        self.dag.restoreSnapshot(self.oldSnap)
-        self.scene.restoreSnapshot(self.oldSnap)
-        if self.propertyWidget:
-            selectedDrawNodes = self.scene.selectedItems()
-            selectedDagNodes = [sdn.dagNode for sdn in selectedDrawNodes]
-            self.propertyWidget.rebuild(self.dag, selectedDagNodes)
-        
-        
-    def redo(self):
+        # Hang on to the instances currently in the graph for the next redo
+        self.dagNodes = [self.dagNode(n.uuid) for n in self.dagNodes]
+        for dagNode in self.dagNodes:
+            self.scene.removeExistingDagNode(dagNode)
+            self.dag.removeNode(dagNode)
+
+
+    def applyRedo(self):
         """
-        Restore the new state of the user interface and dependency graph.
-        Rebuild the property widget if it was provided as well.  The 'first' 
-        flag is used to stifle a double-apply when the command is first executed.
+        Add the nodes back in at their original positions.
         """
-        if not self.first:
-            self.dag.restoreSnapshot(self.newSnap)
-            self.scene.restoreSnapshot(self.newSnap)
-            if self.propertyWidget:
-                selectedDrawNodes = self.scene.selectedItems()
-                selectedDagNodes = [sdn.dagNode for sdn in selectedDrawNodes]
-                self.propertyWidget.rebuild(self.dag, selectedDagNodes)
-        self.first = False
+        for dagNode, (x, y) in zip(self.dagNodes, self.positions):
+            self.dag.addNode(dagNode)
+            self.scene.addExistingDagNode(dagNode, QtCore.QPointF(x, y))
+
+
+    def changedNodeUUIDs(self):
+        return set(n.uuid for n in self.dagNodes)
+
+
+###############################################################################
+###############################################################################
+class RemoveNodesUndoCommand(DeltaUndoCommand):
+    """
+    Tracks dag nodes being removed from the dependency graph and the scene.
+    Must be created before the nodes are removed, as it records their 
+    positions, their properties, and every connection to and from them.
+    """
+
+    def __init__(self, dagNodes, dag, scene, propertyWidget=None, parent=None):
+        """
+        """
+        DeltaUndoCommand.__init__(self, dag, scene, propertyWidget, parent)
+        self.dagNodes = list(dagNodes)
+        self.propertyStates = [nodePropertyState(n) for n in self.dagNodes]
+        self.positions = list()
+        for dagNode in self.dagNodes:
+            position = scene.drawNode(dagNode).pos()
+            self.positions.append((position.x(), position.y()))
+
+        # Every connection touching the removed nodes, each listed once
+        connectionSet = set()
+        for dagNode in self.dagNodes:
+            for (fromDagNode, toDagNode) in dag.network.in_edges(dagNode) + dag.network.out_edges(dagNode):
+                connectionSet.add((fromDagNode, toDagNode))
+        self.connections = [(f.uuid, t.uuid) + dag.connectionPorts(f, t) for (f, t) in connectionSet]
+
+
+    def id(self):
+        """
+        Required for commands that are capable of merging themselves.
+        """
+        return (0xbeef + 0x0005)
+
+
+    def applyUndo(self):
+        """
+        Add the nodes back in at their original positions and reconnect them.
+        """
+        for dagNode, state, (x, y) in zip(self.dagNodes, self.propertyStates, self.positions):
+            restoreNodePropertyState(dagNode, state)
+            self.dag.addNode(dagNode)
+            self.scene.addExistingDagNode(dagNode, QtCore.QPointF(x, y))
+        for (fromUUID, toUUID, sourcePort, destPort) in self.connections:
+            fromDagNode = self.dagNode(fromUUID)
+            toDagNode = self.dagNode(toUUID)
+            self.dag.connectNodes(fromDagNode, toDagNode, sourcePort=sourcePort, destPort=destPort)
+            self.scene.addExistingConnection(fromDagNode, toDagNode, sourcePort=sourcePort, destPort=destPort)
+
+
+    def applyRedo(self):
+        """
+        Remove the nodes and their connections again.
+        """
+        self.dagNodes = [self.dagNode(n.uuid) for n in self.dagNodes]
+        for dagNode in self.dagNodes:
+            self.scene.removeExistingDagNode(dagNode)
+            self.dag.removeNode(dagNode)
+
+
+    def changedNodeUUIDs(self):
+        return set(n.uuid for n in self.dagNodes)
+
+
+    def changedConnections(self):
+        return set((f, t) for (f, t, s, d) in self.connections)
+
+
+###############################################################################
+###############################################################################
+class ConnectionsUndoCommand(DeltaUndoCommand):
+    """
+    Tracks connections being made and broken between existing nodes.  Each
+    connection is given as a (fromDagNode, toDagNode, sourcePort, destPort)
+    tuple.  The new connections are made before the old ones are broken.
+    """
+
+    def __init__(self, addedConnections, removedConnections, dag, scene, propertyWidget=None, parent=None):
+        """
+        """
+        DeltaUndoCommand.__init__(self, dag, scene, propertyWidget, parent)
+        self.addedConnections = [(f.uuid, t.uuid, s, d) for (f, t, s, d) in addedConnections]
+        self.removedConnections = [(f.uuid, t.uuid, s, d) for (f, t, s, d) in removedConnections]
+
+
+    def id(self):
+        """
+        Required for commands that are capable of merging themselves.
+        """
+        return (0xbeef + 0x0006)
+
+
+    def _connect(self, connections):
+        for (fromUUID, toUUID, sourcePort, destPort) in connections:
+            fromDagNode = self.dagNode(fromUUID)
+            toDagNode = self.dagNode(toUUID)
+            self.dag.connectNodes(fromDagNode, toDagNode, sourcePort=sourcePort, destPort=destPort)
+            self.scene.addExistingConnection(fromDagNode, toDagNode, sourcePort=sourcePort, destPort=destPort)
+
+
+    def _disconnect(self, connections):
+        for (fromUUID, toUUID, sourcePort, destPort) in connections:
+            fromDagNode = self.dagNode(fromUUID)
+            toDagNode = self.dagNode(toUUID)
+            self.scene.removeExistingConnection(fromDagNode, toDagNode)
+            self.dag.disconnectNodes(fromDagNode, toDagNode)
+
+
+    def applyUndo(self):
+        """
+        Break the new connections and restore the old ones.
+        """
+        self._disconnect(self.addedConnections)
+        self._connect(self.removedConnections)
+
+
+    def applyRedo(self):
+        """
+        Make the new connections and break the old ones again.
+        """
+        self._connect(self.addedConnections)
+        self._disconnect(self.removedConnections)
+
+
+    def changedConnections(self):
+        return set((f, t) for (f, t, s, d) in self.addedConnections + self.removedConnections)
+
+
+###############################################################################
+###############################################################################
+class PropertiesUndoCommand(DeltaUndoCommand):
+    """
+    Tracks changes to the names, inputs, outputs, and attributes of a set of
+    nodes.  Given the nodePropertyStates() of some nodes from before an edit,
+    the current states are recorded and only the nodes that actually changed
+    are kept.
+    """
+
+    def __init__(self, oldStates, dag, scene, propertyWidget=None, parent=None):
+        """
+        """
+        DeltaUndoCommand.__init__(self, dag, scene, propertyWidget, parent)
+        self.oldStates = dict()
+        self.newStates = dict()
+        for nUUID, oldState in oldStates.items():
+            dagNode = self.dagNode(nUUID)
+            if dagNode is None:
+                continue
+            newState = nodePropertyState(dagNode)
+            if newState != oldState:
+                self.oldStates[nUUID] = oldState
+                self.newStates[nUUID] = newState
+
+
+    def id(self):
+        """
+        Required for commands that are capable of merging themselves.
+        """
+        return (0xbeef + 0x0007)
+
+
+    def isEmpty(self):
+        """
+        Returns whether no properties changed at all.
+        """
+        return not self.newStates
+
+
+    def _restore(self, states):
+        """
+        Apply the given states and mark the nodes (and everything after them)
+        as stale.
+        """
+        changedDagNodes = list()
+        for nUUID, state in states.items():
+            dagNode = self.dagNode(nUUID)
+            restoreNodePropertyState(dagNode, state)
+            self.dag.setNodeAndDependentsStale(dagNode)
+            changedDagNodes.append(dagNode)
+        self.scene.refreshDrawNodes(changedDagNodes)
+
+
+    def applyUndo(self):
+        self._restore(self.oldStates)
+
+
+    def applyRedo(self):
+        self._restore(self.newStates)
+
+
+    def changedNodeUUIDs(self):
+        return set(self.newStates)
+
+
+###############################################################################
+###############################################################################
+class MoveNodesUndoCommand(DeltaUndoCommand):
+    """
+    Tracks draw nodes being moved around the scene.  Only the offset each 
+    node moved by is stored.  Nothing in the dependency graph changes.
+    """
+
+    def __init__(self, dagNodes, deltas, dag, scene, propertyWidget=None, parent=None):
+        """
+        """
+        DeltaUndoCommand.__init__(self, dag, scene, propertyWidget, parent)
+        self.moves = [(n.uuid, d.x(), d.y()) for n, d in zip(dagNodes, deltas)]
+
+
+    def id(self):
+        """
+        Required for commands that are capable of merging themselves.
+        """
+        return (0xbeef + 0x0008)
+
+
+    def _move(self, direction):
+        for (nUUID, dx, dy) in self.moves:
+            drawNode = self.scene.drawNode(self.dagNode(nUUID))
+            drawNode.setPos(drawNode.pos() + QtCore.QPointF(dx * direction, dy * direction))
+
+
+    def applyUndo(self):
+        self._move(-1.0)
+
+
+    def applyRedo(self):
+        self._move(1.0)
+
+
+    def changedNodeUUIDs(self):
+        return set(nUUID for (nUUID, dx, dy) in self.moves)
+
+
+###############################################################################
+###############################################################################
+class CompoundUndoCommand(DeltaUndoCommand):
+    """
+    Groups several delta commands into a single undo step.  The commands are
+    redone in the order given and undone in reverse.
+    """
+
+    def __init__(self, commands, dag, scene, propertyWidget=None, parent=None):
+        """
+        """
+        DeltaUndoCommand.__init__(self, dag, scene, propertyWidget, parent)
+        self.commands = [c for c in commands if not (isinstance(c, PropertiesUndoCommand) and c.isEmpty())]
+
+
+    def id(self):
+        """
+        Required for commands that are capable of merging themselves.
+        """
+        return (0xbeef + 0x0009)
+
+
+    def applyUndo(self):
+        for command in reversed(self.commands):
+            command.applyUndo()
+
+
+    def applyRedo(self):
+        for command in self.commands:
+            command.applyRedo()
+
+
+    def changedNodeUUIDs(self):
+        return set().union(*[c.changedNodeUUIDs() for c in self.commands])
+
+
+    def changedConnections(self):
+        return set().union(*[c.changedConnections() for c in self.commands])
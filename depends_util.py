@@ -40,16 +40,6 @@ def allClassChildren(inputClass):
     return list(subclasses)
 
 
-def classTypeNamedFromModule(typeString, moduleName):
-    """
-    Creates a node of a given type (string) from a loaded module specified by name.
-    """
-    moduleMembers = inspect.getmembers(globals()[moduleName])
-    classIndex = [i for i, t in enumerate(moduleMembers) if t[0] == typeString][0]
-    defaultConstructedNode = (moduleMembers[classIndex][1])()
-    return defaultConstructedNode
-
-
 def allClassesOfInheritedTypeFromDir(fromDir, classType):
     """
     Given a directory on-disk, dig through each .py module, looking for classes
@@ -59,20 +49,31 @@ def allClassesOfInheritedTypeFromDir(fromDir, classType):
     returnDict = dict()
     fileList = glob.glob(os.path.join(fromDir, "*.py"))
     for filename in fileList:
-        basename = os.path.basename(filename)
-        basenameWithoutExtension = basename[:-3]
-        try:
-            foo = imp.load_source(basenameWithoutExtension, filename)
-        except Exception, err:
-            print "Module '%s' raised the following exception when trying to load." % (basenameWithoutExtension)
-            print '    "%s"' % (str(err))
-            print "Skipping..."
-            continue
-        for x in inspect.getmembers(foo):
-            name = x[0]
-            data = x[1]
-            if type(data) is type and data in allClassChildren(classType):
-                returnDict[name] = data
+        returnDict.update(allClassesOfInheritedTypeFromFile(filename, classType))
+    return returnDict
+
+
+def allClassesOfInheritedTypeFromFile(filename, classType):
+    """
+    Import a single .py module, looking for classes that inherit from the
+    given classType.  Return a dictionary with class names as keys and the
+    class objects as values (empty if the module couldn't be imported).
+    """
+    returnDict = dict()
+    basename = os.path.basename(filename)
+    basenameWithoutExtension = basename[:-3]
+    try:
+        foo = imp.load_source(basenameWithoutExtension, filename)
+    except Exception, err:
+        print "Module '%s' raised the following exception when trying to load." % (basenameWithoutExtension)
+        print '    "%s"' % (str(err))
+        print "Skipping..."
+        return returnDict
+    for x in inspect.getmembers(foo):
+        name = x[0]
+        data = x[1]
+        if type(data) is type and data is not classType and issubclass(data, classType):
+            returnDict[name] = data
     return returnDict
 
 
@@ -204,6 +205,39 @@ def generateUniqueNameSimiarToExisting(prefix, existingNames):
             return "%s%02d" % (prefix, nameIndices[i]+1)
     
 
+# Matches a run of unescaped frame symbols ('#')
+FRAME_SYMBOL_PATTERN = re.compile(r'((?<!\\)\#+)')
+
+# Parsed frame templates, keyed by the string they came from
+_frameTemplateCache = dict()
+
+
+def frameTemplate(fileString):
+    """
+    Parse a string containing Nuke-style frame symbols into a tuple holding
+    a %-style format string with one zero-padded integer field per run of #s,
+    and the number of fields.  Escaped #s become literal # characters.  The
+    result is cached, so each distinct string is only parsed once.
+    """
+    template = _frameTemplateCache.get(fileString)
+    if template is not None:
+        return template
+
+    pieces = list()
+    position = 0
+    for match in FRAME_SYMBOL_PATTERN.finditer(fileString):
+        pieces.append(fileString[position:match.start()].replace('\\#', '#').replace('%', '%%'))
+        pieces.append("%%0%dd" % len(match.group(0)))
+        position = match.end()
+    pieces.append(fileString[position:].replace('\\#', '#').replace('%', '%%'))
+    template = ("".join(pieces), (len(pieces) - 1) / 2)
+
+    if len(_frameTemplateCache) >= 65536:
+        _frameTemplateCache.clear()
+    _frameTemplateCache[fileString] = template
+    return template
+
+
 class framespec(object):
     """
     This class defines a sequence of files on disk as a filename containing 
@@ -217,6 +251,11 @@ class framespec(object):
         foo.##.txt      1             foo.01.txt
         foo.#.txt       100           foo.100.txt
         foo\#.#.txt     5             foo#.5.txt
+    A framespec behaves like a read-only sequence of its filenames: it has a
+    length, can be indexed and sliced (slices are framespecs covering the
+    sub-range), and can be asked if it contains a frame number or filename, 
+    all without generating the full list of filenames.  A framespec without
+    a frame range holds only its filename, unexpanded.
     """
     
     def __init__(self, fileString, fileRange):
@@ -230,24 +269,126 @@ class framespec(object):
             self.setFramerange(*fileRange)
 
 
+    def __len__(self):
+        if not self.hasFramerange():
+            return 1
+        return max(0, self.endFrame - self.startFrame + 1)
+
+
+    def __iter__(self):
+        return self.iterframes()
+
+
+    def __getitem__(self, index):
+        """
+        Return the filename at a given index, or a new framespec covering the
+        frames of a given slice.  Slices must have a step of one.
+        """
+        if isinstance(index, slice):
+            (start, stop, step) = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Framespecs can only be sliced into contiguous frame ranges.")
+            if not self.hasFramerange():
+                return framespec(self.filename, None) if start < stop else framespec(self.filename, (0, -1))
+            stop = max(start, stop)
+            return framespec(self.filename, (self.startFrame + start, self.startFrame + stop - 1))
+        length = len(self)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError("Framespec index out of range.")
+        if not self.hasFramerange():
+            return self.filename
+        return self.frameFilename(self.startFrame + index)
+
+
+    def __contains__(self, item):
+        """
+        Return whether a frame number (int) or a filename (string) is part of 
+        this framespec.
+        """
+        if not isinstance(item, basestring):
+            return self.hasFramerange() and self.startFrame <= item <= self.endFrame
+        if not self.hasFramerange():
+            return item == self.filename
+        (formatString, fieldCount) = frameTemplate(self.filename)
+        if not fieldCount:
+            return len(self) > 0 and item == formatString % ()
+        match = self._filenamePattern().match(item)
+        if not match:
+            return False
+        frameNumber = int(match.group(1))
+        return frameNumber in self and self.frameFilename(frameNumber) == item
+
+
+    def _filenamePattern(self):
+        """
+        A compiled regular expression matching any frame of this framespec,
+        with the first frame number captured in group 1.
+        """
+        pieces = list()
+        position = 0
+        for match in FRAME_SYMBOL_PATTERN.finditer(self.filename):
+            pieces.append(re.escape(self.filename[position:match.start()].replace('\\#', '#')))
+            pieces.append(r'(-?\d+)')
+            position = match.end()
+        pieces.append(re.escape(self.filename[position:].replace('\\#', '#')))
+        return re.compile("".join(pieces) + r'\Z')
+
+
     def setFramerange(self, startFrame, endFrame):
         """
         Set the start and end frames given two strings or ints.
         """
-        self.startFrame = int(startFrame) if startFrame else None
-        self.endFrame = int(endFrame) if endFrame else None
+        self.startFrame = int(startFrame) if startFrame not in (None, '') else None
+        self.endFrame = int(endFrame) if endFrame not in (None, '') else None
+
+
+    def hasFramerange(self):
+        """
+        Return a boolean stating whether both a start and end frame are set.
+        """
+        return self.startFrame is not None and self.endFrame is not None
         
 
+    def frameFilename(self, frameNumber):
+        """
+        Return the filename of a single frame.
+        """
+        (formatString, fieldCount) = frameTemplate(self.filename)
+        return formatString % ((frameNumber,) * fieldCount)
+
+
+    def iterframes(self):
+        """
+        Yield each filename this framespec object represents, one at a time.
+        """
+        if not self.hasFramerange():
+            yield self.filename
+            return
+        (formatString, fieldCount) = frameTemplate(self.filename)
+        for i in xrange(self.startFrame, self.endFrame+1):
+            yield formatString % ((i,) * fieldCount)
+
+
     def frames(self):
         """
         Return a complete list of filenames this framespec object represents.
         """
-        frameList = list()
-        if self.startFrame is None or self.endFrame is None:
+        if not self.hasFramerange():
             return [self.filename]
-        for i in range(self.startFrame, self.endFrame+1):
-            frameList.append(self.replaceFrameSymbols(self.filename, i))
-        return frameList
+        return self.formatFrames(xrange(self.startFrame, self.endFrame+1))
+
+
+    def formatFrames(self, frameNumbers):
+        """
+        Return a list of the filenames for an iterable of frame numbers, 
+        formatted in a single pass with the parsed template.
+        """
+        (formatString, fieldCount) = frameTemplate(self.filename)
+        if fieldCount == 1:
+            return [formatString % i for i in frameNumbers]
+        return [formatString % ((i,) * fieldCount) for i in frameNumbers]
 
 
     @staticmethod
@@ -256,11 +397,7 @@ class framespec(object):
         Return a boolean stating whether or not the given string contains 
         known frame symbols ('#').
         """
-        matchObj = re.finditer(r'((?<!\\)\#+)', checkString)
-        i = next(matchObj, None)
-        if not i:
-            return False
-        return True
+        return frameTemplate(checkString)[1] > 0
         
 
     @staticmethod
@@ -271,12 +408,5 @@ class framespec(object):
         padded to the number of #s.  Escaped #s with a backslash (\#) will be 
         replaced with a single # character in this function.
         """
-        matchObj = re.finditer(r'((?<!\\)\#+)', replaceString)
-        i = next(matchObj, None)
-        while i:
-            padString = "%s" % str(frameNumber).zfill(len(i.group(0)))
-            replaceString = replaceString[:i.start()] + padString + replaceString[i.end():]
-            matchObj = re.finditer(r'((?<!\\)\#+)', replaceString)
-            i = next(matchObj, None)
-        replaceString = replaceString.replace('\#', '#')
-        return replaceString
+        (formatString, fieldCount) = frameTemplate(replaceString)
+        return formatString % ((frameNumber,) * fieldCount)
@@ -10,17 +10,80 @@ import re
 
 """
 A holder for the global workflow variable dictionary (variableSubstitutions)
-and functions to manipulate it.
+and functions to manipulate it.  Strings containing variables are parsed into
+a list of tokens once, and the results of substitution are remembered until
+a variable (or an environment variable the string uses) changes.
 """
 
 
 ###########################################################################
 ###########################################################################
+class VariableDict(dict):
+    """
+    A dictionary that counts its modifications.  The substitution cache 
+    compares this version number to know when its results are out of date,
+    no matter which code modifies the dictionary.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.version += 1
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.version += 1
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self.version += 1
+        return dict.setdefault(self, key, default)
+
+    def clear(self):
+        dict.clear(self)
+        self.version += 1
+
+
 # A "static" dict of environment variables, each containing a tuple with 
 # the variable definition string and a "Read Only" boolean
 # TODO: It's likely someone should own this since it would enable multiple
 #       projects to be loaded at once, but this is a non-issue for now.
-variableSubstitutions = dict()
+variableSubstitutions = VariableDict()
+
+
+# Matches a single-dollar ($VAR) or double-dollar ($$VAR) variable that isn't 
+# escaped with a backslash.  Group 1 holds the dollars and group 2 the name.
+VARIABLE_PATTERN = re.compile(r"(?<!\\)(?<!\$)(\${1,2})(?!\$)([A-Z0-9_]*)")
+
+# Token types produced by tokenize()
+TOKEN_TEXT = 0
+TOKEN_VARIABLE = 1
+TOKEN_ENVIRONMENT = 2
+
+# Parsed token lists, keyed by the string they came from
+_tokenCache = dict()
+
+# Substituted strings, keyed by the original string and the values of any
+# environment variables it uses.  Only valid for _substitutionCacheVersion.
+_substitutionCache = dict()
+_substitutionCacheVersion = None
+
+# The caches are emptied rather than grown past this many entries
+MAX_CACHE_ENTRIES = 65536
 
 
 ###########################################################################
@@ -88,52 +151,83 @@ def changeableList():
     return variables
     
 
+def tokenize(incomingString):
+    """
+    Split a string into a list of (tokenType, text) tuples in a single pass.
+    Text tokens hold literal text (with escaped dollars already unescaped), 
+    variable and environment tokens hold the variable's name.  Results are
+    cached, so each distinct string is only ever parsed once.
+    """
+    tokens = _tokenCache.get(incomingString)
+    if tokens is not None:
+        return tokens
+
+    # Splitting leaves the text between variables at every third position,
+    # with each variable's dollars and name in the two positions after it
+    pieces = VARIABLE_PATTERN.split(incomingString)
+    tokens = list()
+    for i in xrange(0, len(pieces) - 1, 3):
+        if pieces[i]:
+            tokens.append((TOKEN_TEXT, pieces[i].replace('\\$', '$')))
+        if len(pieces[i + 1]) == 1:
+            tokens.append((TOKEN_VARIABLE, pieces[i + 2]))
+        else:
+            tokens.append((TOKEN_ENVIRONMENT, pieces[i + 2]))
+    if pieces[-1]:
+        tokens.append((TOKEN_TEXT, pieces[-1].replace('\\$', '$')))
+    tokens = tuple(tokens)
+
+    if len(_tokenCache) >= MAX_CACHE_ENTRIES:
+        _tokenCache.clear()
+    _tokenCache[incomingString] = tokens
+    return tokens
+
+
 def present(incomingString):
     """
     Return a tuple containing a list of all single-dollar and a list of all 
     double-dollar variables present in the given string.
     """
-    # Build a list of single-dollar-signed variables without duplicates
-    presentSingleList = list()
-    singleDollars = re.compile(r"((?<!\\)(?<!\$)\${1}(?!\$)[A-Z0-9_]*)")
-    for match in singleDollars.finditer(incomingString):
-        variableName = match.group()[1:]
-        presentSingleList.append(variableName)
-    presentSingleList = list(set(presentSingleList))
-
-    # Build a list of double-dollar-signed variables without duplicates
-    presentDoubleList = list()
-    doubleDollars = re.compile(r"((?<!\\)(?<!\$)\${2}(?!\$)[A-Z0-9_]*)")
-    for match in doubleDollars.finditer(incomingString):
-        variableName = match.group()[2:]
-        presentDoubleList.append(variableName)
-    presentDoubleList = list(set(presentDoubleList))
-
+    tokens = tokenize(incomingString)
+    presentSingleList = list(set(t[1] for t in tokens if t[0] == TOKEN_VARIABLE))
+    presentDoubleList = list(set(t[1] for t in tokens if t[0] == TOKEN_ENVIRONMENT))
     return (presentSingleList, presentDoubleList)
     
 
 def substitute(incomingString):
     """
     Find and substitute all variables present in a given string.
-    Returns a new string.
-    """
-    newString = incomingString
-
-    # Replace all the single-dollar-signed strings with values from our variableSubstitution dictionary
-    singleDollars = re.compile(r"((?<!\\)(?<!\$)\${1}(?!\$)[A-Z0-9_]*)")
-    for match in singleDollars.finditer(newString):
-        variableName = match.group()[1:]
-        if variableName in variableSubstitutions:
-            substitution = variableSubstitutions[variableName][0]
-            newString = newString[:match.start()] + substitution + newString[match.end():]
-            
-    # Replace all the double-dollar-signed strings with values from our variableSubstitution dictionary
-    doubleDollars = re.compile(r"((?<!\\)(?<!\$)\${2}(?!\$)[A-Z0-9_]*)")
-    for match in doubleDollars.finditer(newString):
-        variableName = match.group()[2:]
-        if variableName in os.environ:
-            substitution = os.environ[variableName]
-            newString = newString[:match.start()] + substitution + newString[match.end():]
-
-    newString = newString.replace('\$', '$')
+    Single-dollar variables come from the variableSubstitutions dictionary
+    and double-dollar variables from the environment.  Variables that don't
+    exist are left in place.  Returns a new string.
+    """
+    global _substitutionCacheVersion
+    if _substitutionCacheVersion != variableSubstitutions.version:
+        _substitutionCache.clear()
+        _substitutionCacheVersion = variableSubstitutions.version
+
+    tokens = tokenize(incomingString)
+
+    # The result also depends on the values of any environment variables used
+    environmentValues = tuple(os.environ.get(t[1]) for t in tokens if t[0] == TOKEN_ENVIRONMENT)
+    cacheKey = (incomingString, environmentValues)
+    newString = _substitutionCache.get(cacheKey)
+    if newString is not None:
+        return newString
+
+    pieces = list()
+    for (tokenType, text) in tokens:
+        if tokenType == TOKEN_TEXT:
+            pieces.append(text)
+        elif tokenType == TOKEN_VARIABLE and text in variableSubstitutions:
+            pieces.append(variableSubstitutions[text][0])
+        elif tokenType == TOKEN_ENVIRONMENT and text in os.environ:
+            pieces.append(os.environ[text])
+        else:
+            pieces.append(('$' if tokenType == TOKEN_VARIABLE else '$$') + text)
+    newString = ''.join(pieces)
+
+    if len(_substitutionCache) >= MAX_CACHE_ENTRIES:
+        _substitutionCache.clear()
+    _substitutionCache[cacheKey] = newString
     return newString
@@ -0,0 +1,234 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import gzip
+import json
+import uuid
+
+
+"""
+Reading and writing workflow files.  Two on-disk formats hold the same
+snapshot schema: the original, indented JSON document, and a compact stream
+format with one JSON record per line (optionally gzip-compressed).  The
+stream format is written one node at a time and read one record at a time
+while the DAG is being built, so neither side ever holds the whole file in
+memory.  The format of a file being read is detected automatically.
+
+A stream file begins with a header record, followed by records for the
+variables, extra file entries, nodes (with their meta information), edges
+(with their meta information), and groups, in that order.
+"""
+
+
+###############################################################################
+## Formats
+###############################################################################
+FORMAT_JSON = 'json'
+FORMAT_STREAM = 'stream'
+FORMAT_STREAM_GZIP = 'streamgz'
+
+STREAM_FORMAT_NAME = 'DEPENDS_STREAM'
+STREAM_FORMAT_VERSION = 1
+
+GZIP_MAGIC = '\x1f\x8b'
+
+# File dialog filter string covering every format
+FILE_DIALOG_FILTER = "Workflow files (*.json *.jsonl *.jsonl.gz)"
+
+
+def formatForFilename(filename):
+    """
+    Return which format a workflow should be written in, based on the
+    given filename's extension.  Anything not ending in .jsonl or .gz is
+    written as JSON.
+    """
+    if filename.endswith('.gz'):
+        return FORMAT_STREAM_GZIP
+    if filename.endswith('.jsonl'):
+        return FORMAT_STREAM
+    return FORMAT_JSON
+
+
+def _openForReading(filename):
+    """
+    Open a file for reading, decompressing it on the fly if it is gzipped.
+    """
+    with open(filename, 'rb') as fp:
+        magic = fp.read(len(GZIP_MAGIC))
+    if magic == GZIP_MAGIC:
+        return gzip.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def _streamHeader(line):
+    """
+    Return the header record if the given line is a stream format header,
+    or None otherwise.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or record.get("FORMAT") != STREAM_FORMAT_NAME:
+        return None
+    return record
+
+
+###############################################################################
+## Reading
+###############################################################################
+def readWorkflow(filename, dag):
+    """
+    Read a workflow file in any format and restore its contents into the
+    given dependency graph.  Returns the file dictionary ({"DAG":snapshot}
+    plus any additional entries).  When reading the stream format, the node
+    records aren't kept, so the returned snapshot has no "NODES" entry.
+    """
+    fp = _openForReading(filename)
+    try:
+        firstLine = fp.readline()
+        header = _streamHeader(firstLine)
+        if header is None:
+            fileDict = json.loads(firstLine + fp.read())
+            dag.restoreSnapshot(fileDict["DAG"])
+            return fileDict
+        if header.get("VERSION", 0) > STREAM_FORMAT_VERSION:
+            raise RuntimeError("Workflow file %s was written by a newer version of Depends." % filename)
+        return _readStream(fp, dag)
+    finally:
+        fp.close()
+
+
+def _readStream(fp, dag):
+    """
+    Build the DAG from the records of a stream format file, one record at a
+    time.  The edges are connected (and checked for cycles) once they have
+    all been read.
+    """
+    dag.clear()
+    snapshot = {"NODE_META": dict(),
+                "CONNECTION_META": dict(),
+                "EDGES": list(),
+                "GROUPS": list(),
+                "VARIABLE_SUBSTITIONS": list()}
+    fileDict = {"DAG": snapshot}
+
+    connectionList = list()
+    for line in fp:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        recordType = record.pop("RECORD")
+
+        if recordType == "NODE":
+            nodeMeta = record.pop("META", None)
+            if nodeMeta is not None:
+                snapshot["NODE_META"][record["UUID"]] = nodeMeta
+            # Results aren't part of a snapshot, so restored nodes always start out stale
+            dag.addNode(dag.nodeFromSnapshot(record), stale=True)
+
+        elif recordType == "EDGE":
+            fromNode = dag.node(nUUID=uuid.UUID(record["FROM"]))
+            toNode = dag.node(nUUID=uuid.UUID(record["TO"]))
+            if fromNode is None or toNode is None:
+                raise RuntimeError("Edge %s -> %s refers to a node that does not exist." % (record["FROM"], record["TO"]))
+            sourcePort = 0
+            destPort = 0
+            connectionMeta = record.pop("META", None)
+            if connectionMeta is not None:
+                snapshot["CONNECTION_META"]["%s|%s" % (record["FROM"], record["TO"])] = connectionMeta
+                sourcePort = connectionMeta['sourcePort']
+                destPort = connectionMeta['destPort']
+            snapshot["EDGES"].append(record)
+            connectionList.append((fromNode, toNode, sourcePort, destPort))
+
+        elif recordType == "GROUP":
+            snapshot["GROUPS"].append(record)
+
+        elif recordType == "VARIABLE":
+            snapshot["VARIABLE_SUBSTITIONS"].append(record)
+
+        elif recordType == "EXTRA":
+            fileDict[record["KEY"]] = record["VALUE"]
+
+        else:
+            raise RuntimeError("Unknown record type '%s' in workflow file." % recordType)
+
+    dag.connectNodeList(connectionList)
+    for g in snapshot["GROUPS"]:
+        dag.nodeGroupDict[g["NAME"]] = set([dag.node(nUUID=uuid.UUID(ns)) for ns in g["NODES"]])
+    return fileDict
+
+
+###############################################################################
+## Writing
+###############################################################################
+def writeWorkflow(filename, dag, nodeMetaDict=None, connectionMetaDict=None, variableMetaList=None,
+                  additionalFileDictionary=None, fileFormat=None):
+    """
+    Write the given dependency graph, its meta information, and any
+    additional file entries to disk.  The format is chosen from the
+    filename unless one is given.
+    """
+    if fileFormat is None:
+        fileFormat = formatForFilename(filename)
+
+    if fileFormat == FORMAT_JSON:
+        snapshot = dag.snapshot(nodeMetaDict=nodeMetaDict, connectionMetaDict=connectionMetaDict,
+                                variableMetaList=variableMetaList)
+        fullSnap = {"DAG":snapshot}
+        if additionalFileDictionary:
+            fullSnap = dict({"DAG":snapshot}.items() + additionalFileDictionary.items())
+        fp = open(filename, 'wb')
+        try:
+            fp.write(json.dumps(fullSnap, sort_keys=True, indent=4))
+        finally:
+            fp.close()
+        return
+
+    if fileFormat == FORMAT_STREAM_GZIP:
+        fp = gzip.open(filename, 'wb')
+    else:
+        fp = open(filename, 'wb')
+    try:
+        _writeStream(fp, dag, nodeMetaDict, connectionMetaDict, variableMetaList, additionalFileDictionary)
+    finally:
+        fp.close()
+
+
+def _writeStream(fp, dag, nodeMetaDict, connectionMetaDict, variableMetaList, additionalFileDictionary):
+    """
+    Write each part of the DAG as a separate record, one per line.
+    """
+    def writeRecord(recordType, record):
+        record["RECORD"] = recordType
+        fp.write(json.dumps(record, sort_keys=True, separators=(',', ':')))
+        fp.write('\n')
+
+    fp.write(json.dumps({"FORMAT": STREAM_FORMAT_NAME, "VERSION": STREAM_FORMAT_VERSION}, sort_keys=True))
+    fp.write('\n')
+
+    for variable in (variableMetaList or list()):
+        writeRecord("VARIABLE", dict(variable))
+
+    for key, value in sorted((additionalFileDictionary or dict()).items()):
+        writeRecord("EXTRA", {"KEY": key, "VALUE": value})
+
+    for dagNode in dag.nodes():
+        record = dag.nodeSnapshot(dagNode)
+        if nodeMetaDict and record["UUID"] in nodeMetaDict:
+            record["META"] = nodeMetaDict[record["UUID"]]
+        writeRecord("NODE", record)
+
+    for connection in sorted(dag.network.edges()):
+        record = {"FROM": str(connection[0].uuid), "TO": str(connection[1].uuid)}
+        connectionIdString = "%s|%s" % (record["FROM"], record["TO"])
+        if connectionMetaDict and connectionIdString in connectionMetaDict:
+            record["META"] = connectionMetaDict[connectionIdString]
+        writeRecord("EDGE", record)
+
+    for key in dag.nodeGroupDict:
+        writeRecord("GROUP", {"NAME": key, "NODES": [str(x.uuid) for x in dag.nodeGroupDict[key]]})
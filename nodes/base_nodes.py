@@ -5,6 +5,7 @@
 #
 
 import depends_node
+import depends_stream
 from depends_node import DagNodeInput, DagNodeOutput
 
 
@@ -13,7 +14,8 @@ class DagNodeExecute(depends_node.DagNode):
     category = 'Base'
 
     def _defineAttributes(self):
-        return []
+        return [depends_node.DagNodeAttribute('stream', False, dataType='bool',
+                                              docString='Pass the items of the inputs on one at a time')]
 
     def _defineInputs(self):
         return [DagNodeInput('input1', 'any', None)]
@@ -21,7 +23,18 @@ class DagNodeExecute(depends_node.DagNode):
     def _defineOutputs(self):
         return [DagNodeOutput('output1', 'any', None)]
 
+    def isStreaming(self):
+        return bool(self.attributeValue('stream'))
+
+    def readsStreams(self):
+        # Only a streaming execute consumes its input streams before the run ends
+        return self.isStreaming()
+
     def executePython(self):
+        if self.isStreaming():
+            self.outVal = self.streamItems(self.getPortValues(0) or [])
+            return
+
         print 'execute node'
         outVal = []
         values = self.getPortValues(0)
@@ -32,6 +45,18 @@ class DagNodeExecute(depends_node.DagNode):
 
         self.outVal = outVal
 
+    def streamItems(self, values):
+        """
+        Yield the items of every stream or list fed into the node, and any 
+        other value as it is.
+        """
+        for value in values:
+            if depends_stream.isStream(value) or isinstance(value, (list, tuple)):
+                for item in value:
+                    yield item
+            else:
+                yield value
+
 
 
 class DagNodeAttrTest(depends_node.DagNode):
@@ -5,6 +5,7 @@
 #
 
 import depends_node
+import depends_stream
 from depends_node import DagNodeInput, DagNodeOutput
 
 
@@ -54,12 +55,20 @@ class DagNodeAdd(depends_node.DagNode):
     def _defineOutputs(self):
         return [DagNodeOutput('output1', 'number', None)]
 
+    def readsStreams(self):
+        return True
+
     def executePython(self,):
         outVal = 0
         for index, input in enumerate(self.inputs()):
             values = self.getPortValues(index)
             print 'value for port', input, index,
             for val in values:
+                # Streams are summed an item at a time as they arrive
+                if depends_stream.isStream(val):
+                    for item in val:
+                        outVal += item
+                    continue
                 print val
                 outVal += val
 
@@ -1,5 +1,6 @@
 
 import depends_node
+import depends_remote
 
 
 
@@ -13,19 +14,17 @@ class DagNodeMayaLocator(depends_node.DagNode):
               depends_node.DagNodeAttribute('name', "someLocator_1", docString="Name of locator")
         ]
 
-    def executePython(self, nodesBefore):
-        import rpyc
-
-        locName = self.attributeValue('name')
+    def isCacheable(self):
+        return False
 
+    def isBatchable(self):
+        return True
 
-        conn = rpyc.classic.connect("127.0.0.1", port=8003)
-        cmds = conn.modules.maya.cmds
-        utils = conn.modules.maya.utils
+    def executePython(self):
+        locName = self.attributeValue('name')
 
-        loc = cmds.spaceLocator(name=locName)
-        print loc
-        self.outVal = loc
+        depends_remote.runForNode(self, [depends_remote.remoteCall('maya.cmds', 'spaceLocator', name=locName)],
+                                  resultFunction=lambda results: results[0])
 
 
 class DagNodeMayaSphere(depends_node.DagNode):
@@ -39,23 +38,19 @@ class DagNodeMayaSphere(depends_node.DagNode):
               depends_node.DagNodeAttribute('name', "someSphere", docString="Name of locator")
         ]
 
-    def executePython(self, nodesBefore):
-        import rpyc
+    def isCacheable(self):
+        return False
+
+    def isBatchable(self):
+        return True
 
+    def executePython(self):
         radius = float(self.attributeValue('radius'))
         sphereName = self.attributeValue('name')
 
-        conn = rpyc.classic.connect("127.0.0.1", port=8003)
-        cmds = conn.modules.maya.cmds
-        utils = conn.modules.maya.utils
-
-        def doSphere(radius, sphereName):
-            return cmds.polySphere(radius=radius, name=sphereName, constructionHistory=False)
-
-        ret = utils.executeInMainThreadWithResult(doSphere, radius, sphereName)
-
-        print ret
-        self.outVal = ret
+        depends_remote.runForNode(self, [depends_remote.remoteCall('maya.cmds', 'polySphere', radius=radius, name=sphereName,
+                                                                   constructionHistory=False)],
+                                  resultFunction=lambda results: results[0])
 
 
 
@@ -70,28 +65,27 @@ class DagNodeTestNode(depends_node.DagNode):
         return [
         ]
 
-    def executePython(self, nodesBefore):
-        import rpyc
-
-        conn = rpyc.classic.connect("127.0.0.1", port=8003)
-        cmds = conn.modules.maya.cmds
-        core = conn.modules.fsmpipe.maya.renderLayers.core
-        utils = conn.modules.maya.utils
-
-        def doStuff():
-            core.setup()
-            core.createLayer("baseLayer")
-            core.createOverride("sgOverride", "baseLayer", "|hdri", override="None", overrideValue="_NoneSG", memberRules="")
-            core.createOverride("sgOverride", "baseLayer", "|dome", override="None", overrideValue="surfaceShader1SG", memberRules="")
-            core.createLayer("matte_A")
-            core.createOverride("sgOverride", "matte_A", "", override="None", overrideValue="GreenSG", memberRules="[+tag=tree_A][+tag=tree_B][+tag=leaves_A][+tag=leaves_B][+tag=leaves_C][+tag=trunks]")
-            core.createOverride("sgOverride", "matte_A", "", override="None", overrideValue="surfaceShader2SG", memberRules="[+tag=ELN]")
-            core.createOverride("sgOverride", "matte_A", "", override="None", overrideValue="BlackSG", memberRules="[+tag=ENV][-tag=road][-tag=tree_A][-tag=tree_B][-tag=leaves][-tag=leavesA][-tag=leavesB][-tag=leavesC][+tag=elantra]")
-            core.createOverride("sgOverride", "matte_A", "", override="None", overrideValue="BlueSG", memberRules="[+tag=road]")
-            core.createOverride("valueOverride", "matte_A", "", override="visibility", overrideValue=False, memberRules="[+tag=dome]")
-
-        ret = utils.executeInMainThreadWithResult(doStuff)
-
-        print ret
-        self.outVal = ret
-
+    def isCacheable(self):
+        return False
+
+    def isBatchable(self):
+        return True
+
+    def executePython(self):
+        core = 'fsmpipe.maya.renderLayers.core'
+        call = depends_remote.remoteCall
+
+        # Every call depends on the ones before it, so the batch stops at the first failure
+        calls = [
+            call(core, 'setup'),
+            call(core, 'createLayer', "baseLayer"),
+            call(core, 'createOverride', "sgOverride", "baseLayer", "|hdri", override="None", overrideValue="_NoneSG", memberRules=""),
+            call(core, 'createOverride', "sgOverride", "baseLayer", "|dome", override="None", overrideValue="surfaceShader1SG", memberRules=""),
+            call(core, 'createLayer', "matte_A"),
+            call(core, 'createOverride', "sgOverride", "matte_A", "", override="None", overrideValue="GreenSG", memberRules="[+tag=tree_A][+tag=tree_B][+tag=leaves_A][+tag=leaves_B][+tag=leaves_C][+tag=trunks]"),
+            call(core, 'createOverride', "sgOverride", "matte_A", "", override="None", overrideValue="surfaceShader2SG", memberRules="[+tag=ELN]"),
+            call(core, 'createOverride', "sgOverride", "matte_A", "", override="None", overrideValue="BlackSG", memberRules="[+tag=ENV][-tag=road][-tag=tree_A][-tag=tree_B][-tag=leaves][-tag=leavesA][-tag=leavesB][-tag=leavesC][+tag=elantra]"),
+            call(core, 'createOverride', "sgOverride", "matte_A", "", override="None", overrideValue="BlueSG", memberRules="[+tag=road]"),
+            call(core, 'createOverride', "valueOverride", "matte_A", "", override="visibility", overrideValue=False, memberRules="[+tag=dome]"),
+        ]
+        depends_remote.runForNode(self, calls)
@@ -2,6 +2,8 @@ __author__ = 'chris.gardner'
 
 import os, os.path
 import sys
+import collections
+import multiprocessing.pool
 
 sys.path.append('//fsm.int/fsm/library/assets/pipeline/python/')
 
@@ -12,15 +14,73 @@ from fsmpipe.common import fileUtils
 
 
 import depends_node
+import depends_directory_cache
 from depends_node import DagNodeInput, DagNodeOutput
 
 
+# Shots are checked on this many threads at once, since each check waits on network storage
+SHOT_WALK_THREADS = 16
+
+# Shared by every run in the session, so running a node again only checks what changed
+directoryCache = depends_directory_cache.DirectoryCache()
+
+
+def latestLitFile(shot):
+    """
+    Return the path of the latest lit maya scene of a shot, or None if it
+    doesn't have one.
+    """
+    shotPath = shot.getAttr('path')
+    mayaDir = fileUtils.unixSlashes(os.path.join(shotPath, 'setups', 'maya', 'scenes', 'lit'))
+    if not directoryCache.isdir(mayaDir):
+        return None
+
+    context = pathManager.getContextFromPath(shotPath)
+    foo = pathTokens.pathToken()
+    foo.values = context
+    baseName = foo.buildFromTokens('[seq][shot]_lit_v001xx_wip.ma')
+
+    pathToBaseFile = fileUtils.unixSlashes(os.path.join(mayaDir, baseName))
+    lastestFile = directoryCache.cachedResult(mayaDir, baseName, fileUtils.findLatestFile, pathToBaseFile)
+    if not lastestFile:
+        return None
+    return fileUtils.unixSlashes(os.path.join(mayaDir, lastestFile))
+
+
+def walkLatestLitFiles(sequences, threads=SHOT_WALK_THREADS):
+    """
+    Yield the latest lit maya scene of every shot in the given sequences, in
+    sequence and shot order.  Shots are fetched and checked on a pool of
+    threads, and each path is yielded as soon as it (and every path before
+    it) has been found.
+    """
+    pool = multiprocessing.pool.ThreadPool(threads)
+    try:
+        pending = collections.deque()
+        for shots in pool.imap(lambda seq: seq.getShots() or [], sequences):
+            for shot in shots:
+                pending.append(pool.apply_async(latestLitFile, (shot,)))
+
+            # Hand back what has been found so far before waiting on the next sequence
+            while pending and pending[0].ready():
+                path = pending.popleft().get()
+                if path:
+                    yield path
+        while pending:
+            path = pending.popleft().get()
+            if path:
+                yield path
+    finally:
+        pool.terminate()
+
 
 class DagNodeScopeGetLatestFile(depends_node.DagNode):
     category = 'Scope'
 
     def _defineAttributes(self):
-        return [depends_node.DagNodeAttribute('projectid', "0000", docString='Scope Project Id')]
+        return [depends_node.DagNodeAttribute('projectid', "0000", docString='Scope Project Id'),
+                depends_node.DagNodeAttribute('stream', False, dataType='bool',
+                                              docString='Pass each file on as soon as it is found')]
 
     def _defineInputs(self):
         return []
@@ -28,35 +88,26 @@ class DagNodeScopeGetLatestFile(depends_node.DagNode):
     def _defineOutputs(self):
         return [DagNodeOutput('output1', 'string', None)]
 
+    def isCacheable(self):
+        return False
+
+    def isStreaming(self):
+        return bool(self.attributeValue('stream'))
+
     def executePython(self):
         project_id = int(self.attributeValue('projectid'))
+        latestFiles = self.latestFiles(project_id)
+        self.outVal = latestFiles if self.isStreaming() else list(latestFiles)
 
-        ret = []
-
+    def latestFiles(self, project_id):
+        """
+        Yield the latest lit scene of every shot in the project as it is found.
+        """
         proj = scopeApi.getObjectsById(modelName='project', idList=[project_id])
         if proj:
             print proj
             sequences = proj.getSequences()
             if sequences:
-                for seq in sequences:
-                    print seq
-                    for shot in seq.getShots():
-                        print shot
-                        shotPath = shot.getAttr('path')
-                        mayaDir = fileUtils.unixSlashes(os.path.join(shotPath, 'setups', 'maya', 'scenes', 'lit'))
-                        if os.path.isdir(mayaDir):
-                            print mayaDir
-                            context = pathManager.getContextFromPath(shotPath)
-                            foo = pathTokens.pathToken()
-                            foo.values = context
-                            baseName = foo.buildFromTokens('[seq][shot]_lit_v001xx_wip.ma')
-
-
-                            pathToBaseFile = fileUtils.unixSlashes(os.path.join(mayaDir, baseName))
-                            lastestFile = fileUtils.findLatestFile(pathToBaseFile)
-                            if lastestFile:
-                                print baseName
-                                print lastestFile
-                                pathTolastestFile = fileUtils.unixSlashes(os.path.join(mayaDir, lastestFile))
-                                ret.append(pathTolastestFile)
-        self.outVal = ret
+                for pathTolastestFile in walkLatestLitFiles(sequences):
+                    print pathTolastestFile
+                    yield pathTolastestFile
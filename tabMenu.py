@@ -2,6 +2,8 @@ __author__ = 'chris.gardner'
 
 from PySide import QtCore, QtGui
 import os
+import bisect
+import heapq
 
 
 def nonconsec_find(needle, haystack, anchored=False):
@@ -39,48 +41,165 @@ def nonconsec_find(needle, haystack, anchored=False):
     if "[" not in needle:
         haystack = haystack.rpartition(" [")[0]
 
-    if len(haystack) == 0 and len(needle) > 0:
-        # "a" is not in ""
-        return False
+    return SearchText(haystack).match_positions(needle, anchored) is not None
 
-    elif len(needle) == 0 and len(haystack) > 0:
-        # "" is in "blah"
-        return True
 
-    elif len(needle) == 0 and len(haystack) == 0:
-        # ..?
-        return True
+class SearchText(object):
+    """A lowercased string to search, with a table of the positions each
+    character appears at, so matching a needle is a binary search per
+    character instead of a scan of the string.
+    """
 
+    __slots__ = ('text', 'positions', 'word_starts')
 
-    # Turn haystack into list of characters (as strings are immutable)
-    haystack = [hay for hay in str(haystack)]
+    # Characters after which a new word starts
+    word_separators = " /_["
 
-    if needle.startswith(" "):
-        # "[space]abc" does consecutive search for "abc" in "abcdef"
-        if anchored:
-            if "".join(haystack).startswith(needle.lstrip(" ")):
-                return True
-        else:
-            if needle.lstrip(" ") in "".join(haystack):
-                return True
+    def __init__(self, text):
+        self.text = text
+        self.positions = {}
+        self.word_starts = set()
+        for i, char in enumerate(text):
+            self.positions.setdefault(char, []).append(i)
+            if i == 0 or text[i - 1] in self.word_separators:
+                self.word_starts.add(i)
 
-    if anchored:
-        if needle[0] != haystack[0]:
-            return False
-        else:
-            # First letter matches, remove it for further matches
+    def match_positions(self, needle, anchored=False):
+        """Returns the positions in the text matched by each character of
+        needle, following the same rules as nonconsec_find, or None if
+        needle isn't found.
+        """
+        if len(needle) == 0:
+            return []
+
+        if len(self.text) == 0:
+            return None
+
+        if needle.startswith(" "):
+            # "[space]abc" does consecutive search for "abc" in "abcdef"
+            stripped = needle.lstrip(" ")
+            if anchored:
+                if self.text.startswith(stripped):
+                    return range(len(stripped))
+            else:
+                pos = self.text.find(stripped)
+                if pos != -1:
+                    return range(pos, pos + len(stripped))
+
+        matched = []
+        pos = -1
+        if anchored:
+            if needle[0] != self.text[0]:
+                return None
+            # First letter matches, continue after it
+            matched.append(0)
+            pos = 0
             needle = needle[1:]
-            del haystack[0]
 
-    for needle_atom in needle:
-        try:
-            needle_pos = haystack.index(needle_atom)
-        except ValueError:
-            return False
-        else:
+        for needle_atom in needle:
+            table = self.positions.get(needle_atom)
+            if table is None:
+                return None
             # Dont find string in same pos or backwards again
-            del haystack[:needle_pos + 1]
-    return True
+            i = bisect.bisect_right(table, pos)
+            if i == len(table):
+                return None
+            pos = table[i]
+            matched.append(pos)
+        return matched
+
+    def score(self, needle, anchored=False):
+        """Returns how well needle matches the text, between 0 and 1, or
+        None if it doesn't match at all.  Characters matching at the start
+        of a word or right after the previous match score higher, and so
+        do needles covering more of the text.
+        """
+        matched = self.match_positions(needle, anchored)
+        if matched is None:
+            return None
+        if len(matched) == 0:
+            return 1.0
+
+        raw = 0.0
+        previous = None
+        for pos in matched:
+            raw += 1.0
+            if pos in self.word_starts:
+                raw += 1.0
+            if previous is not None and pos == previous + 1:
+                raw += 1.0
+            previous = pos
+        return 0.8 * raw / (3.0 * len(matched)) + 0.2 * len(matched) / len(self.text)
+
+
+class SearchIndex(object):
+    """Display names and SearchTexts for a list of nodes, built once and
+    kept in alphabetical order.
+
+    Searches are always anchored, so only the nodes starting with the
+    filter's first letter are looked at.  Searches also remember their
+    results, and when the next filter text only adds characters to the end
+    of the previous one, only the previous results are searched again
+    (anything that doesn't match a shorter filter can't match a longer one).
+    """
+
+    def __init__(self, nodes):
+        self.entries = []
+        for n in nodes:
+            # Turn "3D/Shader/Phong" into "Phong [3D/Shader]"
+            menupath = n['menupath'].replace("&", "")
+            uiname = "%s [%s]" % (menupath.rpartition("/")[2], menupath.rpartition("/")[0])
+            lowered = uiname.lower()
+            self.entries.append({
+                'text': uiname,
+                'menupath': n['menupath'],
+                'menuobj': n['menuobj'],
+                'object': n['object'],
+                # The category is only searched when the filter asks for it
+                'name_search': SearchText(lowered.rpartition(" [")[0]),
+                'full_search': SearchText(lowered)})
+        self.entries.sort(key=lambda e: e['text'])
+
+        self._first_char_entries = {}
+        for entry in self.entries:
+            self._first_char_entries.setdefault(entry['full_search'].text[:1], []).append(entry)
+
+        self._last_filter = None
+        self._last_matches = None
+
+    def search(self, filtertext):
+        """Returns a list of (score, entry) tuples for every entry matching
+        filtertext (which should already be lowercase), alphabetically.
+        """
+        key = 'full_search' if "[" in filtertext else 'name_search'
+
+        if not filtertext:
+            # Everything matches an empty filter equally well
+            self._last_filter = filtertext
+            self._last_matches = self.entries
+            return [(1.0, entry) for entry in self.entries]
+
+        if (self._last_filter is not None and filtertext.startswith(self._last_filter)
+                and ("[" in self._last_filter) == ("[" in filtertext)):
+            candidates = self._last_matches
+        elif filtertext.startswith(" ") and filtertext.lstrip(" "):
+            # Either a consecutive match at the start, or the space itself has to match first
+            candidates = (self._first_char_entries.get(filtertext.lstrip(" ")[0], []) +
+                          self._first_char_entries.get(" ", []))
+        elif filtertext and not filtertext.startswith(" "):
+            candidates = self._first_char_entries.get(filtertext[0], [])
+        else:
+            candidates = self.entries
+
+        matches = []
+        for entry in candidates:
+            score = entry[key].score(filtertext, anchored=True)
+            if score is not None:
+                matches.append((score, entry))
+
+        self._last_filter = filtertext
+        self._last_matches = [entry for (score, entry) in matches]
+        return matches
 
 
 class NodeModel(QtCore.QAbstractListModel):
@@ -90,6 +209,7 @@ class NodeModel(QtCore.QAbstractListModel):
         self.num_items = num_items
 
         self._all = mlist
+        self._index = SearchIndex(mlist)
         self._filtertext = filtertext
 
         # _items is the list of objects to be shown, update sets this
@@ -106,24 +226,17 @@ class NodeModel(QtCore.QAbstractListModel):
         # Two spaces as a shortcut for [
         filtertext = filtertext.replace("  ", "[")
 
-        scored = []
-        for n in self._all:
-            # Turn "3D/Shader/Phong" into "Phong [3D/Shader]"
-            menupath = n['menupath'].replace("&", "")
-            uiname = "%s [%s]" % (menupath.rpartition("/")[2], menupath.rpartition("/")[0])
-
-            if nonconsec_find(filtertext, uiname.lower(), anchored=True):
-                scored.append({
-                    'text': uiname,
-                    'menupath': n['menupath'],
-                    'menuobj': n['menuobj'],
-                    'object': n['object'],
-                    'score': 1})
+        matches = self._index.search(filtertext)
 
-        # Store based on scores (descending), then alphabetically
-        s = sorted(scored, key=lambda k: (-k['score'], k['text']))
+        # Keep the best scores (descending), then alphabetically; only num_items are ever shown
+        best = heapq.nsmallest(self.num_items, matches, key=lambda m: -m[0])
 
-        self._items = s
+        self._items = [{
+            'text': entry['text'],
+            'menupath': entry['menupath'],
+            'menuobj': entry['menuobj'],
+            'object': entry['object'],
+            'score': score} for (score, entry) in best]
         self.modelReset.emit()
 
     def rowCount(self, parent=QtCore.QModelIndex()):
@@ -0,0 +1,225 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import shutil
+import tempfile
+import unittest
+
+import depends_dag
+import depends_node
+import depends_cache
+import depends_variables
+import depends_execution
+
+
+"""
+Tests for the node result cache: cache keys, hits and invalidation during
+execution, and the limits of both tiers.  Run with
+"python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+# How many times a LoadCounted object has been unpickled
+loadCount = [0]
+
+
+def _loadCounted(payload):
+    loadCount[0] += 1
+    return LoadCounted(payload)
+
+
+class LoadCounted(object):
+    """
+    A result that counts how often it is unpickled.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __reduce__(self):
+        return (_loadCounted, (self.payload,))
+
+
+class DagNodeTestCached(depends_node.DagNode):
+    """
+    Appends its attribute to the values fed into it, counting its executions.
+    """
+
+    executionCount = 0
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('suffix', "")]
+
+    def executePython(self):
+        DagNodeTestCached.executionCount += 1
+        self.outVal = "".join(v for value in self.getPortValues(0) for v in value) + self.attributeValue('suffix')
+
+
+###############################################################################
+###############################################################################
+class CacheKeyTest(unittest.TestCase):
+    """
+    Results of a two node chain cached while executing it.
+    """
+
+    def setUp(self):
+        DagNodeTestCached.executionCount = 0
+        self.dag = depends_dag.DAG()
+        self.first = DagNodeTestCached(name='first')
+        self.second = DagNodeTestCached(name='second')
+        self.first.setAttributeValue('suffix', 'a')
+        self.second.setAttributeValue('suffix', 'b')
+        self.dag.addNode(self.first)
+        self.dag.addNode(self.second)
+        self.dag.connectNodes(self.first, self.second)
+        self.cache = depends_cache.ResultCache()
+
+
+    def execute(self):
+        executor = depends_execution.DagExecutor(self.dag, maxWorkers=1, resultCache=self.cache, skipUpToDate=False)
+        try:
+            report = executor.execute(self.second)
+        finally:
+            executor.close()
+        self.assertTrue(report.succeeded(), report.summary())
+        return report
+
+
+    def testUnchangedNodesHitTheCache(self):
+        self.execute()
+        report = self.execute()
+        self.assertEqual(DagNodeTestCached.executionCount, 2)
+        self.assertEqual(set(report.cacheHits), set([self.first, self.second]))
+        self.assertEqual(self.second.outVal, 'ab')
+
+
+    def testUpstreamChangeInvalidatesDownstream(self):
+        self.execute()
+        self.first.setAttributeValue('suffix', 'c')
+        report = self.execute()
+        self.assertEqual(report.cacheHits, [])
+        self.assertEqual(self.second.outVal, 'cb')
+
+        # Going back to the old value finds the old results again
+        self.first.setAttributeValue('suffix', 'a')
+        report = self.execute()
+        self.assertEqual(set(report.cacheHits), set([self.first, self.second]))
+        self.assertEqual(self.second.outVal, 'ab')
+
+
+    def testRangeChangeInvalidates(self):
+        self.first.setAttributeRange('suffix', ('1', '10'))
+        self.execute()
+        self.first.setAttributeRange('suffix', ('1', '20'))
+        report = self.execute()
+        self.assertEqual(report.cacheHits, [])
+        self.assertEqual(DagNodeTestCached.executionCount, 4)
+
+
+    def testVariableChangeInvalidates(self):
+        depends_variables.add('CACHE_TEST_SUFFIX')
+        depends_variables.setx('CACHE_TEST_SUFFIX', 'x')
+        try:
+            self.second.setAttributeValue('suffix', '$CACHE_TEST_SUFFIX')
+            key = depends_cache.nodeCacheKey(self.second, {0: ['upstream']})
+            depends_variables.setx('CACHE_TEST_SUFFIX', 'y')
+            self.assertNotEqual(depends_cache.nodeCacheKey(self.second, {0: ['upstream']}), key)
+        finally:
+            depends_variables.remove('CACHE_TEST_SUFFIX')
+
+
+    def testUncacheableUpstreamMeansNoKey(self):
+        self.assertTrue(depends_cache.nodeCacheKey(self.second, {0: [None]}) is None)
+
+
+###############################################################################
+###############################################################################
+class ResultCacheTest(unittest.TestCase):
+    """
+    The memory tier on its own, and along with a disk tier.
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        loadCount[0] = 0
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+
+    def testLeastRecentlyUsedIsEvicted(self):
+        cache = depends_cache.ResultCache(maxEntries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(cache.get('a'), (True, 1))
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(len(cache), 2)
+
+
+    def testMemoryByteBudget(self):
+        cache = depends_cache.ResultCache(maxBytes=2500)
+        for key in "abc":
+            cache.put(key, "x" * 1000)
+        self.assertEqual(cache.get('a'), (False, None))
+        self.assertEqual(cache.get('c'), (True, "x" * 1000))
+
+        # A result larger than the budget isn't kept at all
+        cache.put('d', "x" * 5000)
+        self.assertEqual(cache.get('d'), (False, None))
+
+
+    def testExpiredResultsAreDiscarded(self):
+        cache = depends_cache.ResultCache(maxAge=-1, cacheDir=self.tempDir)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), (False, None))
+        cache.close()
+
+
+    def testDiskTierSurvivesSessions(self):
+        cache = depends_cache.ResultCache(cacheDir=self.tempDir)
+        cache.put('a', [1, 2, 3])
+        cache.close()
+        cache = depends_cache.ResultCache(cacheDir=self.tempDir)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get('a'), (True, [1, 2, 3]))
+        cache.close()
+
+
+    def testDiskEvictionOnlyReadsTheIndex(self):
+        cache = depends_cache.ResultCache(maxEntries=1, cacheDir=self.tempDir, maxDiskEntries=10)
+        for i in range(25):
+            cache.put('key%d' % i, LoadCounted(i))
+        self.assertEqual(loadCount[0], 0)
+        self.assertTrue(len(cache._index) <= 10)
+        self.assertEqual(cache.get('key0'), (False, None))
+        self.assertEqual(cache.get('key24')[1].payload, 24)
+        cache.close()
+
+
+    def testDiskByteBudget(self):
+        cache = depends_cache.ResultCache(cacheDir=self.tempDir, maxDiskBytes=5000)
+        for i in range(10):
+            cache.put('key%d' % i, "x" * 1000)
+        self.assertTrue(cache._diskBytes <= 5000)
+        self.assertEqual(cache._diskBytes, sum(size for (timestamp, size) in cache._index.values()))
+        cache.close()
+
+        # The byte count is picked up again from the index
+        cache = depends_cache.ResultCache(cacheDir=self.tempDir, maxDiskBytes=5000)
+        self.assertTrue(0 < cache._diskBytes <= 5000)
+        cache.clear()
+        self.assertEqual(cache._diskBytes, 0)
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
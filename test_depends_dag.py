@@ -0,0 +1,137 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import unittest
+
+import networkx
+
+import depends_dag
+import depends_node
+
+
+"""
+Tests for building a DAG: rejecting cycles and duplicate connections, with
+and without a tracked topological order, and keeping node names unique.
+Run with "python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+class DagNodeTestPlain(depends_node.DagNode):
+    """
+    A node with the default input and output.
+    """
+    pass
+
+
+###############################################################################
+###############################################################################
+class CycleRejectionTest(unittest.TestCase):
+    """
+    A chain of nodes a -> b -> c, plus an unconnected node d.
+    """
+
+    trackTopologicalOrder = False
+
+    def setUp(self):
+        self.dag = depends_dag.DAG(trackTopologicalOrder=self.trackTopologicalOrder)
+        (self.a, self.b, self.c, self.d) = [DagNodeTestPlain(name=name) for name in "abcd"]
+        for dagNode in (self.a, self.b, self.c, self.d):
+            self.dag.addNode(dagNode)
+        self.dag.connectNodes(self.a, self.b)
+        self.dag.connectNodes(self.b, self.c)
+
+
+    def assertOrderIsTopological(self):
+        if self.dag.topologicalOrderDict is None:
+            return
+        self.assertEqual(set(self.dag.topologicalOrderDict), set(self.dag.nodes()))
+        for (startNode, endNode) in self.dag.network.edges():
+            self.assertTrue(self.dag.topologicalOrderDict[startNode] < self.dag.topologicalOrderDict[endNode])
+
+
+    def testCycleIsRejected(self):
+        self.assertRaises(RuntimeError, self.dag.connectNodes, self.c, self.a)
+        self.assertRaises(RuntimeError, self.dag.connectNodes, self.a, self.a)
+        self.assertFalse(self.dag.network.has_edge(self.c, self.a))
+        self.assertFalse(self.dag.network.has_edge(self.a, self.a))
+        self.assertOrderIsTopological()
+
+
+    def testEdgesAgainstTheOrderAreAccepted(self):
+        self.dag.connectNodes(self.d, self.a)
+        self.assertRaises(RuntimeError, self.dag.connectNodes, self.c, self.d)
+        self.assertOrderIsTopological()
+        self.assertEqual(self.dag.buildExecutionList(self.c), [self.d, self.a, self.b])
+
+
+    def testConnectNodeListRollsBackCycle(self):
+        self.assertRaises(RuntimeError, self.dag.connectNodeList, [(self.c, self.d, 0, 0), (self.d, self.a, 0, 0),
+                                                                   (self.a, self.d, 0, 0)])
+        self.assertEqual(sorted((x.name, y.name) for (x, y) in self.dag.connections()), [('a', 'b'), ('b', 'c')])
+        self.assertOrderIsTopological()
+
+
+    def testConnectNodeListRejectsDuplicates(self):
+        self.assertRaises(RuntimeError, self.dag.connectNodeList, [(self.d, self.c, 0, 0), (self.a, self.b, 1, 1)])
+        self.assertRaises(RuntimeError, self.dag.connectNodeList, [(self.d, self.c, 0, 0), (self.d, self.c, 0, 0)])
+
+        # Nothing was connected, and the existing edge keeps its ports
+        self.assertFalse(self.dag.network.has_edge(self.d, self.c))
+        self.assertEqual(self.dag.connectionPorts(self.a, self.b), (0, 0))
+
+
+    def testConnectNodeList(self):
+        self.dag.connectNodeList([(self.d, self.a, 0, 0), (self.d, self.c, 0, 0)])
+        self.assertTrue(networkx.is_directed_acyclic_graph(self.dag.network))
+        self.assertEqual(len(self.dag.connections()), 4)
+        self.assertOrderIsTopological()
+
+
+class TrackedCycleRejectionTest(CycleRejectionTest):
+    """
+    The same, with the DAG keeping a topological order as edges are added.
+    """
+
+    trackTopologicalOrder = True
+
+
+###############################################################################
+###############################################################################
+class NodeNameTest(unittest.TestCase):
+    """
+    Looking nodes up by name as they are renamed.
+    """
+
+    def setUp(self):
+        self.dag = depends_dag.DAG()
+        self.a = DagNodeTestPlain(name='a')
+        self.b = DagNodeTestPlain(name='b')
+        self.dag.addNode(self.a)
+        self.dag.addNode(self.b)
+
+
+    def testRename(self):
+        self.a.setName('c')
+        self.assertTrue(self.dag.node(name='c') is self.a)
+        self.assertTrue(self.dag.node(name='a') is None)
+
+
+    def testRenameToNameInUseIsRejected(self):
+        self.assertRaises(RuntimeError, self.a.setName, 'b')
+        self.assertEqual(self.a.name, 'a')
+        self.assertTrue(self.dag.node(name='a') is self.a)
+        self.assertTrue(self.dag.node(name='b') is self.b)
+
+
+    def testAddingNameInUseIsRejected(self):
+        self.assertRaises(RuntimeError, self.dag.addNode, DagNodeTestPlain(name='a'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import threading
+import unittest
+
+import depends_dag
+import depends_node
+import depends_execution
+
+
+"""
+Tests for the order the DagExecutor runs nodes in, what it skips, and how it
+stops on failure.  Run with "python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Test nodes
+###############################################################################
+# The names of nodes in the order they executed
+executionLog = list()
+
+# Events set by nodes when they start executing, by node name
+startedEventDict = dict()
+
+
+class DagNodeTestLogged(depends_node.DagNode):
+    """
+    Logs its name when it executes, and passes on the names of everything
+    that fed into it along with its own.
+    """
+
+    def executePython(self):
+        executionLog.append(self.name)
+        names = [self.name]
+        for value in self.getPortValues(0):
+            names.extend(value)
+        self.outVal = names
+
+
+class DagNodeTestRendezvous(depends_node.DagNode):
+    """
+    Executes only while the node named in its partner attribute is executing
+    as well.
+    """
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('partner', "")]
+
+    def executePython(self):
+        startedEventDict[self.name].set()
+        if not startedEventDict[self.attributeValue('partner')].wait(5.0):
+            raise RuntimeError("%s never ran alongside %s" % (self.attributeValue('partner'), self.name))
+        self.outVal = self.name
+
+
+class DagNodeTestFailing(depends_node.DagNode):
+    """
+    Always fails.
+    """
+
+    def executePython(self):
+        raise RuntimeError("failed on purpose")
+
+
+###############################################################################
+###############################################################################
+class SchedulingTest(unittest.TestCase):
+    """
+    A DAG shaped like a diamond, executed by a DagExecutor.
+    """
+
+    def setUp(self):
+        del executionLog[:]
+        startedEventDict.clear()
+        self.dag = depends_dag.DAG()
+        self.executor = depends_execution.DagExecutor(self.dag, maxWorkers=2)
+        (self.top, self.left, self.right, self.bottom) = self.addNodes(DagNodeTestLogged, 'top', 'left', 'right', 'bottom')
+        self.dag.connectNodes(self.top, self.left)
+        self.dag.connectNodes(self.top, self.right)
+        self.dag.connectNodes(self.left, self.bottom)
+        self.dag.connectNodes(self.right, self.bottom)
+
+
+    def tearDown(self):
+        self.executor.close()
+
+
+    def addNodes(self, nodeType, *names):
+        dagNodes = [nodeType(name=name) for name in names]
+        for dagNode in dagNodes:
+            self.dag.addNode(dagNode)
+        return dagNodes
+
+
+    def testNodesRunAfterTheirInputs(self):
+        report = self.executor.execute(self.bottom)
+        self.assertTrue(report.succeeded(), report.summary())
+        self.assertEqual(executionLog[0], 'top')
+        self.assertEqual(sorted(executionLog[1:3]), ['left', 'right'])
+        self.assertEqual(executionLog[3], 'bottom')
+        self.assertEqual(sorted(self.bottom.outVal), ['bottom', 'left', 'right', 'top', 'top'])
+
+
+    def testIndependentBranchesRunTogether(self):
+        (first, second) = self.addNodes(DagNodeTestRendezvous, 'first', 'second')
+        first.setAttributeValue('partner', 'second')
+        second.setAttributeValue('partner', 'first')
+        startedEventDict.update({'first': threading.Event(), 'second': threading.Event()})
+        self.dag.connectNodes(first, self.bottom)
+        self.dag.connectNodes(second, self.bottom)
+        report = self.executor.execute(self.bottom)
+        self.assertTrue(report.succeeded(), report.summary())
+
+
+    def testFailureStopsDownstreamNodes(self):
+        (failing,) = self.addNodes(DagNodeTestFailing, 'failing')
+        self.dag.connectNodes(failing, self.bottom)
+        report = self.executor.execute(self.bottom)
+        self.assertFalse(report.succeeded())
+        self.assertTrue(report.failedNode is failing)
+        self.assertTrue('failed on purpose' in report.error)
+        self.assertFalse(self.bottom in report.nodeTimings)
+        self.assertFalse('bottom' in executionLog)
+
+
+    def testUpToDateNodesAreSkipped(self):
+        self.executor.execute(self.bottom)
+        self.dag.setNodeStale(self.right, True)
+        del executionLog[:]
+        report = self.executor.execute(self.bottom)
+        self.assertTrue(report.succeeded(), report.summary())
+        self.assertEqual(executionLog, ['right'])
+        self.assertEqual(set(report.upToDateNodes), set([self.top, self.left, self.bottom]))
+        self.assertEqual(report.executedNodes(), [self.right])
+        self.assertTrue("Executed 1 of 4 nodes" in report.summary())
+
+        # Nothing executes once everything is up to date
+        report = self.executor.execute(self.bottom)
+        self.assertEqual(report.executedNodes(), [])
+        self.assertTrue("Up to date: 4" in report.summary())
+        self.assertTrue("Executed 0 of 4 nodes" in report.summary())
+
+
+    def testWorkersAreKeptBetweenRuns(self):
+        self.executor.execute(self.bottom)
+        threadPool = self.executor._threadPool
+        self.dag.setNodeStale(self.top, True)
+        self.assertTrue(self.executor.execute(self.bottom).succeeded())
+        self.assertTrue(self.executor._threadPool is threadPool)
+
+        self.executor.close()
+        self.assertTrue(self.executor._threadPool is None)
+        self.dag.setNodeStale(self.top, True)
+        self.assertTrue(self.executor.execute(self.bottom).succeeded())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import socket
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+import depends_dag
+import depends_node
+import depends_engine
+import depends_journal
+import depends_workflow_file
+
+
+"""
+Tests for the change journal: recording, recovery, compaction, and which
+sessions' journals are offered for recovery.  Run with
+"python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+class DagNodeTestJournaled(depends_node.DagNode):
+    """
+    A node with an attribute to change.
+    """
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('attr1', "")]
+
+
+def workflowShape(dag):
+    """
+    Return the node names, their attribute values, and the connections of a
+    DAG by name, for comparing DAGs.
+    """
+    nodes = sorted((n.name, n.attributeValue('attr1')) for n in dag.nodes())
+    edges = sorted((a.name, b.name) for (a, b) in dag.connections())
+    return (nodes, edges)
+
+
+###############################################################################
+###############################################################################
+class ChangeJournalTest(unittest.TestCase):
+    """
+    A workflow saved to disk with changes journaled on top of it.
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.previousJournalDir = os.environ.get('DEPENDS_JOURNAL_DIR')
+        os.environ['DEPENDS_JOURNAL_DIR'] = os.path.join(self.tempDir, 'journals')
+
+        self.dag = depends_dag.DAG()
+        self.nodeA = DagNodeTestJournaled(name='a')
+        self.nodeB = DagNodeTestJournaled(name='b')
+        self.dag.addNode(self.nodeA)
+        self.dag.addNode(self.nodeB)
+        self.dag.connectNodes(self.nodeA, self.nodeB)
+
+        self.workflowFilename = os.path.join(self.tempDir, 'workflow.json')
+        depends_workflow_file.writeWorkflow(self.workflowFilename, self.dag, **self.metaDicts())
+        self.startJournal(depends_journal.sessionName())
+
+
+    def tearDown(self):
+        self.journal.close()
+        if self.previousJournalDir is None:
+            del os.environ['DEPENDS_JOURNAL_DIR']
+        else:
+            os.environ['DEPENDS_JOURNAL_DIR'] = self.previousJournalDir
+        shutil.rmtree(self.tempDir)
+
+
+    def metaDicts(self):
+        """
+        The (empty) UI information the main window saves along with a DAG.
+        """
+        return {"nodeMetaDict": dict(), "connectionMetaDict": dict(), "variableMetaList": list()}
+
+
+    def startJournal(self, sessionName):
+        """
+        Start journaling as the session with the given name.
+        """
+        directory = os.path.join(depends_journal.journalDirectory(self.workflowFilename), sessionName)
+        self.journal = depends_journal.ChangeJournal(directory)
+        self.journal.reset(self.workflowFilename)
+
+
+    def makeChanges(self):
+        """
+        Add a node, connect it, and change an existing node, journaling each.
+        """
+        nodeC = DagNodeTestJournaled(name='c')
+        self.dag.addNode(nodeC)
+        self.journal.recordNode(self.dag.nodeSnapshot(nodeC))
+        self.dag.connectNodes(self.nodeB, nodeC)
+        self.journal.recordConnection(str(self.nodeB.uuid), str(nodeC.uuid))
+        self.nodeA.setAttributeValue('attr1', 'changed')
+        self.journal.recordNode(self.dag.nodeSnapshot(self.nodeA))
+
+
+    def recovered(self, journal):
+        dag = depends_dag.DAG()
+        journal.recover(dag)
+        return dag
+
+
+    def testFreshJournalHasNothingToRecover(self):
+        self.assertFalse(self.journal.hasRecoveryData())
+
+
+    def testRecoverReplaysChanges(self):
+        self.makeChanges()
+        self.assertTrue(self.journal.hasRecoveryData())
+        self.assertEqual(workflowShape(self.recovered(self.journal)), workflowShape(self.dag))
+
+
+    def testRecoverRemovals(self):
+        self.makeChanges()
+        self.dag.removeNode(self.nodeB)
+        self.journal.recordNodeRemoved(str(self.nodeB.uuid))
+        self.assertEqual(workflowShape(self.recovered(self.journal)), workflowShape(self.dag))
+
+
+    def testCompactKeepsChanges(self):
+        self.makeChanges()
+        self.journal.compact(self.dag, **self.metaDicts())
+        self.assertEqual(self.journal.recordCount, 0)
+        self.assertEqual(self.journal.read(), (os.path.abspath(self.journal.checkpointFilename), []))
+        self.assertTrue(self.journal.hasRecoveryData())
+        self.assertEqual(workflowShape(self.recovered(self.journal)), workflowShape(self.dag))
+
+        # Records after a compaction go on top of the checkpoint
+        self.nodeB.setAttributeValue('attr1', 'after')
+        self.journal.recordNode(self.dag.nodeSnapshot(self.nodeB))
+        self.assertEqual(workflowShape(self.recovered(self.journal)), workflowShape(self.dag))
+
+
+    def testDiscardRemovesEverything(self):
+        self.makeChanges()
+        self.journal.compact(self.dag, **self.metaDicts())
+        self.journal.discard()
+        self.assertFalse(os.path.exists(depends_journal.journalDirectory(self.workflowFilename)))
+
+
+    def testRunningSessionsAreNotOffered(self):
+        self.journal.discard()
+        self.startJournal("%s.%d" % (socket.gethostname(), os.getppid()))
+        self.makeChanges()
+        self.assertEqual(depends_journal.recoverableJournals(self.workflowFilename), [])
+        self.assertTrue(depends_engine.recoverWorkflow(self.workflowFilename, depends_dag.DAG()) is None)
+
+
+    def testOtherHostsAreNotOffered(self):
+        self.journal.discard()
+        self.startJournal("some.other.host.%d" % os.getpid())
+        self.makeChanges()
+        self.assertEqual(depends_journal.recoverableJournals(self.workflowFilename), [])
+
+
+    def testFinishedSessionIsOfferedAndClaimed(self):
+        process = subprocess.Popen(['true'])
+        process.wait()
+        self.journal.discard()
+        self.startJournal("%s.%d" % (socket.gethostname(), process.pid))
+        self.makeChanges()
+        self.journal.compact(self.dag, **self.metaDicts())
+        self.journal.close()
+
+        offered = depends_journal.recoverableJournals(self.workflowFilename)
+        self.assertEqual([j.directory for j in offered], [self.journal.directory])
+
+        # Recovering moves the journal (and its checkpoint) to this session
+        dag = depends_dag.DAG()
+        depends_engine.recoverWorkflow(self.workflowFilename, dag)
+        self.assertEqual(workflowShape(dag), workflowShape(self.dag))
+        self.assertFalse(os.path.exists(self.journal.directory))
+        ownJournal = depends_journal.ChangeJournal(depends_journal.sessionDirectory(self.workflowFilename))
+        self.assertEqual(ownJournal.read()[0], os.path.abspath(ownJournal.checkpointFilename))
+        self.assertTrue(ownJournal.hasRecoveryData())
+
+
+    def testClaimFailsOnceTaken(self):
+        self.makeChanges()
+        claimer = depends_journal.ChangeJournal(self.journal.directory)
+        self.assertTrue(claimer.claim(os.path.join(self.tempDir, 'first')))
+        self.assertFalse(self.journal.claim(os.path.join(self.tempDir, 'second')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import depends_node
+
+
+"""
+Tests for node type discovery and lazy plugin loading.  Run with
+"python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+BASE_PLUGIN_SOURCE = """
+import depends_node
+
+class DagNodeTestLazyBase(depends_node.DagNode):
+    category = 'Test'
+    def executePython(self):
+        self.outVal = 'base'
+"""
+
+DERIVED_PLUGIN_SOURCE = """
+import depends_node
+
+class DagNodeTestLazyDerived(depends_node.DagNodeTestLazyBase):
+    def executePython(self):
+        self.outVal = 'derived'
+"""
+
+
+class DagNodeTestVariables(depends_node.DagNode):
+    """
+    A node with an attribute, so every kind of property can hold variables.
+    """
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('attr1', "")]
+
+
+###############################################################################
+###############################################################################
+class VariablesUsedTest(unittest.TestCase):
+    """
+    Finding the workflow variables a node's properties refer to.
+    """
+
+    def setUp(self):
+        self.dagNode = DagNodeTestVariables(name='node')
+
+
+    def testOutputValueAndRange(self):
+        self.dagNode.setOutputValue('output1', 'file', '$SHOTDIR/render.#.exr')
+        self.dagNode.setOutputRange('output1', ('$START', '$$END'))
+        self.assertEqual(sorted(self.dagNode.variablesUsed()[0]), ['SHOTDIR', 'START'])
+        self.assertEqual(self.dagNode.variablesUsed()[1], ['END'])
+
+
+    def testInputAndAttribute(self):
+        self.dagNode.setInputValue('input1', '$SOURCE')
+        self.dagNode.setAttributeValue('attr1', '$QUALITY')
+        self.dagNode.setAttributeRange('attr1', ('1', '$LAST'))
+        self.assertEqual(sorted(self.dagNode.variablesUsed()[0]), ['LAST', 'QUALITY', 'SOURCE'])
+
+
+    def testNonStringValuesAreIgnored(self):
+        self.dagNode.setAttributeValue('attr1', True)
+        self.assertEqual(self.dagNode.variablesUsed(), ([], []))
+
+
+###############################################################################
+###############################################################################
+class PluginLoadingTest(unittest.TestCase):
+    """
+    Plugin modules in separate directories, one inheriting from the other.
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.previousManifest = os.environ.get('DEPENDS_PLUGIN_MANIFEST')
+        os.environ['DEPENDS_PLUGIN_MANIFEST'] = os.path.join(self.tempDir, 'manifest.json')
+
+        # The derived class' directory comes first, so it is found first
+        self.pathList = list()
+        for (directory, moduleName, source) in [('derived', 'test_lazy_derived', DERIVED_PLUGIN_SOURCE),
+                                                ('base', 'test_lazy_base', BASE_PLUGIN_SOURCE)]:
+            path = os.path.join(self.tempDir, directory)
+            os.mkdir(path)
+            with open(os.path.join(path, moduleName + '.py'), 'w') as fp:
+                fp.write(source)
+            self.pathList.append(path)
+
+
+    def tearDown(self):
+        if self.previousManifest is None:
+            del os.environ['DEPENDS_PLUGIN_MANIFEST']
+        else:
+            os.environ['DEPENDS_PLUGIN_MANIFEST'] = self.previousManifest
+        shutil.rmtree(self.tempDir)
+
+
+    def testDerivedPluginLoadsBaseModuleFirst(self):
+        depends_node.loadChildNodesFromPaths(self.pathList)
+
+        # Nothing is imported yet, and no stand-in is exposed under a class name
+        self.assertFalse(hasattr(depends_node, 'DagNodeTestLazyBase'))
+        self.assertFalse(hasattr(depends_node, 'DagNodeTestLazyDerived'))
+
+        derivedNode = depends_node.nodeTypeNamed('DagNodeTestLazyDerived')(name='derived')
+        self.assertEqual(type(derivedNode).__name__, 'DagNodeTestLazyDerived')
+        baseType = depends_node.nodeTypeNamed('DagNodeTestLazyBase')
+        self.assertTrue(isinstance(baseType, type))
+        self.assertTrue(isinstance(derivedNode, baseType))
+        self.assertTrue(depends_node.DagNodeTestLazyBase is baseType)
+
+        derivedNode.executePython()
+        self.assertEqual(derivedNode.outVal, 'derived')
+
+
+if __name__ == "__main__":
+    unittest.main()
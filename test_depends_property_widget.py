@@ -0,0 +1,119 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import sys
+import unittest
+
+import depends_dag
+import depends_node
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+try:
+    from PySide import QtCore, QtGui
+    import depends_property_widget
+except ImportError:
+    depends_property_widget = None
+
+
+"""
+Tests for the property widget's pooled panels: a panel recycled for another
+node shows that node's values, and edits go to the node being shown.  Needs
+PySide, and with Qt 4 a display (xvfb-run will do); skipped otherwise.  Run
+with "python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+def qtApplication():
+    """
+    Return the QApplication, creating it if it's possible, or None.
+    """
+    if depends_property_widget is None:
+        return None
+    if QtCore.qVersion().startswith('4.') and not os.environ.get('DISPLAY'):
+        return None
+    return QtGui.QApplication.instance() or QtGui.QApplication(sys.argv)
+
+
+class DagNodeTestProperties(depends_node.DagNode):
+    """
+    A node with a string and a float attribute.
+    """
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('label', ""),
+                depends_node.DagNodeAttribute('scale', "1.0", dataType='float')]
+
+
+###############################################################################
+###############################################################################
+@unittest.skipIf(qtApplication() is None, "needs PySide, and with Qt 4 a display")
+class PooledPanelTest(unittest.TestCase):
+    """
+    Two nodes of the same type shown one after the other.
+    """
+
+    def setUp(self):
+        self.dag = depends_dag.DAG()
+        self.first = DagNodeTestProperties(name='first')
+        self.second = DagNodeTestProperties(name='second')
+        self.first.setAttributeValue('label', 'one')
+        self.first.setAttributeValue('scale', '2.0')
+        self.second.setAttributeValue('label', 'two')
+        self.second.setAttributeValue('scale', '3.5')
+        self.dag.addNode(self.first)
+        self.dag.addNode(self.second)
+
+        self.propWidget = depends_property_widget.PropWidget()
+        self.edits = list()
+        self.propWidget.attrChanged.connect(lambda *args: self.edits.append(args))
+
+
+    def show(self, dagNode):
+        # The edits print the values they are given
+        (stdout, sys.stdout) = (sys.stdout, open(os.devnull, 'w'))
+        try:
+            self.propWidget.rebuild(self.dag, [dagNode])
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        return self.propWidget.currentPanel
+
+
+    def testRecycledPanelShowsTheNewNode(self):
+        firstPanel = self.show(self.first)
+        secondPanel = self.show(self.second)
+        self.assertTrue(secondPanel is firstPanel)
+        self.assertEqual(secondPanel.nameWidget.lineEdit.text(), 'second')
+        (labelEdit, scaleEdit) = secondPanel.attributeEdits
+        self.assertEqual(labelEdit.lineEdit.text(), 'two')
+        self.assertEqual(scaleEdit.lineEdit.value(), 3.5)
+        self.assertTrue(labelEdit.dagNode is self.second)
+
+
+    def testRebindingDoesNotEdit(self):
+        self.show(self.first)
+        self.show(self.second)
+        self.show(self.first)
+        self.assertEqual(self.edits, [])
+        self.assertEqual(self.first.attributeValue('label', variableSubstitution=False), 'one')
+        self.assertEqual(self.second.attributeValue('label', variableSubstitution=False), 'two')
+
+
+    def testEditsGoToTheShownNode(self):
+        self.show(self.first)
+        panel = self.show(self.second)
+        labelEdit = panel.attributeEdits[0]
+        labelEdit.lineEdit.setText('changed')
+        labelEdit.lineEdit.editingFinished.emit()
+        self.assertEqual(len(self.edits), 1)
+        (dagNode, propName, newValue, propertyType) = self.edits[0]
+        self.assertTrue(dagNode is self.second)
+        self.assertEqual((propName, newValue), ('label', 'changed'))
+        self.assertEqual(self.first.attributeValue('label', variableSubstitution=False), 'one')
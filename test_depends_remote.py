@@ -0,0 +1,294 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import socket
+import unittest
+import threading
+
+import depends_dag
+import depends_node
+import depends_remote
+import depends_execution
+
+
+"""
+Tests for pooled remote connections and for buffering the remote calls of
+a graph run, using connections that execute the calls in this process.  Run
+with "python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+class LocalConnection(object):
+    """
+    Stands in for an rpyc classic connection, running everything locally.
+    Raises the given errors instead of running the next batches sent to it,
+    and the given install errors instead of installing the batch runner.
+    """
+
+    def __init__(self, failures=(), installFailures=()):
+        self.closed = False
+        self.namespace = dict()
+        self.failures = list(failures)
+        self.installFailures = list(installFailures)
+        self.pingFailures = list()
+        self.batchCount = 0
+
+    def execute(self, source):
+        if self.installFailures:
+            raise self.installFailures.pop(0)
+        exec source in self.namespace
+        runner = self.namespace['_dependsRunBatch']
+
+        def runBatch(*args):
+            if self.failures:
+                raise self.failures.pop(0)
+            self.batchCount += 1
+            return runner(*args)
+        self.namespace['_dependsRunBatch'] = runBatch
+
+    def ping(self, timeout=None):
+        if self.pingFailures:
+            raise self.pingFailures.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class LocalConnector(object):
+    """
+    A connectFunction handing out LocalConnections, the first few of which
+    fail with the given errors when running a batch, or with the given
+    install errors when the batch runner is installed.
+    """
+
+    def __init__(self, *failureLists, **kwargs):
+        self.failureLists = list(failureLists)
+        self.installFailureLists = list(kwargs.get('installFailureLists', ()))
+        self.connections = list()
+
+    def __call__(self, host, port):
+        conn = LocalConnection(self.failureLists.pop(0) if self.failureLists else (),
+                               self.installFailureLists.pop(0) if self.installFailureLists else ())
+        self.connections.append(conn)
+        return conn
+
+
+class DagNodeTestRemoteAdd(depends_node.DagNode):
+    """
+    Adds its number to itself on the remote host of the pool named by the
+    test, the way DCC nodes queue their calls.
+    """
+
+    pool = None
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('number', 1)]
+
+    def isBatchable(self):
+        return True
+
+    def executePython(self):
+        number = self.attributeValue('number')
+        depends_remote.runForNode(self, [depends_remote.remoteCall('operator', 'add', number, number)],
+                                  pool=self.pool, resultFunction=lambda results: results[0])
+
+
+class DagNodeTestBatchableName(depends_node.DagNode):
+    """
+    Passes on its name without making remote calls, so it can run while the
+    calls of the nodes before it are still queued.
+    """
+
+    def isBatchable(self):
+        return True
+
+    def executePython(self):
+        self.outVal = self.name
+
+
+class DagNodeTestFailing(depends_node.DagNode):
+    """
+    Always fails.
+    """
+
+    def executePython(self):
+        raise RuntimeError("failed on purpose")
+
+
+###############################################################################
+###############################################################################
+class ConnectionPoolTest(unittest.TestCase):
+    """
+    A pool of local connections.
+    """
+
+    calls = [depends_remote.remoteCall('operator', 'add', 1, 2), depends_remote.remoteCall('operator', 'neg', 3)]
+
+    def pool(self, connector):
+        return depends_remote.RemoteConnectionPool('localhost', 0, connectFunction=connector)
+
+
+    def testBatch(self):
+        pool = self.pool(LocalConnector())
+        self.assertEqual(pool.runBatch(self.calls), [3, -3])
+        self.assertEqual(pool.runBatch(self.calls), [3, -3])
+        self.assertEqual(pool.connectCount, 1)
+
+
+    def testConnectionDroppedBeforeSendingIsReplaced(self):
+        for error in (EOFError(), socket.error()):
+            connector = LocalConnector(installFailureLists=[[error]])
+            pool = self.pool(connector)
+            self.assertEqual(pool.runBatch(self.calls), [3, -3])
+            self.assertEqual(pool.connectCount, 2)
+            self.assertEqual([c.batchCount for c in connector.connections], [0, 1])
+
+            # The broken connection is closed, and the new one kept
+            self.assertTrue(connector.connections[0].closed)
+            self.assertEqual([p.conn for p in pool._idle], [connector.connections[1]])
+
+
+    def testStaleIdleConnectionIsReplaced(self):
+        connector = LocalConnector()
+        pool = depends_remote.RemoteConnectionPool('localhost', 0, healthCheckAfter=0.0, connectFunction=connector)
+        pool.runBatch(self.calls)
+        connector.connections[0].pingFailures.append(EOFError())
+        self.assertEqual(pool.runBatch(self.calls), [3, -3])
+        self.assertEqual([c.batchCount for c in connector.connections], [1, 1])
+
+
+    def testConnectionDroppedWhileSendingIsNotResent(self):
+        for error in (EOFError(), socket.error()):
+            connector = LocalConnector([error])
+            pool = self.pool(connector)
+            self.assertRaises(type(error), pool.runBatch, self.calls)
+            self.assertEqual(pool.connectCount, 1)
+            self.assertTrue(connector.connections[0].closed)
+            self.assertEqual(pool._idle, [])
+
+            # The pool recovers once the host is reachable again
+            self.assertEqual(pool.runBatch(self.calls), [3, -3])
+            self.assertEqual(pool.connectCount, 2)
+
+
+    def testSecondFailureBeforeSendingIsRaised(self):
+        connector = LocalConnector(installFailureLists=[[EOFError()], [EOFError()]])
+        pool = self.pool(connector)
+        self.assertRaises(EOFError, pool.runBatch, self.calls)
+        self.assertEqual(pool.connectCount, 2)
+        self.assertEqual(pool._idle, [])
+        self.assertEqual(pool.runBatch(self.calls), [3, -3])
+
+
+    def testRemoteErrorsAreNotRetried(self):
+        pool = self.pool(LocalConnector())
+        self.assertRaises(depends_remote.RemoteCallError, pool.runBatch,
+                          [depends_remote.remoteCall('operator', 'div', 1, 0)])
+        self.assertEqual(pool.connectCount, 1)
+
+
+###############################################################################
+###############################################################################
+class CommandBufferTest(unittest.TestCase):
+    """
+    Remote calls made while a DagExecutor runs a graph.
+    """
+
+    def setUp(self):
+        self.connector = LocalConnector()
+        DagNodeTestRemoteAdd.pool = depends_remote.RemoteConnectionPool('localhost', 0, connectFunction=self.connector)
+        self.dag = depends_dag.DAG()
+        self.first = DagNodeTestRemoteAdd(name='first')
+        self.second = DagNodeTestRemoteAdd(name='second')
+        self.second.setAttributeValue('number', 5)
+        self.dag.addNode(self.first)
+        self.dag.addNode(self.second)
+        self.dag.connectNodes(self.first, self.second)
+
+
+    def runGraph(self, targetNode=None):
+        executor = depends_execution.DagExecutor(self.dag, maxWorkers=2)
+        try:
+            return executor.execute(targetNode or self.second)
+        finally:
+            executor.close()
+
+
+    def testCallsOutsideARunAreImmediate(self):
+        self.first.executePython()
+        self.assertEqual(self.first.outVal, 2)
+
+
+    def testRunSendsQueuedCallsTogether(self):
+        report = self.runGraph()
+        self.assertTrue(report.succeeded(), report.summary())
+        self.assertEqual((self.first.outVal, self.second.outVal), (2, 10))
+        self.assertEqual(self.connector.connections[0].batchCount, 1)
+
+        # Nothing is left installed in this thread
+        self.assertTrue(depends_remote.commandBuffer() is None)
+
+
+    def testFailedFlushLeavesNodesStale(self):
+        # The last node finishes while the calls before it are still queued
+        last = DagNodeTestBatchableName(name='last')
+        self.dag.addNode(last)
+        self.dag.connectNodes(self.second, last)
+        self.connector.failureLists.append([EOFError()])
+        report = self.runGraph(last)
+        self.assertTrue(report.failedNode is self.first)
+        self.assertTrue(self.dag.nodeStaleState(self.first))
+        self.assertTrue(self.dag.nodeStaleState(self.second))
+        self.assertTrue(self.dag.nodeStaleState(last))
+
+        # The next run sends the calls again instead of skipping the nodes
+        report = self.runGraph(last)
+        self.assertTrue(report.succeeded(), report.summary())
+        self.assertEqual(report.upToDateNodes, [])
+        self.assertEqual((self.first.outVal, self.second.outVal), (2, 10))
+        self.assertEqual(self.connector.connections[1].batchCount, 1)
+        self.assertFalse(self.dag.nodeStaleState(last))
+
+
+    def testCallsQueuedBeforeAFailureAreDiscarded(self):
+        failing = DagNodeTestFailing(name='failing')
+        self.dag.addNode(failing)
+        self.dag.connectNodes(failing, self.second)
+        report = self.runGraph()
+        self.assertTrue(report.failedNode is failing)
+        self.assertEqual(self.connector.connections, [])
+        self.assertTrue(self.dag.nodeStaleState(self.first))
+        self.assertTrue(self.dag.nodeStaleState(self.second))
+
+        self.dag.removeNode(failing)
+        report = self.runGraph()
+        self.assertTrue(report.succeeded(), report.summary())
+        self.assertEqual((self.first.outVal, self.second.outVal), (2, 10))
+
+
+    def testBufferIsPerThread(self):
+        commandBuffer = depends_remote.CommandBuffer()
+        seenInOtherThread = list()
+        self.assertTrue(depends_remote.setCommandBuffer(commandBuffer) is None)
+        try:
+            otherThread = threading.Thread(target=lambda: seenInOtherThread.append(depends_remote.commandBuffer()))
+            otherThread.start()
+            otherThread.join()
+            self.assertEqual(seenInOtherThread, [None])
+
+            self.first.executePython()
+            self.assertTrue(commandBuffer.isPending(self.first))
+        finally:
+            self.assertTrue(depends_remote.setCommandBuffer(None) is commandBuffer)
+        self.assertEqual(commandBuffer.flush(), [(self.first, None)])
+        self.assertEqual(self.first.outVal, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import time
+import unittest
+import threading
+
+import depends_dag
+import depends_node
+import depends_stream
+import depends_execution
+
+
+"""
+Tests for streams (fan-out, backpressure, and spilling what slow readers
+haven't read yet), and for how the execution engine hands them to the nodes
+a streaming node feeds.  Run with "python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Test nodes
+###############################################################################
+class DagNodeTestCount(depends_node.DagNode):
+    """
+    Produces the numbers below its count attribute, as a stream if asked to.
+    """
+
+    def _defineInputs(self):
+        return list()
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('count', 10),
+                depends_node.DagNodeAttribute('stream', True, dataType='bool')]
+
+    def isStreaming(self):
+        return bool(self.attributeValue('stream'))
+
+    def executePython(self):
+        numbers = (i for i in xrange(self.attributeValue('count')))
+        self.outVal = numbers if self.isStreaming() else list(numbers)
+
+
+class DagNodeTestHold(depends_node.DagNode):
+    """
+    Keeps the values fed into it as its result, like a node that knows
+    nothing about streams.
+    """
+
+    def executePython(self):
+        self.outVal = self.getPortValues(0)
+
+
+class DagNodeTestSum(depends_node.DagNode):
+    """
+    Sums the items of the streams fed into it as they arrive.
+    """
+
+    def readsStreams(self):
+        return True
+
+    def executePython(self):
+        self.outVal = sum(sum(value) for value in self.getPortValues(0))
+
+
+def countingIterator(count, produced):
+    """
+    Yield the numbers below count, appending each to the produced list.
+    """
+    for i in xrange(count):
+        produced.append(i)
+        yield i
+
+
+def failingIterator():
+    yield 1
+    raise ValueError("failed on purpose")
+
+
+###############################################################################
+###############################################################################
+class StreamTest(unittest.TestCase):
+    """
+    Streams read directly.
+    """
+
+    def readInThreads(self, stream, readerCount):
+        """
+        Read a stream with the given number of threads at once, returning
+        each reader's list of items.
+        """
+        results = [None] * readerCount
+        def read(index):
+            results[index] = list(stream)
+        threads = [threading.Thread(target=read, args=(i,)) for i in range(readerCount)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10.0)
+        return results
+
+
+    def testFanOut(self):
+        stream = depends_stream.Stream(xrange(1000), readerCount=3, bufferSize=16)
+        self.assertEqual(self.readInThreads(stream, 3), [range(1000)] * 3)
+        self.assertRaises(RuntimeError, iter, stream)
+
+
+    def testProducerWaitsForReader(self):
+        produced = list()
+        stream = depends_stream.Stream(countingIterator(10000, produced), bufferSize=10)
+        reader = iter(stream)
+        self.assertEqual(reader.next(), 0)
+        time.sleep(0.1)
+
+        # At most a full buffer, a delivered chunk, and the chunk being gathered
+        self.assertTrue(len(produced) <= 31, len(produced))
+        self.assertEqual(list(reader), range(1, 10000))
+
+
+    def testSlowReaderSpillsInsteadOfHoldingUpOthers(self):
+        stream = depends_stream.Stream(xrange(1000), readerCount=2, bufferSize=10)
+        slowReader = iter(stream)
+        self.assertEqual(list(stream), range(1000))
+
+        # The reader that hasn't read anything yet only holds a buffer's worth in memory
+        slowBuffer = stream._buffers[0]
+        self.assertTrue(len(slowBuffer._items) <= 10)
+        self.assertEqual(len(slowBuffer), 1000)
+        self.assertEqual(list(slowReader), range(1000))
+        self.assertTrue(slowBuffer._spillFile is None)
+
+
+    def testItemsThatCantBePickledStayInMemory(self):
+        items = [i for i in range(20)] + [lambda: None] + [i for i in range(21, 40)]
+        stream = depends_stream.Stream(items, readerCount=2, bufferSize=5)
+        slowReader = iter(stream)
+        self.assertEqual(list(stream), items)
+        self.assertEqual(list(slowReader), items)
+
+
+    def testDroppedReaderIsNotWaitedOn(self):
+        stream = depends_stream.Stream(xrange(1000), readerCount=2, bufferSize=10)
+        stream.dropReader()
+        self.assertEqual(list(stream), range(1000))
+        self.assertEqual(len(stream._buffers[0]), 0)
+
+
+    def testProducerErrorReachesReaders(self):
+        stream = depends_stream.Stream(failingIterator())
+        self.assertRaises(depends_stream.StreamError, list, stream)
+
+
+###############################################################################
+###############################################################################
+class StreamExecutionTest(unittest.TestCase):
+    """
+    Streams passed between nodes by the DagExecutor.
+    """
+
+    def setUp(self):
+        self.dag = depends_dag.DAG()
+        self.producer = DagNodeTestCount(name='producer')
+        self.dag.addNode(self.producer)
+
+
+    def execute(self, targetNode):
+        report = depends_execution.DagExecutor(self.dag, maxWorkers=4).execute(targetNode)
+        self.assertTrue(report.succeeded(), report.summary())
+        return report
+
+
+    def testConsumerWithoutStreamSupportGetsList(self):
+        holder = DagNodeTestHold(name='holder')
+        self.dag.addNode(holder)
+        self.dag.connectNodes(self.producer, holder)
+        self.execute(holder)
+
+        # The values outlive the run, which closes every stream it handed out
+        self.assertEqual(holder.outVal, [range(10)])
+
+
+    def testStreamReadersAndListConsumersShareProducer(self):
+        holder = DagNodeTestHold(name='holder')
+        summer = DagNodeTestSum(name='summer')
+        collector = DagNodeTestHold(name='collector')
+        for dagNode in (holder, summer, collector):
+            self.dag.addNode(dagNode)
+        self.dag.connectNodes(self.producer, holder)
+        self.dag.connectNodes(self.producer, summer)
+        self.dag.connectNodes(holder, collector)
+        self.dag.connectNodes(summer, collector)
+        self.execute(collector)
+
+        self.assertTrue(depends_stream.isStream(self.producer.outVal))
+        self.assertEqual(holder.outVal, [range(10)])
+        self.assertEqual(summer.outVal, sum(range(10)))
+
+
+    def testUnreadStreamBecomesList(self):
+        self.execute(self.producer)
+        self.assertEqual(self.producer.outVal, range(10))
+
+
+    def testNonStreamingProducerIsUnchanged(self):
+        self.producer.setAttributeValue('stream', False)
+        holder = DagNodeTestHold(name='holder')
+        self.dag.addNode(holder)
+        self.dag.connectNodes(self.producer, holder)
+        self.execute(holder)
+        self.assertEqual(holder.outVal, [range(10)])
+
+
+if __name__ == "__main__":
+    unittest.main()
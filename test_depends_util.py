@@ -0,0 +1,109 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import unittest
+
+import depends_util
+
+
+"""
+Tests for expanding framespecs into filenames.  Run with
+"python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+###############################################################################
+class FramespecTest(unittest.TestCase):
+    """
+    Framespecs with and without frame ranges.
+    """
+
+    def testNukeStyleSubstitutions(self):
+        for (filename, frameNumber, result) in [('foo.#.txt', 1, 'foo.1.txt'),
+                                                ('foo.##.txt', 1, 'foo.01.txt'),
+                                                ('foo.#.txt', 100, 'foo.100.txt'),
+                                                ('foo\\#.#.txt', 5, 'foo#.5.txt'),
+                                                ('foo.###.txt', -5, 'foo.-05.txt'),
+                                                ('a.#/b.####.txt', 12, 'a.12/b.0012.txt'),
+                                                ('100%.#.txt', 3, '100%.3.txt'),
+                                                ('plain.txt', 7, 'plain.txt')]:
+            self.assertEqual(depends_util.framespec.replaceFrameSymbols(filename, frameNumber), result)
+            self.assertEqual(depends_util.framespec(filename, None).frameFilename(frameNumber), result)
+
+
+    def testHasFrameSymbols(self):
+        self.assertTrue(depends_util.framespec.hasFrameSymbols('foo.#.txt'))
+        self.assertFalse(depends_util.framespec.hasFrameSymbols('foo\\#.txt'))
+        self.assertFalse(depends_util.framespec.hasFrameSymbols('foo.txt'))
+
+
+    def testFrames(self):
+        spec = depends_util.framespec('foo.##.txt', ('8', '11'))
+        self.assertEqual(spec.frames(), ['foo.08.txt', 'foo.09.txt', 'foo.10.txt', 'foo.11.txt'])
+        self.assertEqual(list(spec.iterframes()), spec.frames())
+        self.assertEqual(list(spec), spec.frames())
+        self.assertEqual(len(spec), 4)
+
+
+    def testFrameZeroIsAFrame(self):
+        spec = depends_util.framespec('foo.#.txt', (0, 2))
+        self.assertTrue(spec.hasFramerange())
+        self.assertEqual(spec.frames(), ['foo.0.txt', 'foo.1.txt', 'foo.2.txt'])
+
+
+    def testWithoutFramerange(self):
+        for frameRange in (None, ('', ''), (1, None)):
+            spec = depends_util.framespec('foo.#.txt', frameRange)
+            self.assertFalse(spec.hasFramerange())
+            self.assertEqual(spec.frames(), ['foo.#.txt'])
+            self.assertEqual(list(spec), ['foo.#.txt'])
+            self.assertEqual(len(spec), 1)
+            self.assertEqual(spec[0], 'foo.#.txt')
+            self.assertTrue('foo.#.txt' in spec)
+            self.assertFalse(1 in spec)
+
+
+    def testIndexingAndSlicing(self):
+        spec = depends_util.framespec('foo.####.exr', (1001, 1100))
+        self.assertEqual(spec[0], 'foo.1001.exr')
+        self.assertEqual(spec[-1], 'foo.1100.exr')
+        self.assertRaises(IndexError, spec.__getitem__, 100)
+        self.assertRaises(IndexError, spec.__getitem__, -101)
+
+        subSpec = spec[10:20]
+        self.assertEqual((subSpec.startFrame, subSpec.endFrame), (1011, 1020))
+        self.assertEqual(subSpec.frames(), spec.frames()[10:20])
+        self.assertEqual(len(spec[50:10]), 0)
+        self.assertEqual(spec[90:].frames(), spec.frames()[90:])
+        self.assertRaises(ValueError, spec.__getitem__, slice(0, 10, 2))
+
+
+    def testContains(self):
+        spec = depends_util.framespec('shot/foo.####.exr', (1001, 1100))
+        self.assertTrue(1001 in spec)
+        self.assertFalse(1101 in spec)
+        self.assertTrue('shot/foo.1050.exr' in spec)
+        self.assertFalse('shot/foo.1101.exr' in spec)
+        self.assertFalse('shot/foo.050.exr' in spec)
+        self.assertFalse('shot/bar.1050.exr' in spec)
+
+        # Every field of a multi-field filename has to hold the same frame
+        spec = depends_util.framespec('v#/foo.##.exr', (1, 20))
+        self.assertTrue('v7/foo.07.exr' in spec)
+        self.assertFalse('v7/foo.08.exr' in spec)
+
+
+    def testLargeRangeIsLazy(self):
+        spec = depends_util.framespec('foo.#.txt', (1, 10 ** 12))
+        self.assertEqual(len(spec), 10 ** 12)
+        self.assertEqual(spec[-1], 'foo.%d.txt' % 10 ** 12)
+        self.assertTrue('foo.123456789.txt' in spec)
+        self.assertEqual(next(iter(spec)), 'foo.1.txt')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+#
+# Depends
+# Copyright (C) 2014 by Andrew Gardner & Jonas Unger.  All rights reserved.
+# BSD license (LICENSE.txt for details).
+#
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import depends_dag
+import depends_node
+import depends_workflow_file
+
+
+"""
+Tests for writing workflows to disk and reading them back in each of the
+workflow file formats.  Run with "python -m unittest discover -p 'test_*.py'".
+"""
+
+
+###############################################################################
+## Utility
+###############################################################################
+class DagNodeTestSaved(depends_node.DagNode):
+    """
+    A node with an attribute and a second input and output, so every kind of
+    property and port is saved.
+    """
+
+    def _defineInputs(self):
+        return [depends_node.DagNodeInput('input1', 'file', True),
+                depends_node.DagNodeInput('input2', 'file', False)]
+
+    def _defineOutputs(self):
+        return [depends_node.DagNodeOutput('output1', 'file'),
+                depends_node.DagNodeOutput('output2', 'file')]
+
+    def _defineAttributes(self):
+        return [depends_node.DagNodeAttribute('attr1', "")]
+
+
+def dagContents(dag):
+    """
+    Return everything a workflow file holds about a DAG, in a form that can
+    be compared.
+    """
+    nodes = sorted((dag.nodeSnapshot(n) for n in dag.nodes()), key=lambda s: s["UUID"])
+    for snapshot in nodes:
+        del snapshot["STALE"]
+        # JSON hands ranges back as lists
+        for prop in snapshot["INPUTS"] + snapshot["OUTPUTS"] + snapshot["ATTRIBUTES"]:
+            if prop["RANGE"] is not None:
+                prop["RANGE"] = tuple(prop["RANGE"])
+    edges = sorted((str(a.uuid), str(b.uuid)) + dag.connectionPorts(a, b) for (a, b) in dag.connections())
+    groups = sorted((name, sorted(str(n.uuid) for n in nodes)) for name, nodes in dag.nodeGroupDict.items())
+    return (nodes, edges, groups)
+
+
+###############################################################################
+###############################################################################
+class RoundTripTest(unittest.TestCase):
+    """
+    A small workflow with node, connection and variable meta information.
+    """
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.dag = depends_dag.DAG()
+        (self.a, self.b, self.c) = [DagNodeTestSaved(name=name) for name in "abc"]
+        for dagNode in (self.a, self.b, self.c):
+            self.dag.addNode(dagNode)
+        self.a.setAttributeValue('attr1', 'value with "quotes" and \xc3\xa9'.decode('utf-8'))
+        self.a.setAttributeRange('attr1', ('1', '$END'))
+        self.a.setOutputValue('output1', 'file', '/tmp/render.####.exr')
+        self.a.setOutputRange('output1', ('1001', '1100'))
+        self.b.setInputValue('input1', '$SOURCE')
+        self.dag.connectNodes(self.a, self.b)
+        self.dag.connectNodes(self.a, self.c, sourcePort=1, destPort=1)
+        self.dag.connectNodes(self.b, self.c)
+        self.dag.addNodeGroup('group1', [self.a, self.b])
+
+        self.metaDicts = {"nodeMetaDict": dict((str(n.uuid), {"locationX": i * 10.0, "locationY": -i})
+                                               for i, n in enumerate((self.a, self.b, self.c))),
+                          "connectionMetaDict": {"%s|%s" % (self.a.uuid, self.c.uuid): {"sourcePort": 1, "destPort": 1}},
+                          "variableMetaList": [{"NAME": "SOURCE", "VALUE": "/tmp/source"}]}
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+
+    def roundTrip(self, filename, fileFormat=None):
+        """
+        Write the workflow to the given file and read it back into a new DAG,
+        returning the DAG and the file dictionary.
+        """
+        path = os.path.join(self.tempDir, filename)
+        depends_workflow_file.writeWorkflow(path, self.dag, additionalFileDictionary={"EXTRA_KEY": [1, 2]},
+                                            fileFormat=fileFormat, **self.metaDicts)
+        dag = depends_dag.DAG()
+        fileDict = depends_workflow_file.readWorkflow(path, dag)
+        return (dag, fileDict)
+
+
+    def assertRoundTrips(self, filename):
+        (dag, fileDict) = self.roundTrip(filename)
+        self.assertEqual(dagContents(dag), dagContents(self.dag))
+        self.assertEqual(fileDict["EXTRA_KEY"], [1, 2])
+        self.assertEqual(fileDict["DAG"]["NODE_META"], self.metaDicts["nodeMetaDict"])
+        self.assertEqual(fileDict["DAG"]["CONNECTION_META"], self.metaDicts["connectionMetaDict"])
+        self.assertEqual(fileDict["DAG"]["VARIABLE_SUBSTITIONS"], self.metaDicts["variableMetaList"])
+        return dag
+
+
+    def testJson(self):
+        self.assertRoundTrips('workflow.json')
+        with open(os.path.join(self.tempDir, 'workflow.json')) as fp:
+            self.assertTrue("DAG" in json.load(fp))
+
+
+    def testStream(self):
+        self.assertRoundTrips('workflow.jsonl')
+        with open(os.path.join(self.tempDir, 'workflow.jsonl')) as fp:
+            self.assertEqual(json.loads(fp.readline())["FORMAT"], depends_workflow_file.STREAM_FORMAT_NAME)
+
+
+    def testGzippedStream(self):
+        self.assertRoundTrips('workflow.jsonl.gz')
+        with open(os.path.join(self.tempDir, 'workflow.jsonl.gz'), 'rb') as fp:
+            self.assertEqual(fp.read(2), depends_workflow_file.GZIP_MAGIC)
+
+
+    def testFormatIsDetectedFromContents(self):
+        for fileFormat in (depends_workflow_file.FORMAT_JSON, depends_workflow_file.FORMAT_STREAM,
+                           depends_workflow_file.FORMAT_STREAM_GZIP):
+            (dag, fileDict) = self.roundTrip('workflow.dat', fileFormat=fileFormat)
+            self.assertEqual(dagContents(dag), dagContents(self.dag))
+
+
+    def testRestoredNodesAreStale(self):
+        self.dag.setNodeStale(self.a, False)
+        dag = self.assertRoundTrips('workflow.jsonl')
+        self.assertTrue(dag.nodeStaleState(dag.node(name='a')))
+
+
+    def testNewerStreamVersionIsRejected(self):
+        path = os.path.join(self.tempDir, 'workflow.jsonl')
+        with open(path, 'w') as fp:
+            fp.write(json.dumps({"FORMAT": depends_workflow_file.STREAM_FORMAT_NAME,
+                                 "VERSION": depends_workflow_file.STREAM_FORMAT_VERSION + 1}) + '\n')
+        self.assertRaises(RuntimeError, depends_workflow_file.readWorkflow, path, depends_dag.DAG())
+
+
+    def testCycleInFileIsRejected(self):
+        path = os.path.join(self.tempDir, 'workflow.jsonl')
+        depends_workflow_file.writeWorkflow(path, self.dag, **self.metaDicts)
+        with open(path, 'a') as fp:
+            fp.write(json.dumps({"RECORD": "EDGE", "FROM": str(self.c.uuid), "TO": str(self.a.uuid)}) + '\n')
+        self.assertRaises(RuntimeError, depends_workflow_file.readWorkflow, path, depends_dag.DAG())
+
+
+if __name__ == "__main__":
+    unittest.main()